@@ -1,41 +1,126 @@
 import socket
+import select
 import threading
 import json
 import time
-import struct
-import pyaudio
 import numpy as np
 import subprocess
 import sys
 import os 
-from denoiser import RNNoise
+from time import perf_counter_ns
+from jitter_buffer import JitterBuffer
+from receiver import FrameReceiver
+from resampler import StreamingResampler
+from mixer import OutputMixer
+from session import StreamSession, DEFAULT_SESSION
+from stats import socket_queue_bytes
+from dsp import DspChain
+from telemetry import TelemetryQueue
+from devices import DeviceRegistry, PA_INT16
+from protocol import handshake, DEFAULT_PREFERENCES, FORMATS, FORMAT_NAMES, FRAME_MS, TRANSPORT_UDP
+from datagram import DatagramReceiver, open_socket as open_udp_socket
+from realtime import GCMonitor, GCTuning, raise_priority, pin_to_cpu
+from sinks import parse_sink, open_sink, open_tap
+
+try:
+    import pyaudio
+except ImportError:
+    # Headless use (benchmarks) without PortAudio: output streams come from a subclass
+    pyaudio = None
 
 FLUTTER_PORT = 5000
 ANDROID_PORT = 6000
 
+# Connection retries back off from 5ms to 100ms; a non-persistent session gives up after 10s
+RECONNECT_BACKOFF_MIN = 0.005
+RECONNECT_BACKOFF_MAX = 0.1
+CONNECT_WINDOW = 10.0
+# A UDP stream without a single datagram for this long is treated as lost
+DATAGRAM_TIMEOUT = 10.0
+
+# PortAudio callback flags (same values as pyaudio.paContinue / paOutputUnderflow)
+PA_CONTINUE = 0
+PA_OUTPUT_UNDERFLOW = 0x4
+
 class BackendServer:
-    def __init__(self):
+    def __init__(self, ui_port=FLUTTER_PORT, watchdog=True):
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         try:
-            self.server_socket.bind(('127.0.0.1', FLUTTER_PORT))
+            self.server_socket.bind(('127.0.0.1', ui_port))
         except OSError:
-            print(f"[!] Port {FLUTTER_PORT} is busy. Is the app already running?")
+            print(f"[!] Port {ui_port} is busy. Is the app already running?")
             os._exit(1)
 
         self.server_socket.listen(1)
+        # The bound port: differs from ui_port when that is 0 (any free port, e.g. headless benchmarks)
+        self.ui_port = self.server_socket.getsockname()[1]
         
         self.client_socket = None
+        # --- OPTIMIZATION: UI messages go through a queue with its own writer ---
+        # The audio threads never wait on json.dumps or the Flutter socket
+        self.telemetry = TelemetryQueue(self._write_ui)
+        self.telemetry.start()
+        # True while any session is streaming
         self.is_streaming = False
-        self.audio_thread = None
-        
-        self.p = pyaudio.PyAudio()
-        self.device_map = {}
+
+        # --- SESSIONS: one per phone, keyed by the id given in 'start' ---
+        # Sessions playing to the same device share one stream through an OutputMixer
+        self.sessions = {}
+        self.outputs = {}
+        self.outputs_lock = threading.Lock()
+        # adb forwards already installed: (serial, local port) -> remote port
+        self.adb_forwards = {}
+
+        # --- OPTIMIZATION: cached device registry, re-scanned in the background ---
+        # Commands never enumerate devices; the registry owns the PyAudio instance
+        self.devices = DeviceRegistry(
+            pyaudio.PyAudio if pyaudio else None, PA_INT16,
+            busy=lambda: bool(self.outputs or self.sessions), on_change=self._devices_changed)
+
+        # Defaults for new sessions (commands without a 'session' key also apply them to running ones)
+        # The template chain holds the DSP settings every new session starts from (no RNNoise state)
+        self.dsp_defaults = DspChain(native=False)
         self.current_gain = 1.0
-        self.rnnoise = None
         self.use_rnnoise = False
-
-        self.start_parent_watchdog()
+        # Run the DSP chain of new sessions in a separate process (see 'set_dsp')
+        self.dsp_worker = False
+
+        # Playout buffer settings (applied live if a stream is running)
+        self.buffer_target_ms = 40
+        self.buffer_adaptive = True
+        # Clock drift compensation: ppm-level resampling keeps the buffer at target
+        self.drift_compensation = True
+
+        # Level meter: one reading per window; optional envelope for the visualizer
+        self.meter_window_ms = 33.3
+        self.meter_waveform_points = 0
+
+        # Stream loop instrumentation (off by default; see 'set_stats')
+        self.stats_enabled = False
+        self.stats_interval = 0.0
+
+        # Output settings (applied when a device's stream is opened)
+        # "callback": PortAudio pulls from the mixer
+        # "blocking": a writer thread calls stream.write()
+        self.output_mode = "callback"
+        self.frames_per_buffer = 240
+        self.resample_quality = "medium"
+
+        # What to ask v2 phones for (applied on the next connection, see 'set_protocol')
+        self.protocol_preferences = dict(DEFAULT_PREFERENCES)
+        # How long a UDP packet behind a gap waits for the missing one before it is concealed
+        self.reorder_ms = 20.0
+
+        # Realtime streams (see 'set_realtime'); GC pauses are timed either way
+        self.realtime = False
+        self.realtime_cpu = None
+        self.gc_monitor = GCMonitor(DEFAULT_PREFERENCES["frame_ms"])
+        self.gc_monitor.install()
+        self.gc_tuning = GCTuning()
+
+        if watchdog:
+            self.start_parent_watchdog()
 
     def start_parent_watchdog(self):
         """Kills this process if the parent process (Flutter) closes the stdin pipe."""
@@ -53,8 +138,9 @@ class BackendServer:
         t.start()
 
     def start(self):
-        print(f"[*] Python Backend listening on {FLUTTER_PORT}...")
-        self._scan_devices()
+        print(f"[*] Python Backend listening on {self.ui_port}...")
+        self.devices.refresh(reinit=False)
+        self.devices.start()
         try:
             while True:
                 self.client_socket, addr = self.server_socket.accept()
@@ -63,65 +149,26 @@ class BackendServer:
         except KeyboardInterrupt:
             self.cleanup()
 
-    def _scan_devices(self):
-        """
-        Scans output devices.
-        Prioritizes Windows WASAPI (Low Latency) if available.
-        """
-        self.device_map = {}
-
-        # 1. Find the WASAPI Host API Index
-        wasapi_index = -1
-        try:
-            for i in range(self.p.get_host_api_count()):
-                api = self.p.get_host_api_info_by_index(i)
-                if "WASAPI" in api.get("name", ""):
-                    wasapi_index = i
-                    break
-        except: pass
-
-        # 2. Get total device count
-        try:
-            total_devices = self.p.get_device_count()
-        except:
-            total_devices = 0
-
-        # 3. Scan all devices to build the map
-        # We iterate through ALL devices to find valid outputs
-        for i in range(total_devices):
-            try:
-                dev = self.p.get_device_info_by_index(i)
-
-                # Filter for Output devices
-                if dev.get("maxOutputChannels") > 0:
-                    name = dev.get("name")
-                    host_api = dev.get("hostApi")
-
-                    # LOGIC:
-                    # If this is a WASAPI device, we definitely want it.
-                    # If it's a standard device (MME/DirectSound), we accept it
-                    # UNLESS we already found a WASAPI version of it.
-
-                    # Clean the name for matching (WASAPI devices often prepend "Speakers (Realtek...)")
-                    clean_name = name
-
-                    if host_api == wasapi_index:
-                        # This is a WASAPI device. Always prefer this.
-                        # We might overwrite a previous entry with the same name, which is good.
-                        self.device_map[name] = i
+    @property
+    def p(self):
+        """The PyAudio instance (replaced when the device registry re-initializes PortAudio)."""
+        return self.devices.pa
 
-                    elif name not in self.device_map:
-                        # This is a generic device. Only add if we don't have it yet.
-                        self.device_map[name] = i
-
-            except Exception: continue
+    def _devices_changed(self, diff):
+        """Device registry callback: pushes hotplug changes to the UI."""
+        names = [entry["name"] for entry in self.devices.list()]
+        self.send_to_flutter({"type": "devices_changed", "payload": names, **diff})
 
     def send_to_flutter(self, data_dict):
         if self.client_socket:
+            self.telemetry.put(data_dict)
+
+    def _write_ui(self, data):
+        """Telemetry writer thread: one batch of newline-delimited messages."""
+        sock = self.client_socket
+        if sock:
             try:
-                # Append newline to ensure Flutter's LineSplitter catches it
-                message = json.dumps(data_dict) + "\n"
-                self.client_socket.sendall(message.encode('utf-8'))
+                sock.sendall(data)
             except:
                 self.client_socket = None
 
@@ -139,252 +186,767 @@ class BackendServer:
             except Exception: break
         self.client_socket = None
 
+    def _target_sessions(self, cmd):
+        """Sessions a command applies to: the one named by 'session', or all of them."""
+        session_id = cmd.get('session')
+        if session_id is None:
+            return list(self.sessions.values())
+        session = self.sessions.get(str(session_id))
+        return [session] if session else []
+
     def process_command(self, cmd):
         command = cmd.get('command')
-        
+        # Without a 'session' key, settings become the defaults for new sessions
+        # and are applied to every running one
+        global_scope = cmd.get('session') is None
+
         if command == 'get_devices':
-            self._scan_devices()
-            self.send_to_flutter({"type": "devices", "payload": list(self.device_map.keys())})
+            # Answered from the cache; 'refresh' asks the background thread to re-scan
+            if not self.devices.scans:
+                self.devices.refresh(reinit=False)
+            elif cmd.get('refresh'):
+                self.devices.request_refresh()
+            entries = self.devices.list()
+            self.send_to_flutter({"type": "devices", "payload": [entry["name"] for entry in entries],
+                                  "devices": entries, "default": self.devices.default_id})
 
         elif command == 'set_gain':
-            try: self.current_gain = float(cmd.get('value', 1.0))
-            except: pass
-            
+            try: gain = float(cmd.get('value', 1.0))
+            except: return
+            self.configure_dsp(cmd, {"stages": {"gain": {"gain": gain}}})
+
         elif command == 'toggle_rnnoise':
-            self.use_rnnoise = cmd.get('value', False)
-            if self.use_rnnoise and self.rnnoise is None:
-                try:
-                    self.rnnoise = RNNoise()
-                    self.send_to_flutter({"type": "log", "message": "[*] AI Denoising Enabled"})
-                except Exception as e:
-                    self.send_to_flutter({"type": "error", "message": f"RNNoise Error: {e}"})
-                    self.use_rnnoise = False
-            elif not self.use_rnnoise:
-                self.send_to_flutter({"type": "log", "message": "[*] AI Denoising Disabled"})
+            enabled = bool(cmd.get('value', False))
+            if self.configure_dsp(cmd, {"stages": {"denoise": {"enabled": enabled}}}, "RNNoise Error"):
+                state = "Enabled" if enabled else "Disabled"
+                self.send_to_flutter({"type": "log", "message": f"[*] AI Denoising {state}"})
+
+        elif command == 'set_dsp':
+            if 'worker' in cmd:
+                self.dsp_worker = bool(cmd['worker'])
+            self.configure_dsp(cmd, {"order": cmd.get('order'), "stages": cmd.get('stages')})
+
+        elif command == 'get_dsp':
+            sessions = [] if global_scope else self._target_sessions(cmd)
+            if sessions:
+                payload = {**sessions[0].dsp.describe(), "worker": sessions[0].worker is not None}
+            else:
+                payload = {**self.dsp_defaults.describe(), "worker": self.dsp_worker}
+            self.send_to_flutter({"type": "dsp", "payload": payload, "session": cmd.get('session')})
+
+        elif command == 'set_buffer':
+            try: target_ms = float(cmd.get('target_ms', self.buffer_target_ms))
+            except: target_ms = self.buffer_target_ms
+            adaptive = bool(cmd.get('adaptive', self.buffer_adaptive))
+            drift_compensation = bool(cmd.get('drift_compensation', self.drift_compensation))
+            if global_scope:
+                self.buffer_target_ms = target_ms
+                self.buffer_adaptive = adaptive
+                self.drift_compensation = drift_compensation
+            for session in self._target_sessions(cmd):
+                session.drift_compensation = drift_compensation
+                if session.jitter_buffer:
+                    session.jitter_buffer.configure(target_ms, adaptive)
+
+        elif command == 'set_output':
+            mode = cmd.get('mode', self.output_mode)
+            if mode in ("callback", "blocking"):
+                self.output_mode = mode
+            try: self.frames_per_buffer = max(64, int(cmd.get('frames_per_buffer', self.frames_per_buffer)))
+            except: pass
+            if cmd.get('resample_quality') in StreamingResampler.QUALITY:
+                self.resample_quality = cmd['resample_quality']
+
+        elif command == 'set_protocol':
+            prefs = dict(self.protocol_preferences)
+            try:
+                if int(cmd.get('frame_ms', prefs["frame_ms"])) in FRAME_MS:
+                    prefs["frame_ms"] = int(cmd.get('frame_ms', prefs["frame_ms"]))
+            except: pass
+            try: prefs["batch"] = min(255, max(1, int(cmd.get('batch', prefs["batch"]))))
+            except: pass
+            if cmd.get('format') in FORMATS:
+                # Preferred first, the other still accepted
+                prefs["formats"] = [cmd['format']] + [name for name in FORMATS if name != cmd['format']]
+            self.protocol_preferences = prefs
+            # A pause longer than one frame is an audible one
+            self.gc_monitor.budget_ms = prefs["frame_ms"]
+            try: self.reorder_ms = min(500.0, max(0.0, float(cmd.get('reorder_ms', self.reorder_ms))))
+            except: pass
+
+        elif command == 'set_realtime':
+            self.realtime = bool(cmd.get('enabled', self.realtime))
+            if 'cpu' in cmd:
+                try: self.realtime_cpu = None if cmd['cpu'] is None else max(0, int(cmd['cpu']))
+                except: pass
+
+        elif command == 'record':
+            # Taps a session's output into a WAV file (raw PCM for other paths, e.g. a FIFO)
+            sessions = self._target_sessions(cmd)
+            path = cmd.get('path')
+            if cmd.get('stop'):
+                for session in sessions:
+                    self.stop_recording(session, path)
+            elif path:
+                if len(sessions) > 1:
+                    self.send_to_flutter({"type": "error", "message": "Recording Error: name the session to record"})
+                elif sessions:
+                    self.start_recording(sessions[0], str(path))
+
+        elif command == 'set_meter':
+            try: self.meter_window_ms = max(5.0, float(cmd.get('window_ms', self.meter_window_ms)))
+            except: pass
+            try: self.meter_waveform_points = max(0, int(cmd.get('waveform_points', self.meter_waveform_points)))
+            except: pass
+            for session in list(self.sessions.values()):
+                session.meter.configure(window_ms=self.meter_window_ms, waveform_points=self.meter_waveform_points)
+
+        elif command == 'get_stats':
+            self.send_to_flutter({"type": "stats", "payload": self.get_stats()})
+
+        elif command == 'set_stats':
+            self.stats_enabled = bool(cmd.get('enabled', self.stats_enabled))
+            for session in list(self.sessions.values()):
+                session.stats.enabled = self.stats_enabled
+            try: self.stats_interval = max(0.0, float(cmd.get('interval', self.stats_interval)))
+            except: pass
 
         elif command == 'start':
-            if not self.is_streaming:
-                if self.use_rnnoise and self.rnnoise is None:
-                    try: self.rnnoise = RNNoise()
-                    except: pass
+            session_id = str(cmd.get('session', DEFAULT_SESSION))
+            if session_id not in self.sessions:
+                session = self.create_session(session_id, cmd)
+                self.sessions[session_id] = session
+                session.is_streaming = True
                 self.is_streaming = True
-                self.audio_thread = threading.Thread(
-                    target=self.audio_stream_logic,
-                    args=(cmd.get('device_name'), cmd.get('port', 6000))
-                )
-                self.audio_thread.start()
-        
-        elif command == 'stop':
-            self.is_streaming = False
+                session.thread = threading.Thread(target=self.audio_stream_logic, args=(session,))
+                session.thread.start()
 
-    def setup_adb(self, port):
+        elif command == 'stop':
+            for session in self._target_sessions(cmd):
+                # The stream thread notices and cleans up; the id can be reused right away
+                session.is_streaming = False
+                self.sessions.pop(session.session_id, None)
+            if global_scope or not self.sessions:
+                self.is_streaming = False
+
+    def configure_dsp(self, cmd, settings, error_label="DSP Error"):
+        """
+        Applies DSP chain settings to the session named in `cmd`, or to the
+        defaults and every running session. Returns False (after telling the UI) on error.
+        """
+        try:
+            if cmd.get('session') is None:
+                self.dsp_defaults.apply(settings)
+                self.current_gain = self.dsp_defaults.stages["gain"].gain
+                self.use_rnnoise = self.dsp_defaults.stages["denoise"].enabled
+            for session in self._target_sessions(cmd):
+                session.dsp.apply(settings)
+        except Exception as e:
+            self.send_to_flutter({"type": "error", "message": f"{error_label}: {e}"})
+            return False
+        return True
+
+    def create_session(self, session_id, cmd):
+        """Builds a session from a 'start' command, seeded with the current defaults."""
+        try: port = int(cmd.get('port', ANDROID_PORT))
+        except: port = ANDROID_PORT
+        try: remote_port = int(cmd['remote_port']) if cmd.get('remote_port') else None
+        except: remote_port = None
+
+        # A device id from 'get_devices' or, as before, its name
+        device = cmd.get('device_id') or cmd.get('device_name')
+        session = StreamSession(session_id, device, port, remote_port, cmd.get('serial'))
+        session.notify = self.send_to_flutter
+        # Persistent sessions keep their output and DSP warm and reconnect until stopped
+        session.persistent = bool(cmd.get('persistent', False))
+        session.realtime = bool(cmd.get('realtime', self.realtime))
+        session.cpu = self.realtime_cpu
+        session.host = cmd.get('host') or None
+        record = cmd.get('record')
+        if record:
+            # Started as soon as the output is open
+            session.record_paths = [str(path) for path in (record if isinstance(record, list) else [record])]
+        if cmd.get('transport') == "udp":
+            if session.host:
+                session.transport = "udp"
+            else:
+                # adb forwards only carry TCP
+                self.send_to_flutter({"type": "log", "message": "[!] UDP needs the phone's 'host' (Wi-Fi), using TCP"})
+        settings = self.dsp_defaults.describe()
+        try: session.dsp.apply(settings)
+        except Exception:
+            # Denoiser unavailable for this session: start without it
+            settings["stages"]["denoise"]["enabled"] = False
+            session.dsp.apply(settings)
+        session.drift_compensation = self.drift_compensation
+        session.resample_quality = self.resample_quality
+        session.stats.enabled = self.stats_enabled
+        session.meter.configure(window_ms=self.meter_window_ms, waveform_points=self.meter_waveform_points)
+        return session
+
+    def get_stats(self):
+        """Per-session pipeline timings and buffer state, plus the shared outputs."""
+        return {
+            "enabled": self.stats_enabled,
+            "sessions": {sid: session.get_stats() for sid, session in list(self.sessions.items())},
+            "outputs": [mixer.get_stats() for mixer in list(self.outputs.values())],
+            "telemetry": self.telemetry.get_stats(),
+            "devices": self.devices.get_stats(),
+            "gc": {**self.gc_monitor.get_stats(), **self.gc_tuning.get_stats()},
+        }
+
+    def setup_adb(self, port, remote_port=None, serial=None, force=False):
+        # --- OPTIMIZATION: adb forwards survive reconnects, so only install them once ---
+        key = (serial, port)
+        if not force and self.adb_forwards.get(key) == (remote_port or port):
+            return True
         self.send_to_flutter({"type": "log", "message": "[*] Setting up ADB..."})
+        # With several phones attached, adb needs to be told which one to talk to
+        adb = ["adb", "-s", serial] if serial else ["adb"]
         try:
             # Remove old rules first to be clean
-            subprocess.run(["adb", "forward", "--remove", f"tcp:{port}"],
+            subprocess.run(adb + ["forward", "--remove", f"tcp:{port}"],
                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-            subprocess.run(["adb", "forward", f"tcp:{port}", f"tcp:{port}"], 
+            subprocess.run(adb + ["forward", f"tcp:{port}", f"tcp:{remote_port or port}"],
                          check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.adb_forwards[key] = remote_port or port
             return True
         except Exception as e:
+            self.adb_forwards.pop(key, None)
             self.send_to_flutter({"type": "error", "message": f"ADB Error: {e}"})
             return False
 
-    def _recv_exact(self, sock, n):
-        """Receive exactly n bytes from socket with timeout handling"""
-        data = b''
-        while len(data) < n:
+    def playout_logic(self, stream, mixer, stop_event, block_frames):
+        """Blocking writer thread: pulls mixed blocks at the device's pace."""
+        block = np.zeros(block_frames, dtype=np.int16)
+        raised = False
+        try:
+            while not stop_event.is_set():
+                # Priority applies to the calling thread, and a realtime session may join later
+                if mixer.realtime and not raised:
+                    raise_priority()
+                    raised = True
+                # Underruns / refilling leave silence, keeping the device clock running
+                if self.stats_enabled:
+                    t0 = perf_counter_ns()
+                    mixer.mix_into(block)
+                    mixer.mix_time.record(perf_counter_ns() - t0)
+                else:
+                    mixer.mix_into(block)
+                data = block.tobytes()
+                stream.write(data)
+                mixer.last_block_ns = perf_counter_ns()
+                for tap in mixer.taps:
+                    tap.write(data)
+        except Exception as e:
+            self.send_to_flutter({"type": "error", "message": f"Playback Error: {e}"})
+        finally:
+            stop_event.set()
+
+    def resolve_output_device(self, device_name, sample_rate):
+        """Returns (device index, rate to open it at) for the selected output device (id or name)."""
+        if parse_sink(device_name):
+            # Null / file sinks take any rate: keep the phone's, no resampling
+            return device_name, sample_rate
+        entry = self.devices.get(device_name) or self.devices.default()
+        if entry is None:
+            # Nothing cached (enumeration failed): let PortAudio pick
+            return self.p.get_default_output_device_info()["index"], sample_rate
+
+        # --- OPTIMIZATION: Play at the device's native rate ---
+        # Our streaming resampler replaces the (often slow) OS-level conversion;
+        # the rate was validated during the background scan
+        return entry["index"], entry["rate"] or sample_rate
+
+    def open_output_stream(self, device_index, rate, block_frames, callback):
+        """
+        Opens the output (callback mode when `callback` is given): a null or
+        file / FIFO sink for those ids, otherwise the PortAudio device.
+        """
+        if parse_sink(device_index):
+            return open_sink(device_index, rate, block_frames, callback)
+        return self.p.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=rate,
+            output=True,
+            output_device_index=device_index,
+            frames_per_buffer=block_frames,
+            stream_callback=callback
+        )
+
+    def _make_output_callback(self, mixer, block_frames):
+        """Callback mode: PortAudio pulls mixed blocks straight from the sessions' rings."""
+        block = np.zeros(block_frames, dtype=np.int16)
+
+        def callback(in_data, frame_count, time_info, status):
+            nonlocal block
+            if frame_count > len(block):
+                block = np.zeros(frame_count, dtype=np.int16)
+            if status & PA_OUTPUT_UNDERFLOW:
+                mixer.underflows += 1
+            timed = self.stats_enabled
+            if timed: t0 = perf_counter_ns()
+            out = block[:frame_count]
+            mixer.mix_into(out)
+            # PyAudio only accepts bytes back, so this copy is the one allocation per block;
+            # taps share it (queued for their writer threads, never written here)
+            data = out.tobytes()
+            for tap in mixer.taps:
+                tap.write(data)
+            mixer.last_block_ns = perf_counter_ns()
+            if timed: mixer.mix_time.record(mixer.last_block_ns - t0)
+            return (data, PA_CONTINUE)
+
+        return callback
+
+    def acquire_output(self, device_name, sample_rate, realtime=False):
+        """
+        Returns the OutputMixer for a device, opening its stream on first use.
+        Sessions routed to the same device share one stream and one mixer,
+        played in realtime mode as soon as one of them is.
+        """
+        # The registry can't re-initialize PortAudio between resolving and opening
+        with self.devices.lock, self.outputs_lock:
+            device_index, output_rate = self.resolve_output_device(device_name, sample_rate)
+            mixer = self.outputs.get(device_index)
+            if mixer is not None:
+                mixer.users += 1
+                mixer.realtime = mixer.realtime or realtime
+                return mixer
+
+            block_frames = self.frames_per_buffer
+            use_callback = self.output_mode == "callback"
+            mixer = OutputMixer(output_rate, block_frames)
+            mixer.stop_event = threading.Event()
+            mixer.realtime = realtime
+
+            # --- OPTIMIZATION 2: Small hardware buffer (5ms = 240 frames at 48k) ---
+            # In callback mode PortAudio pulls from the preallocated rings itself,
+            # so Python scheduling jitter no longer reaches the device.
+            mixer.stream = self.open_output_stream(
+                device_index, output_rate, block_frames,
+                self._make_output_callback(mixer, block_frames) if use_callback else None
+            )
+            # What the device buffers beyond the block (sinks report nothing: they pull per block)
+            try: mixer.output_latency = float(mixer.stream.get_output_latency())
+            except: mixer.output_latency = 0.0
+            if not use_callback:
+                mixer.playout_thread = threading.Thread(
+                    target=self.playout_logic, args=(mixer.stream, mixer, mixer.stop_event, block_frames),
+                    daemon=True
+                )
+                mixer.playout_thread.start()
+            mixer.users = 1
+            self.outputs[device_index] = mixer
+            return mixer
+
+    def release_output(self, mixer, jbuf):
+        """Detaches a session's buffer; the last session out closes the stream."""
+        # Closing happens under the registry lock too, so PortAudio is never re-initialized under it
+        with self.devices.lock:
+            with self.outputs_lock:
+                mixer.remove_source(jbuf)
+                mixer.users -= 1
+                if mixer.users > 0:
+                    return
+                for key, value in list(self.outputs.items()):
+                    if value is mixer:
+                        del self.outputs[key]
+
+            mixer.stop_event.set()
+            if mixer.playout_thread:
+                mixer.playout_thread.join(timeout=1.0)
             try:
-                chunk = sock.recv(n - len(data))
-                if not chunk:
-                    return None
-                data += chunk
-            except socket.timeout:
-                return None
-            except Exception:
-                return None
-        return data
+                mixer.stream.stop_stream()
+                mixer.stream.close()
+            except: pass
 
-    def audio_stream_logic(self, device_name, port):
+    def connect_phone(self, session, streaming):
+        """
+        Connects to the phone and performs the handshake, retrying with
+        exponential backoff. Returns (sock, receiver, StreamFormat), or None
+        once `streaming()` turns False. Non-persistent sessions give up
+        (raise) after CONNECT_WINDOW seconds.
+        """
+        delay = RECONNECT_BACKOFF_MIN
+        started = last_log = time.monotonic()
+        last_forward = 0.0
+        attempts = 0
+
+        preferences = self.protocol_preferences
+        if session.transport == "udp":
+            # Bound once per session: its port is offered to the phone in the handshake
+            if session.udp is None:
+                session.udp = open_udp_socket()
+            preferences = dict(preferences, transport="udp", udp_port=session.udp.getsockname()[1])
+
+        while streaming():
+            sock = None
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+                # --- OPTIMIZATION 1: Small TCP Buffer to prevent lag ---
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+
+                sock.settimeout(2)
+                sock.connect((session.host or '127.0.0.1', session.port))
+                # Set timeout for handshake
+                sock.settimeout(5)
+                # All reads go through one zero-copy arena, so bytes that arrive
+                # right behind the handshake are kept for the stream loop
+                receiver = FrameReceiver(sock)
+                return sock, receiver, handshake(sock, receiver, preferences)
+            except ConnectionRefusedError:
+                # Nothing listens on our end: the adb forward is gone (adb server
+                # restarted, phone replugged), so install it again, at most once a second
+                if not session.host and time.monotonic() - last_forward >= 1.0:
+                    last_forward = time.monotonic()
+                    self.setup_adb(session.port, session.remote_port, session.serial, force=True)
+            except (OSError, ConnectionError):
+                # Timeouts, and adb accepting then closing while the app is not listening
+                pass
+            if sock:
+                try: sock.close()
+                except: pass
+
+            attempts += 1
+            now = time.monotonic()
+            if not session.persistent and now - started >= CONNECT_WINDOW:
+                raise Exception("Could not connect to phone. Is the app running?")
+            if now - last_log >= 1.0:
+                last_log = now
+                self.send_to_flutter({"type": "log", "message": f"[*] Waiting for phone... ({attempts} attempts)"})
+            # --- OPTIMIZATION: fast exponential backoff, so a returning phone is picked up within ~100ms ---
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_BACKOFF_MAX)
+        return None
+
+    def audio_stream_logic(self, session):
         sock = None
-        stream = None
-        
-        if not self.setup_adb(port):
-            self.is_streaming = False
-            self.send_to_flutter({"type": "status", "payload": "failed"})
+        mixer = None
+        jbuf = None
+        port = session.port
+        tag = {"session": session.session_id}
+
+        def streaming():
+            return session.is_streaming and self.is_streaming
+
+        # Phones reached over the network (Wi-Fi) need no adb forward
+        if not session.host and not self.setup_adb(port, session.remote_port, session.serial):
+            self._end_session(session)
+            self.send_to_flutter({"type": "status", "payload": "failed", **tag})
             return
 
         try:
-            self.send_to_flutter({"type": "status", "payload": "connecting"})
-            
-            # --- CONNECTION RETRY LOOP ---
-            connected = False
-            attempts = 0
-            max_retries = 20
-            
-            while self.is_streaming and not connected and attempts < max_retries:
-                try:
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-
-                    # --- OPTIMIZATION 1: Small TCP Buffer to prevent lag ---
-                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            if session.realtime:
+                self.enter_realtime(session)
+            self.send_to_flutter({"type": "status", "payload": "connecting", **tag})
+
+            # --- CONNECTION LOOP: persistent sessions come back here when the phone drops ---
+            # The output stream, playout buffer, denoiser and DSP worker stay warm in between
+            while streaming():
+                connection = self.connect_phone(session, streaming)
+                if connection is None:
+                    break
+                sock, receiver, fmt = connection
+                sample_rate = fmt.sample_rate
+                session.sock = sock
+                connected_at = time.monotonic()
+                self.send_to_flutter({"type": "log", "message": f"[*] Connected! Sample Rate: {sample_rate} Hz"})
+                if fmt.version >= 2:
+                    self.send_to_flutter({"type": "log", "message":
+                        f"[*] Protocol v{fmt.version}: {fmt.frame_ms}ms {FORMAT_NAMES[fmt.sample_format]} frames, "
+                        f"batch {fmt.batch}, round trip {fmt.rtt_us / 1000:.1f}ms"})
+
+                if mixer is None:
+                    # --- AUDIO DEVICE SETUP: shared with other sessions on the same device ---
+                    mixer = self.acquire_output(session.device_name, sample_rate, session.realtime)
+                    if mixer.rate != sample_rate:
+                        self.send_to_flutter({"type": "log", "message": f"[*] Resampling {sample_rate} -> {mixer.rate} Hz"})
+
+                    # --- JITTER BUFFER: network reads and playback are decoupled ---
+                    jbuf = JitterBuffer(mixer.rate, target_ms=self.buffer_target_ms, adaptive=self.buffer_adaptive)
+
+                    # --- OPTIMIZATION: optional DSP worker process (own GIL, shared-memory frames) ---
+                    if self.dsp_worker:
+                        try:
+                            session.start_worker()
+                            self.send_to_flutter({"type": "log", "message": f"[*] DSP worker process started (pid {session.worker.pid})"})
+                        except Exception as e:
+                            self.send_to_flutter({"type": "log", "message": f"[!] {e}, processing in-process"})
+
+                    session.begin(sample_rate, jbuf, mixer)
+                    mixer.add_source(jbuf)
+                    with self.outputs_lock:
+                        record_paths, session.record_paths = session.record_paths, []
+                    for path in record_paths:
+                        self.start_recording(session, path)
+                else:
+                    # Reconnected: the device kept playing silence from the drained buffer
+                    jbuf.clear()
+                    session.resume(sample_rate)
+                session.link.start(fmt)
+                udp = fmt.transport == TRANSPORT_UDP
+                session.concealment = udp
+                if session.transport == "udp" and not udp:
+                    self.send_to_flutter({"type": "log", "message": "[!] Phone does not offer UDP, streaming over TCP"})
+
+                self.send_to_flutter({"type": "status", "payload": "running", **tag})
+
+                self.send_to_flutter({"type": "log", "message": f"[*] Streaming audio over {'UDP' if udp else 'TCP'}..."})
+                if udp:
+                    self.datagram_loop(session, sock, mixer, streaming, connected_at)
+                else:
+                    # --- OPTIMIZATION 3: Flush Startup Lag ---
+                    # Drain any data that arrived while opening speakers to ensure we start "now".
+                    # Whole frames are discarded so the length-prefixed framing stays aligned.
+                    sock.settimeout(10.0)
+                    receiver.discard_pending()
+                    self.stream_loop(session, sock, receiver, mixer, streaming, connected_at)
+
+                session.sock = None
+                try: sock.close()
+                except: pass
+                sock = None
+                if not (session.persistent and streaming() and not mixer.stop_event.is_set()):
+                    break
+                session.disconnected_at = time.monotonic()
+                self.send_to_flutter({"type": "status", "payload": "reconnecting", **tag})
+                self.send_to_flutter({"type": "log", "message": "[*] Phone disconnected, reconnecting..."})
 
-                    sock.settimeout(2)
-                    sock.connect(('127.0.0.1', port))
-                    connected = True
-                except Exception:
-                    attempts += 1
-                    if attempts % 2 == 0:
-                        self.send_to_flutter({"type": "log", "message": f"[*] Waiting for phone... ({attempts}/{max_retries})"})
-                    time.sleep(0.5)
-                    if sock: 
-                        try: sock.close()
-                        except: pass
-                        sock = None
-
-            if not connected:
-                raise Exception("Could not connect to phone. Is the app running?")
+        except Exception as e:
+            self.send_to_flutter({"type": "error", "message": str(e)})
+        finally:
+            if session.realtime:
+                self.gc_tuning.exit()
+            if mixer:
+                self.stop_recording(session, end=True)
+                self.release_output(mixer, jbuf)
+            session.jitter_buffer = None
+            session.stop_worker()
+            if sock:
+                try: sock.close()
+                except: pass
+            session.sock = None
+            if session.udp:
+                try: session.udp.close()
+                except: pass
+                session.udp = None
+            session.datagrams = None
 
-            self.send_to_flutter({"type": "log", "message": "[*] Connected! Performing handshake..."})
-            
-            # Set timeout for handshake
-            sock.settimeout(5)
-
-            # ========== HANDSHAKE PROTOCOL ==========
-            
-            # Step 1: Receive sample rate
-            header = self._recv_exact(sock, 4)
-            if not header: raise Exception("Handshake failed (Sample Rate)")
-            sample_rate = struct.unpack('>i', header)[0]
-            
-            if sample_rate <= 0 or sample_rate > 192000:
-                raise Exception(f"Invalid sample rate: {sample_rate}")
-            
-            self.send_to_flutter({"type": "log", "message": f"[*] Sample Rate: {sample_rate} Hz"})
-
-            # Step 2: Send acknowledgment
-            sock.sendall(struct.pack('>i', sample_rate))
-
-            # Step 3: Wait for READY signal
-            ready_bytes = self._recv_exact(sock, 4)
-            if not ready_bytes: raise Exception("Handshake failed (Ready Signal)")
-            ready_signal = struct.unpack('>i', ready_bytes)[0]
-            
-            if ready_signal != 0x52454459: # "REDY"
-                raise Exception(f"Invalid ready signal: {hex(ready_signal)}")
-            
-            self.send_to_flutter({"type": "log", "message": "[*] Handshake complete!"})
-            
-            # ========== END HANDSHAKE ==========
-
-            # --- AUDIO DEVICE SETUP ---
-            device_index = self.device_map.get(device_name)
-            if device_index is None:
-                device_index = self.p.get_default_output_device_info()["index"]
-
-            # --- OPTIMIZATION 2: Match buffer size to Android (10ms = 480 frames at 48k) ---
-            stream = self.p.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=sample_rate,
-                output=True,
-                output_device_index=device_index,
-                frames_per_buffer=480
-            )
+            self._end_session(session)
+            self.send_to_flutter({"type": "status", "payload": "stopped", **tag})
+            self.send_to_flutter({"type": "volume", "value": 0.0, **tag})
 
-            self.send_to_flutter({"type": "status", "payload": "running"})
+    def start_recording(self, session, path):
+        """
+        Adds a tap on the session's output: a WAV file for .wav paths, raw PCM
+        otherwise. Before the output is open the path waits in record_paths.
+        """
+        mixer = session.mixer
+        if mixer is None or path in session.recordings:
+            with self.outputs_lock:
+                if session.mixer is None and path not in session.record_paths:
+                    session.record_paths.append(path)
+            return
+        try:
+            # Opened (and the header written) before the audio thread can see it
+            tap = open_tap(path, mixer.rate, mixer.block_frames)
+        except OSError as e:
+            self.send_to_flutter({"type": "error", "message": f"Recording Error: {e}"})
+            return
+        with self.outputs_lock:
+            attached = session.mixer is mixer and path not in session.recordings
+            if attached:
+                session.recordings[path] = tap
+                mixer.add_tap(tap)
+        if not attached:
+            # The session left its output (or the path got taken) meanwhile
+            tap.close()
+            return
+        self.send_to_flutter({"type": "log", "message": f"[*] Recording to {path}", "session": session.session_id})
 
-            # --- OPTIMIZATION 3: Flush Startup Lag ---
-            # Drain any data that arrived while opening speakers to ensure we start "now"
-            sock.settimeout(0.0) # Non-blocking
+    def stop_recording(self, session, path=None, end=False):
+        """
+        Stops the tap on `path` (all of them by default) and finishes its file.
+        `end`: the session is leaving its output, no recording can start after this.
+        """
+        with self.outputs_lock:
+            if path is None:
+                taps = list(session.recordings.values())
+                session.recordings = {}
+                session.record_paths = []
+            else:
+                taps = [session.recordings.pop(path)] if path in session.recordings else []
+                session.record_paths = [p for p in session.record_paths if p != path]
+            if session.mixer:
+                for tap in taps:
+                    session.mixer.remove_tap(tap)
+            if end:
+                session.mixer = None
+        for tap in taps:
+            # Waits for the writer to empty its queue; the audio threads no longer see the tap
+            tap.close()
+            if tap.error:
+                message = f"[!] Recording {tap.path} failed: {tap.error}"
+            else:
+                dropped = f", {tap.dropped_blocks} blocks dropped" if tap.dropped_blocks else ""
+                message = f"[*] Recording saved: {tap.path} ({tap.seconds:.1f}s{dropped})"
+            self.send_to_flutter({"type": "log", "message": message, "session": session.session_id})
+
+    def enter_realtime(self, session):
+        """Called on the session's stream thread: priority and affinity apply to the calling thread."""
+        self.gc_tuning.enter()
+        session.priority = raise_priority()
+        if session.cpu is not None:
+            session.pinned = pin_to_cpu(session.cpu)
+        pinned = f", pinned to CPU {session.cpu}" if session.pinned else ""
+        self.send_to_flutter({"type": "log", "message":
+            f"[*] Realtime mode: priority {session.priority or 'unchanged'}{pinned}, "
+            f"{self.gc_tuning.frozen} objects frozen"})
+
+    def stream_loop(self, session, sock, receiver, mixer, streaming, connected_at):
+        """Reads and processes frames until the phone disconnects or the session stops."""
+        consecutive_errors = 0
+        max_consecutive_errors = 5
+        reports = [time.monotonic(), time.monotonic()]  # Last buffer report, last stats push
+        stats = session.stats
+        frames_before = stats.frames_processed
+        awaiting_audio = True
+
+        while streaming() and not mixer.stop_event.is_set():
             try:
-                while True:
-                    if not sock.recv(4096): break
-            except BlockingIOError: pass
-            except Exception: pass
-            sock.settimeout(10.0) # Restore blocking
-
-            self.send_to_flutter({"type": "log", "message": "[*] Streaming audio..."})
-
-            # --- STREAM LOOP ---
-            consecutive_errors = 0
-            max_consecutive_errors = 5
-            
-            while self.is_streaming:
+                # One recv_into() syscall, then every complete frame it delivered
+                if stats.enabled:
+                    t0 = perf_counter_ns()
+                    received = receiver.fill()
+                    stats.record("recv", perf_counter_ns() - t0)
+                    queued = socket_queue_bytes(sock)
+                    if queued is not None: stats.socket_queue.record(queued)
+                else:
+                    received = receiver.fill()
+                if not received:
+                    self.send_to_flutter({"type": "log", "message": "[*] Connection closed by phone"})
+                    break
+            except socket.timeout:
+                self.send_to_flutter({"type": "log", "message": "[!] Read timeout..."})
+                consecutive_errors += 1
+                if consecutive_errors >= max_consecutive_errors: break
+                continue
+            except OSError:
+                self.send_to_flutter({"type": "log", "message": "[*] Connection lost"})
+                break
+
+            while True:
                 try:
-                    # Read length prefix (4 bytes)
-                    length_bytes = self._recv_exact(sock, 4)
-                    if not length_bytes:
-                        self.send_to_flutter({"type": "log", "message": "[*] Connection closed by phone"})
-                        break
-                    
-                    length = struct.unpack('>i', length_bytes)[0]
-                    
-                    # Validate length (Max 64KB safety check)
-                    if length <= 0 or length > 65536:
-                        consecutive_errors += 1
-                        if consecutive_errors >= max_consecutive_errors: break
-                        continue
-                    
-                    # Read audio data
-                    data = self._recv_exact(sock, length)
-                    if not data: break
-                    
-                    consecutive_errors = 0
-                    
-                    # --- PROCESS ---
-                    final_data = data
-                    
-                    if self.use_rnnoise and self.rnnoise:
-                        try:
-                            # RNNoise optimization handled inside denoiser.py
-                            processed = self.rnnoise.process(data)
-                            if processed: final_data = processed
-                            else: continue
-                        except Exception: pass
-
-                    # --- GAIN & VISUALIZER ---
-                    audio_array = np.frombuffer(final_data, dtype=np.int16)
-                    
-                    if self.current_gain != 1.0:
-                        audio_array = np.clip(audio_array * self.current_gain, -32768, 32767).astype(np.int16)
-                        final_data = audio_array.tobytes()
-
-                    # Send RMS to UI (Throttle to avoid flooding socket)
-                    if len(audio_array) > 0 and int(time.time() * 10) % 2 == 0:
-                        rms = np.sqrt(np.mean(audio_array.astype(float)**2))
-                        self.send_to_flutter({"type": "volume", "value": min(rms / 2000, 1.0)})
-                    
-                    stream.write(final_data)
-                    
-                except socket.timeout:
-                    self.send_to_flutter({"type": "log", "message": "[!] Read timeout..."})
+                    payload = receiver.next_frame()
+                except ValueError:
+                    # Length prefix failed the 64KB safety check
+                    stats.frames_dropped += 1
                     consecutive_errors += 1
                     if consecutive_errors >= max_consecutive_errors: break
                     continue
-
-        except Exception as e:
-            self.send_to_flutter({"type": "error", "message": str(e)})
-        finally:
-            if stream: 
+                if payload is None: break
+                consecutive_errors = 0
+                session.process_frame(payload)
+
+            if awaiting_audio and stats.frames_processed > frames_before:
+                # First audio of this connection is queued for playout
+                awaiting_audio = False
+                session.connected(connected_at)
+
+            if consecutive_errors >= max_consecutive_errors: break
+            if session.realtime:
+                # --- OPTIMIZATION: collect garbage while the device has audio to cover it ---
+                # The playout buffer can't: the output needs the GIL to read from it
+                self.gc_tuning.quiet_point(mixer.slack_ms())
+            self.report_progress(session, reports)
+
+    def datagram_loop(self, session, sock, mixer, streaming, connected_at):
+        """
+        Plays the phone's UDP datagrams until the TCP control connection
+        closes, the datagrams stop or the session stops. Lost packets are
+        concealed after the reorder window instead of stalling the stream.
+        """
+        receiver = DatagramReceiver(session.udp, sock.getpeername()[0], session.link.format.batch, self.reorder_ms)
+        session.datagrams = receiver
+        sock.setblocking(False)
+        stats = session.stats
+        frames_before = stats.frames_processed
+        awaiting_audio = True
+        reports = [time.monotonic(), time.monotonic()]
+
+        while streaming() and not mixer.stop_event.is_set():
+            # Wake for datagrams, the control channel, or a held packet's reorder deadline
+            wait = receiver.timeout(time.monotonic())
+            timeout = 0.1 if wait is None else min(wait, 0.1)
+            try:
+                readable, _, _ = select.select([sock, session.udp], [], [], timeout)
+            except (OSError, ValueError):
+                break
+            if sock in readable:
+                # Nothing is expected on the control channel but its closing
                 try:
-                    stream.stop_stream()
-                    stream.close()
-                except: pass
-            if sock: 
-                try: sock.close()
-                except: pass
-            
+                    if not sock.recv(4096):
+                        self.send_to_flutter({"type": "log", "message": "[*] Connection closed by phone"})
+                        break
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    self.send_to_flutter({"type": "log", "message": "[*] Connection lost"})
+                    break
+
+            if stats.enabled:
+                t0 = perf_counter_ns()
+                received = receiver.receive(session.process_frame, session.conceal)
+                if received: stats.record("recv", perf_counter_ns() - t0)
+            else:
+                receiver.receive(session.process_frame, session.conceal)
+
+            if awaiting_audio and stats.frames_processed > frames_before:
+                awaiting_audio = False
+                session.connected(connected_at)
+
+            now = time.monotonic()
+            if now - receiver.last_datagram >= DATAGRAM_TIMEOUT:
+                self.send_to_flutter({"type": "log", "message": f"[!] No audio datagrams for {DATAGRAM_TIMEOUT:.0f}s"})
+                break
+            if session.realtime:
+                self.gc_tuning.quiet_point(mixer.slack_ms())
+            self.report_progress(session, reports, now)
+
+    def report_progress(self, session, reports, now=None):
+        """Buffer health to the UI once per second, and the optional periodic stats push."""
+        if now is None:
+            now = time.monotonic()
+        if now - reports[0] >= 1.0:
+            reports[0] = now
+            self.send_to_flutter({"type": "buffer", "session": session.session_id, **session.buffer_stats()})
+        if self.stats_interval and now - reports[1] >= self.stats_interval:
+            reports[1] = now
+            self.send_to_flutter({"type": "stats", "payload": self.get_stats()})
+
+    def _end_session(self, session):
+        """Forgets a finished session; the backend stops streaming with the last one."""
+        session.is_streaming = False
+        if self.sessions.get(session.session_id) is session:
+            del self.sessions[session.session_id]
+        if not self.sessions:
             self.is_streaming = False
-            self.send_to_flutter({"type": "status", "payload": "stopped"})
-            self.send_to_flutter({"type": "volume", "value": 0.0})
+        # Each session owns its denoiser's native state
+        session.dsp.close()
 
     def cleanup(self):
         self.is_streaming = False
+        for session in list(self.sessions.values()):
+            session.is_streaming = False
+        self.telemetry.stop()
+        self.devices.close()
+        self.gc_monitor.uninstall()
         try:
-            self.p.terminate()
             self.server_socket.close()
         except: pass
 
@@ -0,0 +1,83 @@
+"""
+Benchmark: per-frame cost of the RNNoise wrapper.
+
+Compares the original allocate-per-frame wrapper against process_into()
+(one 10ms frame per call) and process_many() (large batches).
+
+    python benchmarks/bench_denoiser.py [--lib path/to/rnnoise.so] [--frames N]
+"""
+import argparse
+import ctypes
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from denoiser import RNNoise
+
+
+def legacy_process(rn, chunk_bytes):
+    """The original fast path of RNNoise.process(), kept here for comparison."""
+    frame_float = np.frombuffer(chunk_bytes, dtype=np.int16).astype(np.float32)
+    in_ptr = frame_float.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+    out_float = np.zeros(rn.FRAME_SIZE, dtype=np.float32)
+    out_ptr = out_float.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
+    rn.lib.rnnoise_process_frame(rn.state, out_ptr, in_ptr)
+    return out_float.astype(np.int16).tobytes()
+
+
+def timed(fn, frames):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) / frames * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lib", help="RNNoise shared library (default: the one next to denoiser.py)")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=100, help="frames per process_many() call")
+    args = parser.parse_args()
+
+    lib = ctypes.cdll.LoadLibrary(args.lib) if args.lib else None
+    rn = RNNoise(lib)
+    n = args.frames
+    size = rn.FRAME_SIZE
+
+    rng = np.random.default_rng(0)
+    audio = rng.integers(-3000, 3000, size=n * size, dtype=np.int16)
+    chunks = [audio[i * size:(i + 1) * size].tobytes() for i in range(n)]
+    views = [audio[i * size:(i + 1) * size] for i in range(n)]
+    out = np.zeros(args.batch * size + size, dtype=np.int16)
+
+    def run_legacy():
+        for chunk in chunks:
+            legacy_process(rn, chunk)
+
+    def run_into():
+        for view in views:
+            rn.process_into(view, out)
+
+    def run_many():
+        step = args.batch * size
+        for i in range(0, n * size, step):
+            block = audio[i:i + step]
+            rn.process_many(block, out[:len(block)])
+
+    results = [
+        ("legacy process()", timed(run_legacy, n)),
+        ("process_into() x1", timed(run_into, n)),
+        (f"process_many() x{args.batch}", timed(run_many, n)),
+    ]
+    base = results[0][1]
+    print(f"{'path':<22} {'us/frame':>10} {'speedup':>8}")
+    for name, us in results:
+        print(f"{name:<22} {us:>10.2f} {base / us:>7.2f}x")
+    rn.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark: per-stage cost of the DSP chain.
+
+Times each stage on its own (through DspChain's stage instrumentation), the
+full chain, and the old gain path (np.clip on a float64 temporary, then a
+new int16 array) for comparison. With --worker, the full chain also runs
+through a DspWorker process: the round trip overhead (on top of the
+worker's own DSP time) is reported against the 10ms frame, both idle and
+with a busy pure-Python thread competing for the GIL, as the UI handler
+does. With RNNoise available, a whole session frame (chain, meter,
+resampling to a 44.1kHz device) is also timed with the VAD gate open and
+closed. All numbers are per 10ms frame at 48kHz.
+
+    python benchmarks/bench_dsp.py [--lib path/to/rnnoise.so] [--frames N] [--worker]
+"""
+import argparse
+import ctypes
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dsp import DspChain
+from dsp_worker import DspWorker
+from jitter_buffer import JitterBuffer
+from mixer import OutputMixer
+from session import StreamSession
+from stats import PipelineStats
+
+FRAME = 480
+
+
+def legacy_gain(samples, gain=1.5):
+    return np.clip(samples * gain, -32768, 32767).astype(np.int16)
+
+
+def make_frames(count):
+    rng = np.random.default_rng(0)
+    t = np.arange(FRAME * 64) / 48000
+    # Speech-ish level with occasional peaks that drive the limiter
+    signal = 6000 * np.sin(2 * np.pi * 220 * t) + rng.standard_normal(len(t)) * 2000
+    signal[::5000] = 30000
+    signal = signal.astype(np.int16).reshape(64, FRAME)
+    return [signal[i % 64] for i in range(count)]
+
+
+def run_chain(chain, frames):
+    """Returns (us per frame uninstrumented, per-stage timing summaries)."""
+    start = time.perf_counter()
+    for frame in frames:
+        chain.process(frame)
+    per_frame = (time.perf_counter() - start) / len(frames) * 1e6
+
+    stats = PipelineStats()
+    stats.enabled = True
+    for frame in frames:
+        chain.process(frame, stats)
+    return per_frame, {name: hist.summary(1e-3) for name, hist in stats.stages.items() if hist.count}
+
+
+def bench_gate(rnnoise, frames):
+    """Session frame cost with the gate open vs closed (the threshold decides, whatever the VAD)."""
+    payloads = [frame.tobytes() for frame in frames]
+    for label, threshold in (("gate open", 0.0), ("gate closed", 1.01)):
+        session = StreamSession("bench")
+        session.dsp.stages["denoise"].rnnoise = rnnoise
+        session.dsp.apply({"stages": {
+            "denoise": {"enabled": True}, "highpass": {"enabled": True}, "agc": {"enabled": True},
+            "gate": {"enabled": True, "threshold": threshold, "hold_ms": 0, "release_ms": 10}}})
+        jbuf = JitterBuffer(44100, target_ms=40, adaptive=False)
+        session.begin(48000, jbuf, OutputMixer(44100, 441))
+        out = np.zeros(441, dtype=np.int16)
+        start = time.perf_counter()
+        for payload in payloads:
+            session.process_frame(payload)
+            while jbuf.depth_ms > 100:
+                jbuf.read_into(out)
+        per_frame = (time.perf_counter() - start) / len(payloads) * 1e6
+        print(f"{'session, ' + label:>24}: {per_frame:6.2f}us/frame  "
+              f"({session.stats.frames_gated} of {len(payloads)} frames gated)")
+
+
+def busy_thread(stop):
+    """Pure-Python work that holds the GIL, like a UI handler parsing a burst of commands."""
+    def spin():
+        while not stop.is_set():
+            sum(i * i for i in range(10000))
+    t = threading.Thread(target=spin, daemon=True)
+    t.start()
+    return t
+
+
+def frame_latency(process, frames):
+    """Per-frame wall time percentiles (us) at a paced 10ms frame rate."""
+    times = []
+    next_frame = time.perf_counter()
+    for frame in frames:
+        next_frame += 0.010
+        t0 = time.perf_counter()
+        process(frame)
+        times.append(time.perf_counter() - t0)
+        time.sleep(max(0.0, next_frame - time.perf_counter()))
+    p50, p99 = np.percentile(times, (50, 99)) * 1e6
+    return p50, p99, max(times) * 1e6
+
+
+def bench_worker(chain, frames):
+    worker = DspWorker()
+    start = time.perf_counter()
+    worker.start()
+    print(f"{'worker startup':>24}: {(time.perf_counter() - start) * 1000:6.1f}ms (pid {worker.pid})")
+    try:
+        overhead = []
+        for frame in frames:
+            worker.process(frame, chain)
+            overhead.append(worker.last_overhead_ns)
+        p50, p99 = np.percentile(overhead, (50, 99)) / 1e3
+        print(f"{'worker ipc overhead':>24}: p50 {p50:6.1f}us  p99 {p99:6.1f}us  max {max(overhead) / 1e3:7.1f}us  "
+              f"({p99 / 100:.2f}% of a 10ms frame at p99)")
+
+        paced = frames[:300]
+        for label, busy in (("idle", False), ("busy GIL", True)):
+            stop = threading.Event()
+            if busy:
+                busy_thread(stop)
+            local = frame_latency(chain.process, paced)
+            remote = frame_latency(lambda f: worker.process(f, chain), paced)
+            stop.set()
+            for name, (p50, p99, peak) in (("in-process", local), ("worker", remote)):
+                print(f"{name + ', ' + label:>24}: p50 {p50:7.1f}us  p99 {p99:7.1f}us  max {peak:7.1f}us per frame")
+    finally:
+        worker.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lib", help="RNNoise shared library (default: the one next to denoiser.py)")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--worker", action="store_true", help="also benchmark the DSP worker process")
+    args = parser.parse_args()
+    frames = make_frames(args.frames)
+
+    start = time.perf_counter()
+    for frame in frames:
+        legacy_gain(frame)
+    legacy = (time.perf_counter() - start) / len(frames) * 1e6
+    print(f"{'legacy np.clip gain':>24}: {legacy:6.2f}us/frame")
+
+    rnnoise = None
+    try:
+        from denoiser import RNNoise
+        rnnoise = RNNoise(ctypes.cdll.LoadLibrary(args.lib) if args.lib else None)
+    except (OSError, FileNotFoundError) as e:
+        print(f"{'denoise':>24}: skipped ({e})")
+
+    settings = {
+        "highpass": {"enabled": True},
+        "agc": {"enabled": True},
+        "gain": {"gain": 1.5},
+        "limiter": {"enabled": True},
+    }
+    for name in ("denoise", "highpass", "agc", "gain", "limiter"):
+        if name == "denoise" and rnnoise is None:
+            continue
+        chain = DspChain()
+        if name == "denoise":
+            chain.stages["denoise"].rnnoise = rnnoise
+        chain.set_order([name])
+        chain.configure(name, **settings.get(name, {"enabled": True}))
+        chain.reset()
+        total, stages = run_chain(chain, frames)
+        stage = stages[name]
+        print(f"{name:>24}: p50 {stage['p50']:6.1f}us  p99 {stage['p99']:6.1f}us  "
+              f"(chain total {total:6.2f}us/frame)")
+
+    chain = DspChain()
+    if rnnoise:
+        chain.stages["denoise"].rnnoise = rnnoise
+        chain.configure("denoise", enabled=True)
+    for name, params in settings.items():
+        chain.configure(name, **params)
+    chain.reset()
+    total, _ = run_chain(chain, frames)
+    tracemalloc.start()
+    for frame in frames[:1000]:
+        chain.process(frame)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{'full chain':>24}: {total:6.2f}us/frame  peak heap {peak:,} B over 1000 frames  "
+          f"order {chain.order}")
+
+    if rnnoise:
+        bench_gate(rnnoise, frames)
+
+    if args.worker:
+        if args.lib:
+            # The worker process loads RNNoise from its default location only
+            print(f"{'worker':>24}: comparing without denoise (--lib is not passed to the worker)")
+            chain.configure("denoise", enabled=False)
+        bench_worker(chain, frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Headless end-to-end benchmark for the backend stream loop.
+
+Runs the real BackendServer stream sessions against FakePhones over local
+TCP, with adb bypassed and PortAudio replaced by a null (or raw file) sink
+paced like a sound card. Reports:
+
+  * sustained throughput (phone flooding frames as fast as possible)
+  * per-frame processing cost, with and without RNNoise
+  * end-to-end latency distribution (marker tone -> sink), under jitter
+  * protocol v2: the backend's latency and loss estimates against the sink
+  * CPU cost of mixing several phones into one output
+  * time to audio after the phone drops and comes back (persistent session)
+  * GC pauses and tail latency with a big heap and garbage churn, realtime mode off / on
+  * recording taps: a WAV file plus a FIFO whose reader keeps stalling
+
+    python benchmarks/bench_e2e.py [--seconds 5] [--jitter-ms 5] [--sink file:out.raw]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import BackendServer
+from fake_phone import FakePhone
+from sinks import NullSink
+
+
+class NullOutputStream(NullSink):
+    """NullSink that also detects the marker tones (and can keep the audio it played)."""
+
+    MARKER_THRESHOLD = 4000
+
+    def __init__(self, rate, block_frames, callback=None, path=None):
+        self.file = open(path, 'wb') if path else None
+        self.detections = []  # monotonic time at which each marker tone played
+        self._in_marker = False
+        super().__init__(rate, block_frames, callback)
+
+    def consume(self, data):
+        if self.file:
+            self.file.write(data)
+        samples = np.frombuffer(data, dtype=np.int16)
+        loud = np.flatnonzero(np.abs(samples) > self.MARKER_THRESHOLD)
+        if len(loud) and not self._in_marker:
+            # The block plays from _next, the deadline it is waited for against
+            self.detections.append(self._next + loud[0] / self.rate)
+        self._in_marker = bool(len(loud))
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class HeadlessBackend(BackendServer):
+    """BackendServer with adb bypassed and the sound card replaced by a NullOutputStream."""
+
+    def __init__(self, sink_path=None):
+        super().__init__(ui_port=0, watchdog=False)
+        self.sink_path = sink_path
+        self.sink = None
+        self.streams_opened = 0
+        self.errors = []
+
+    def setup_adb(self, port, remote_port=None, serial=None, force=False):
+        return True
+
+    def resolve_output_device(self, device_name, sample_rate):
+        return None, sample_rate
+
+    def open_output_stream(self, device_index, rate, block_frames, callback):
+        self.sink = NullOutputStream(rate, block_frames, callback, self.sink_path)
+        self.streams_opened += 1
+        return self.sink
+
+    def send_to_flutter(self, data_dict):
+        if data_dict.get("type") == "error":
+            self.errors.append(data_dict.get("message"))
+
+
+def run_sessions(phones, seconds, rnnoise=False, sink_path=None, mode="callback", persistent=False, during=None,
+                 options=None):
+    """
+    Streams each phone into its own session ("phone0", "phone1", ...), all
+    mixed into the one null sink. `options` are added to each start command.
+    `during`, if given, runs (blocking) once the sessions are started, before
+    the `seconds` wait. Returns (backend, stats, elapsed) where stats is the
+    get_stats() payload captured just before stopping.
+    """
+    backend = HeadlessBackend(sink_path)
+    backend.output_mode = mode
+    backend.stats_enabled = True
+    if rnnoise:
+        # Raises here if the library is missing
+        backend.dsp_defaults.configure("denoise", enabled=True)
+
+    for i, phone in enumerate(phones):
+        phone.start()
+        backend.process_command({"command": "start", "session": f"phone{i}", "port": phone.port,
+                                 "persistent": persistent, **(options or {})})
+    sessions = list(backend.sessions.values())
+    if during:
+        during()
+    time.sleep(seconds)
+    elapsed = time.monotonic() - min(session.stats.started for session in sessions)
+    stats = backend.get_stats()
+    # Sessions that already ended are gone from the backend, but still hold their stats
+    stats["sessions"] = {session.session_id: session.get_stats() for session in sessions}
+    backend.process_command({"command": "stop"})
+    for phone in phones:
+        phone.stop()
+    for session in sessions:
+        session.thread.join(timeout=15.0)
+    backend.cleanup()
+    if backend.errors:
+        print(f"    errors: {backend.errors}")
+    return backend, stats, elapsed
+
+
+def run_session(phone, seconds, **kwargs):
+    """Single phone: returns (backend, session stats, elapsed)."""
+    backend, stats, elapsed = run_sessions([phone], seconds, **kwargs)
+    return backend, stats["sessions"]["phone0"], elapsed
+
+
+def latency_ms(phone, sink):
+    markers = np.array(phone.marker_times)
+    results = []
+    for detected in sink.detections:
+        # The newest marker captured before it was heard
+        earlier = markers[markers <= detected]
+        if len(earlier):
+            results.append((detected - earlier[-1]) * 1000.0)
+    return np.array(results)
+
+
+def reconnect_ms(phone, sink):
+    """For every drop(): phone listening again -> first audio heard (needs marker_every_s=0)."""
+    detections = np.array(sink.detections)
+    results = []
+    for back in phone.reconnect_times:
+        later = detections[detections >= back]
+        if len(later):
+            results.append((later[0] - back) * 1000.0)
+    return np.array(results)
+
+
+def run_reconnects(phone, drops=5, down_s=0.3, up_s=0.5, **kwargs):
+    """Streams into a persistent session while the phone drops `drops` times. Returns (backend, session stats)."""
+    def drop_repeatedly():
+        time.sleep(up_s)
+        for _ in range(drops):
+            phone.drop(down_s)
+            time.sleep(up_s)
+
+    backend, stats, _ = run_sessions([phone], 0.0, persistent=True, during=drop_repeatedly, **kwargs)
+    return backend, stats["sessions"]["phone0"]
+
+
+def run_with_garbage(phone, seconds, live_objects=300000, **kwargs):
+    """
+    run_session() in a process holding `live_objects` long-lived objects while
+    another thread keeps making cyclic garbage (the rest of a long-running app),
+    so the collector has real work. Returns (backend, session stats, GC stats).
+    """
+    heap = [{"i": i} for i in range(live_objects)]
+    stop = threading.Event()
+
+    def churn():
+        while not stop.is_set():
+            for i in range(200):
+                node = {}
+                node["self"] = node
+                if not i % 10:
+                    # Some of it stays (history, caches): the old generation grows
+                    heap.append(node)
+            time.sleep(0.001)
+    thread = threading.Thread(target=churn, daemon=True)
+    thread.start()
+    try:
+        backend, stats, _ = run_sessions([phone], seconds, **kwargs)
+    finally:
+        stop.set()
+        thread.join()
+    heap.clear()
+    return backend, stats["sessions"]["phone0"], stats["gc"]
+
+
+def stalling_reader(path, stop, read_s=1.0, stall_s=2.0):
+    """Drains a FIFO for `read_s`, then stops reading for `stall_s` (a disk or consumer hiccup), until `stop`."""
+    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    total = 0
+    try:
+        while not stop.is_set():
+            until = time.monotonic() + read_s
+            while time.monotonic() < until and not stop.is_set():
+                try:
+                    total += len(os.read(fd, 65536))
+                except BlockingIOError:
+                    pass
+                time.sleep(0.005)
+            stop.wait(stall_s)
+        # Let the writer finish
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except BlockingIOError:
+                time.sleep(0.005)
+                continue
+            if not data:
+                return total
+            total += len(data)
+    finally:
+        os.close(fd)
+
+
+def run_recording(phone, seconds, **kwargs):
+    """
+    run_session() recording to a WAV file and to a FIFO that stalls 2s out of
+    every 3. Returns (backend, session stats, WAV bytes on disk, bytes the FIFO's reader got).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        wav = os.path.join(tmp, "take.wav")
+        fifo = os.path.join(tmp, "tap.pcm")
+        os.mkfifo(fifo)
+        stop = threading.Event()
+        result = {}
+        reader = threading.Thread(target=lambda: result.update(total=stalling_reader(fifo, stop)), daemon=True)
+        reader.start()
+        time.sleep(0.1)  # The tap opens the FIFO only once it has a reader
+        try:
+            backend, stats, _ = run_sessions([phone], seconds, options={"record": [wav, fifo]}, **kwargs)
+        finally:
+            stop.set()
+            reader.join(timeout=15.0)
+        return backend, stats["sessions"]["phone0"], os.path.getsize(wav), result.get("total", 0)
+
+
+def describe(values, unit):
+    if not len(values):
+        return "n/a"
+    p50, p95, p99 = np.percentile(values, (50, 95, 99))
+    return f"p50 {p50:.1f}{unit}  p95 {p95:.1f}{unit}  p99 {p99:.1f}{unit}  max {values.max():.1f}{unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--burst-every", type=float, default=1.0)
+    parser.add_argument("--burst-ms", type=float, default=30.0)
+    parser.add_argument("--write-size", type=int, default=0)
+    parser.add_argument("--mode", choices=("callback", "blocking"), default="callback")
+    parser.add_argument("--sink", default="null", help="'null' or 'file:PATH' (raw int16)")
+    args = parser.parse_args()
+    sink_path = args.sink[5:] if args.sink.startswith("file:") else None
+
+    print("== Throughput (phone floods frames) ==")
+    phone = FakePhone(sample_rate=args.rate, flood=True, write_size=args.write_size)
+    backend, snap, elapsed = run_session(phone, args.seconds, mode=args.mode)
+    frames = snap["frames_processed"]
+    audio_s = frames * (phone.frame_bytes // 2) / args.rate
+    print(f"    {frames / elapsed:,.0f} frames/s  ({audio_s / elapsed:,.0f}x real time)")
+
+    print("== Per-frame processing cost ==")
+    for rnnoise in (False, True):
+        label = "with RNNoise" if rnnoise else "without RNNoise"
+        phone = FakePhone(sample_rate=args.rate, flood=True, write_size=args.write_size)
+        try:
+            backend, snap, _ = run_session(phone, min(args.seconds, 3.0), rnnoise=rnnoise, mode=args.mode)
+        except (FileNotFoundError, OSError) as e:
+            phone.stop()
+            print(f"    {label}: skipped ({e})")
+            continue
+        frame = snap["stages_us"].get("frame")
+        if frame:
+            print(f"    {label}: p50 {frame['p50']}us  p99 {frame['p99']}us  max {frame['max']}us")
+
+    print(f"== End-to-end latency (jitter {args.jitter_ms}ms, "
+          f"{args.burst_ms}ms stall every {args.burst_every}s) ==")
+    phone = FakePhone(sample_rate=args.rate, jitter_ms=args.jitter_ms, burst_every_s=args.burst_every,
+                      burst_ms=args.burst_ms, write_size=args.write_size)
+    backend, snap, _ = run_session(phone, args.seconds, sink_path=sink_path, mode=args.mode)
+    print(f"    {describe(latency_ms(phone, backend.sink), 'ms')}")
+    buf = snap.get("buffer", {})
+    print(f"    buffer target {buf.get('target_ms')}ms  underruns {buf.get('underruns')}  "
+          f"overruns {buf.get('overruns')}  drift {buf.get('drift_ppm')}ppm")
+
+    print("== Protocol v2: the backend's own latency and loss figures (1 frame in 50 lost) ==")
+    phone = FakePhone(sample_rate=args.rate, jitter_ms=args.jitter_ms, protocol=2, clock_offset_s=1000.0,
+                      lose_every=50)
+    backend, snap, _ = run_session(phone, args.seconds, mode=args.mode)
+    link = snap["link"]
+    latency = link["playout_latency_ms"] or {}
+    print(f"    estimated capture -> playout p50 {latency.get('p50')}ms  p99 {latency.get('p99')}ms  "
+          f"(sink heard: {describe(latency_ms(phone, backend.sink), 'ms')})")
+    print(f"    lost {link['frames_lost']}/{phone.frames_lost} frames ({link['loss_pct']}%)  "
+          f"handshake round trip {link['rtt_ms']}ms")
+
+    print("== UDP transport (5% of datagrams lost, 5% reordered) ==")
+    phone = FakePhone(sample_rate=args.rate, jitter_ms=args.jitter_ms, protocol=2, transport="udp",
+                      udp_loss=0.05, udp_reorder=0.05, marker_every_s=0.2)
+    backend, snap, _ = run_session(phone, args.seconds, mode=args.mode,
+                                   options={"host": "127.0.0.1", "transport": "udp"})
+    datagrams = snap["link"].get("datagrams", {})
+    buf = snap.get("buffer", {})
+    print(f"    {describe(latency_ms(phone, backend.sink), 'ms')}")
+    print(f"    dropped {phone.datagrams_dropped}  lost {datagrams.get('lost')}  "
+          f"concealed {snap['frames_concealed']}  reordered {datagrams.get('reordered')}  "
+          f"underruns {buf.get('underruns')}")
+
+    print("== Mixing phones into one output (real-time senders) ==")
+    for count in (1, 2, 4, 8):
+        phones = [FakePhone(sample_rate=args.rate, jitter_ms=args.jitter_ms, seed=i) for i in range(count)]
+        cpu_start = time.process_time()
+        backend, stats, elapsed = run_sessions(phones, min(args.seconds, 3.0), mode=args.mode)
+        cpu = (time.process_time() - cpu_start) / elapsed * 100
+        frames = [s["stages_us"]["frame"]["p50"] for s in stats["sessions"].values() if "frame" in s["stages_us"]]
+        mix = stats["outputs"][0]["mix_us"] if stats["outputs"] else None
+        print(f"    {count} phone(s): CPU {cpu:.1f}%  frame p50 {np.mean(frames):.0f}us  "
+              f"mix p50 {mix['p50'] if mix else 'n/a'}us per block")
+
+    print("== Reconnect (phone away 300ms, 5 times; output and DSP kept warm) ==")
+    phone = FakePhone(sample_rate=args.rate, marker_every_s=0)
+    backend, snap = run_reconnects(phone, mode=args.mode)
+    reconnect = snap["reconnect"]
+    print(f"    time to audio: {describe(reconnect_ms(phone, backend.sink), 'ms')}")
+    print(f"    reconnects {reconnect['reconnects']}  connect -> first frame {reconnect['time_to_audio_ms']}ms  "
+          f"output streams opened {backend.streams_opened}")
+
+    print("== Realtime mode (300k live objects, another thread making cyclic garbage) ==")
+    for realtime in (False, True):
+        phone = FakePhone(sample_rate=args.rate, jitter_ms=args.jitter_ms, marker_every_s=0.1)
+        backend, snap, gc_stats = run_with_garbage(phone, args.seconds, mode=args.mode,
+                                                   options={"realtime": realtime})
+        pause = gc_stats["pause_us"] or {}
+        frame = snap["stages_us"].get("frame", {})
+        print(f"    realtime {'on ' if realtime else 'off'}: GC pauses > {gc_stats['budget_ms']}ms "
+              f"{gc_stats['long_pauses']}  longest {gc_stats['longest_pause_ms']}ms  "
+              f"pause p99 {pause.get('p99')}us  collections {gc_stats['collections']}")
+        print(f"        frame p99 {frame.get('p99')}us  max {frame.get('max')}us  "
+              f"underruns {snap['buffer']['underruns']}  latency {describe(latency_ms(phone, backend.sink), 'ms')}")
+
+    if hasattr(os, "mkfifo"):
+        print("== Recording taps (WAV file + a FIFO whose reader stalls 2s out of every 3) ==")
+        phone = FakePhone(sample_rate=args.rate, jitter_ms=args.jitter_ms, marker_every_s=0.1)
+        backend, snap, wav_bytes, fifo_bytes = run_recording(phone, max(args.seconds, 4.0), mode=args.mode)
+        print(f"    {describe(latency_ms(phone, backend.sink), 'ms')}  underruns {snap['buffer']['underruns']}  "
+              f"late sink blocks {backend.sink.late}")
+        for tap in snap.get("recordings", []):
+            print(f"    {os.path.basename(tap['path'])}: {tap['seconds']}s written, queue peak {tap['queue_peak']} "
+                  f"blocks, dropped {tap['dropped_blocks']}")
+        print(f"    on disk {wav_bytes / 2 / args.rate:.2f}s (WAV)  FIFO reader got {fifo_bytes / 2 / args.rate:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
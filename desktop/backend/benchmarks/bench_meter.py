@@ -0,0 +1,57 @@
+"""
+Micro-benchmark: the old float64 RMS meter vs. the windowed int64 LevelMeter.
+
+The old meter upcast every metered frame to float64 and squared it (two
+temporary arrays per frame). LevelMeter copies each frame into its window
+and runs the int64 statistics once per window.
+
+    python benchmarks/bench_meter.py [frames]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from meter import LevelMeter
+
+FRAME = 480  # 10ms at 48kHz
+
+
+def legacy(frame):
+    rms = np.sqrt(np.mean(frame.astype(float)**2))
+    return min(rms / 2000, 1.0)
+
+
+def bench(label, fn, frames):
+    for frame in frames[:100]:
+        fn(frame)
+    start = time.perf_counter()
+    for frame in frames:
+        fn(frame)
+    per_frame = (time.perf_counter() - start) / len(frames) * 1e6
+
+    tracemalloc.start()
+    for frame in frames[:500]:
+        fn(frame)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:>28}: {per_frame:6.2f}us/frame  peak heap {peak:,} B")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = np.random.default_rng(0)
+    frames = [(rng.standard_normal(FRAME) * 3000).astype(np.int16) for _ in range(64)]
+    frames = [frames[i % 64] for i in range(count)]
+
+    bench("float64 RMS (every frame)", legacy, frames)
+    bench("LevelMeter 33ms", LevelMeter(48000).update, frames)
+    bench("LevelMeter 33ms + waveform", LevelMeter(48000, waveform_points=64).update, frames)
+
+
+if __name__ == "__main__":
+    main()
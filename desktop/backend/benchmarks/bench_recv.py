@@ -0,0 +1,145 @@
+"""
+Micro-benchmark: legacy _recv_exact() framing vs. the zero-copy FrameReceiver.
+
+Streams length-prefixed 10ms frames over a local socket pair and reports
+syscalls per frame, time per frame and peak heap bytes per frame.
+
+    python benchmarks/bench_recv.py [frames]
+"""
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from receiver import FrameReceiver
+
+FRAME_BYTES = 960  # 480 samples * 2 bytes
+
+
+class CountingSocket:
+    """Wraps a socket and counts receive syscalls."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.syscalls = 0
+
+    def recv(self, n):
+        self.syscalls += 1
+        return self.sock.recv(n)
+
+    def recv_into(self, buf):
+        self.syscalls += 1
+        return self.sock.recv_into(buf)
+
+    def settimeout(self, t):
+        self.sock.settimeout(t)
+
+    def gettimeout(self):
+        return self.sock.gettimeout()
+
+
+def legacy_recv_exact(sock, n):
+    """The pre-arena implementation, kept here for comparison."""
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def legacy_next_frame(sock):
+    length_bytes = legacy_recv_exact(sock, 4)
+    if not length_bytes:
+        return None
+    length = struct.unpack('>i', length_bytes)[0]
+    data = legacy_recv_exact(sock, length)
+    return np.frombuffer(data, dtype=np.int16)
+
+
+def legacy_frames(sock):
+    while True:
+        frame = legacy_next_frame(sock)
+        if frame is None:
+            return
+        yield frame
+
+
+def arena_frames(receiver):
+    while True:
+        frame = receiver.next_frame()
+        if frame is not None:
+            yield np.frombuffer(frame, dtype=np.int16)
+            continue
+        if not receiver.fill():
+            return
+
+
+def start_sender(sock, frames):
+    payload = struct.pack('>i', FRAME_BYTES) + bytes(FRAME_BYTES)
+
+    def send():
+        # Frames are written one by one, like AudioService.kt does
+        for _ in range(frames):
+            sock.sendall(payload)
+        sock.close()
+
+    t = threading.Thread(target=send, daemon=True)
+    t.start()
+    return t
+
+
+def run(name, frames, trace):
+    tx, rx = socket.socketpair()
+    counting = CountingSocket(rx)
+    sender = start_sender(tx, frames)
+
+    if name == "legacy":
+        source = legacy_frames(counting)
+    else:
+        source = arena_frames(FrameReceiver(counting))
+
+    received = 0
+    heap_bytes = 0
+    start = time.perf_counter()
+    while True:
+        if trace:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        frame = next(source, None)
+        if frame is None:
+            break
+        if trace:
+            heap_bytes += tracemalloc.get_traced_memory()[1] - base
+        received += 1
+    elapsed = time.perf_counter() - start
+
+    sender.join()
+    rx.close()
+    return received, counting.syscalls, elapsed, heap_bytes
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    print(f"{'path':<8} {'frames':>8} {'syscalls/frame':>15} {'us/frame':>10} {'heap B/frame':>13}")
+    for name in ("legacy", "arena"):
+        received, syscalls, elapsed, _ = run(name, frames, trace=False)
+        # Allocation pass is separate: tracemalloc distorts timings
+        tracemalloc.start()
+        t_received, _, _, heap_bytes = run(name, frames // 10, trace=True)
+        tracemalloc.stop()
+        print(f"{name:<8} {received:>8} {syscalls / received:>15.3f} "
+              f"{elapsed / received * 1e6:>10.2f} {heap_bytes / t_received:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark: direct send_to_flutter (json.dumps + sendall per message)
+vs. the coalescing TelemetryQueue, as seen from the audio thread.
+
+Simulates 10ms frames each reporting a volume level (plus the odd log line)
+to a UI that reads slowly and freezes for a second halfway through (a busy
+Flutter frame, a GC pause, a debugger), and reports the per-message cost on
+the sending thread, its worst case, and how many messages reached the socket.
+
+    python benchmarks/bench_telemetry.py [seconds]
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telemetry import TelemetryQueue
+
+
+def slow_reader(sock, stop, freeze_at, chunk=256, delay=0.002, freeze_s=1.0):
+    """A UI that drains its socket in small, late reads and stalls once."""
+    received = 0
+    sock.settimeout(0.1)
+    while not stop.is_set():
+        if freeze_at and time.monotonic() >= freeze_at:
+            freeze_at = None
+            time.sleep(freeze_s)
+        try:
+            data = sock.recv(chunk)
+        except socket.timeout:
+            continue
+        except OSError:
+            break
+        if not data:
+            break
+        received += data.count(b"\n")
+        time.sleep(delay)
+    return received
+
+
+def run(mode, seconds):
+    ui, backend = socket.socketpair()
+    # A small send buffer makes a slow UI push back on sendall quickly
+    backend.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    ui.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    stop = threading.Event()
+    received = []
+    freeze_at = time.monotonic() + seconds / 2
+    reader = threading.Thread(target=lambda: received.append(slow_reader(ui, stop, freeze_at)), daemon=True)
+    reader.start()
+
+    if mode == "direct":
+        def send(message):
+            backend.sendall((json.dumps(message) + "\n").encode('utf-8'))
+        queue = None
+    else:
+        queue = TelemetryQueue(backend.sendall)
+        queue.start()
+        send = queue.put
+
+    costs = []
+    frames = int(seconds / 0.01)
+    next_frame = time.perf_counter()
+    for i in range(frames):
+        t0 = time.perf_counter_ns()
+        send({"type": "volume", "value": (i % 100) / 100, "session": "default"})
+        if i % 50 == 0:
+            send({"type": "log", "message": f"[*] frame {i}"})
+        costs.append(time.perf_counter_ns() - t0)
+        next_frame += 0.01
+        delay = next_frame - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    if queue:
+        queue.stop()
+    stop.set()
+    reader.join(timeout=2.0)
+    backend.close()
+    ui.close()
+    costs = np.array(costs) / 1000.0
+    return costs, received[0] if received else 0, queue
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    for mode in ("direct", "queue"):
+        costs, received, queue = run(mode, seconds)
+        p50, p99 = np.percentile(costs, (50, 99))
+        print(f"{mode:>6}: p50 {p50:6.1f}us  p99 {p99:7.1f}us  max {costs.max():8.1f}us  "
+              f"messages to UI {received}")
+        if queue:
+            print(f"        {queue.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
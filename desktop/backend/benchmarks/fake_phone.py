@@ -0,0 +1,310 @@
+"""
+Local stand-in for the Android AudioService.
+
+Speaks the real handshake (sample rate -> ack -> "REDY"), or with
+protocol=2 the v2 negotiation (see protocol.py), and then streams
+length-prefixed PCM frames, optionally with injected jitter, stalls/bursts
+and arbitrary TCP write sizes. drop() simulates the app going away and
+coming back (the first frame of every connection is a marker). Used by the benchmark suite; can also be run
+on its own to feed a real backend without a phone:
+
+    python benchmarks/fake_phone.py --port 6000 --jitter-ms 5
+"""
+import argparse
+import os
+import random
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol import (CLOCK, CONFIG, FORMAT_F32, FORMATS, FRAME_HEADER, FRAME_MS, HELLO, INT,
+                      READY_SIGNAL, TRANSPORT_TCP, TRANSPORT_UDP, V2_MAGIC)
+
+
+class FakePhone:
+
+    def __init__(self, port=0, sample_rate=48000, frame_bytes=960, jitter_ms=0.0,
+                 burst_every_s=0.0, burst_ms=0.0, write_size=0, flood=False,
+                 marker_every_s=0.25, seed=0, protocol=1, formats=("s16",), max_batch=1,
+                 clock_offset_s=0.0, lose_every=0, transport="tcp", udp_loss=0.0, udp_reorder=0.0):
+        self.sample_rate = sample_rate
+        self.frame_bytes = frame_bytes    # v1 only; v2 frames are sized by the backend's choice
+        self.frame_s = (frame_bytes // 2) / sample_rate
+        # v2: what the phone offers, how far its clock is from ours, and
+        # every how many frames one is lost before sending (0: none)
+        self.protocol = protocol
+        self.formats = formats
+        self.max_batch = max_batch
+        self.clock_offset_s = clock_offset_s
+        self.lose_every = lose_every
+        # v2 over UDP: the share of datagrams the "network" drops, and of ones
+        # it delays behind the next
+        self.transport = transport
+        self.udp_loss = udp_loss
+        self.udp_reorder = udp_reorder
+        self.datagrams_dropped = 0
+        self.datagrams_reordered = 0
+        self.negotiated = None            # (format, frame ms, batch) from the last v2 handshake
+        self.frames_lost = 0
+        self.jitter_ms = jitter_ms
+        self.burst_every_s = burst_every_s
+        self.burst_ms = burst_ms
+        self.write_size = write_size      # 0: one write per frame (like the app)
+        self.flood = flood                # Ignore real time, send as fast as possible
+        self.marker_every_s = marker_every_s
+        self._rng = random.Random(seed)
+
+        self.server = self._listen(port)
+        self.port = self.server.getsockname()[1]
+
+        self.frames_sent = 0
+        self.connections = 0
+        # Capture time (time.monotonic) of every marker frame, for latency matching
+        self.marker_times = []
+        # When the phone was listening again after each drop()
+        self.reconnect_times = []
+        self._conn = None
+        self._listening = threading.Event()
+        self._listening.set()
+        self._running = False
+        self._thread = None
+
+    def _build_frames(self, samples, sample_format=FORMATS["s16"]):
+        """PCM of one silent and one marker (1kHz tone) packet."""
+        silence = np.zeros(samples, dtype=np.int16)
+        t = np.arange(samples) / self.sample_rate
+        marker = (16000 * np.sin(2 * np.pi * 1000 * t)).astype(np.int16)
+        if sample_format == FORMAT_F32:
+            return [(pcm / 32768.0).astype('<f4').tobytes() for pcm in (silence, marker)]
+        return silence.tobytes(), marker.tobytes()
+
+    def clock_us(self):
+        """The phone's monotonic clock, in microseconds."""
+        return int((time.monotonic() + self.clock_offset_s) * 1e6)
+
+    @staticmethod
+    def _listen(port):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(('127.0.0.1', port))
+        server.listen(1)
+        return server
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._listening.set()
+        try: self.server.close()
+        except Exception: pass
+        self._close_conn()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+    def _recv_int(self, conn):
+        return struct.unpack('>i', self._recv_exact(conn, 4))[0]
+
+    def drop(self, down_s=0.0):
+        """
+        Closes the connection and stops listening, like the app being killed,
+        then listens on the same port again after `down_s` seconds.
+        """
+        self._listening.clear()
+        try: self.server.close()
+        except Exception: pass
+        self._close_conn()
+        time.sleep(down_s)
+        self.server = self._listen(self.port)
+        self.reconnect_times.append(time.monotonic())
+        self._listening.set()
+
+    def _close_conn(self):
+        conn = self._conn
+        if conn:
+            # shutdown() also wakes a sendall() blocked in the serving thread
+            try: conn.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+
+    def _serve(self):
+        # One connection at a time; after a drop() the backend connects again
+        while self._running:
+            if not self._listening.wait(0.1):
+                continue
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                continue
+            self._conn = conn
+            self.connections += 1
+            try:
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if self.protocol >= 2:
+                    self._stream(conn, *self._handshake_v2(conn))
+                else:
+                    conn.sendall(struct.pack('>i', self.sample_rate))
+                    if self._recv_int(conn) != self.sample_rate:
+                        return
+                    conn.sendall(struct.pack('>i', READY_SIGNAL))
+                    self._stream(conn, self.frame_bytes // 2)
+            except OSError:
+                pass
+            finally:
+                self._conn = None
+                conn.close()
+
+    def _recv_exact(self, conn, n):
+        data = b''
+        while len(data) < n:
+            chunk = conn.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("backend closed during handshake")
+            data += chunk
+        return data
+
+    def _handshake_v2(self, conn):
+        """Offers everything this phone can do; returns (samples per packet, format, batch)."""
+        format_mask = 0
+        for name in self.formats:
+            format_mask |= FORMATS[name]
+        transports = TRANSPORT_TCP | (TRANSPORT_UDP if self.transport == "udp" else 0)
+        conn.sendall(INT.pack(V2_MAGIC) + HELLO.pack(2, self.sample_rate, format_mask,
+                                                     (1 << len(FRAME_MS)) - 1, self.max_batch, transports))
+        magic = INT.unpack(self._recv_exact(conn, 4))[0]
+        if magic != V2_MAGIC:
+            raise ConnectionError("backend does not speak v2")
+        config = CONFIG.unpack(self._recv_exact(conn, CONFIG.size))
+        _, _, sample_format, frame_ms, batch, _, transport, udp_port = config
+        conn.sendall(INT.pack(READY_SIGNAL) + CLOCK.pack(self.clock_us()))
+        self.negotiated = (sample_format, frame_ms, batch)
+        # Datagrams go to the backend's address as seen on the control connection
+        target = (conn.getpeername()[0], udp_port) if transport == TRANSPORT_UDP else None
+        return self.sample_rate * frame_ms // 1000 * batch, sample_format, batch, target
+
+    def _send_datagram(self, udp, target, data, held):
+        """Sends one datagram through a lossy, reordering "network". Returns the one now held back."""
+        if self._rng.random() < self.udp_loss:
+            self.datagrams_dropped += 1
+            return held
+        if held is None and self._rng.random() < self.udp_reorder:
+            self.datagrams_reordered += 1
+            return data
+        udp.sendto(data, target)
+        if held is not None:
+            udp.sendto(held, target)
+        return None
+
+    def _control_closed(self, conn):
+        readable, _, _ = select.select([conn], [], [], 0)
+        return bool(readable) and not conn.recv(4096)
+
+    def _stream(self, conn, samples, sample_format=FORMATS["s16"], batch=1, target=None):
+        silence, marker = self._build_frames(samples, sample_format)
+        v2 = self.protocol >= 2
+        packet_s = samples / self.sample_rate
+        # v2 packets: header + PCM behind the length; v1 frames: PCM only
+        length = INT.pack(len(silence) + (FRAME_HEADER.size if v2 else 0))
+        if not v2:
+            silence, marker = length + silence, length + marker
+        self.frame_s = packet_s
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if target else None
+        held = None
+        # marker_every_s=0: every frame is a marker (any audio at all is detected)
+        markers_every = max(1, int(round(self.marker_every_s / self.frame_s)))
+        burst_every = int(round(self.burst_every_s / self.frame_s)) if self.burst_every_s else 0
+        pending = b''
+        start = time.monotonic()
+        index = 0
+
+        try:
+            while self._running:
+                # Frame i is captured at start + (i + 1) * frame_s
+                capture = start + (index + 1) * self.frame_s
+                send_at = capture + self._rng.uniform(0, self.jitter_ms) / 1000.0
+                if burst_every and index % burst_every == 0 and index:
+                    # Stall, then the backlog goes out in one go
+                    send_at += self.burst_ms / 1000.0
+                if not self.flood:
+                    delay = send_at - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                if v2 and self.lose_every and index % self.lose_every == self.lose_every - 1:
+                    # Lost before it left the phone: the gap shows up in the sequence numbers
+                    self.frames_lost += batch
+                    index += 1
+                    continue
+
+                is_marker = index % markers_every == 0
+                data = marker if is_marker else silence
+                if is_marker:
+                    self.marker_times.append(capture)
+                if v2:
+                    # Sequence numbers count frames; a packet carries `batch` of them
+                    capture_us = int((capture + self.clock_offset_s) * 1e6)
+                    header = FRAME_HEADER.pack((index * batch) & 0xFFFFFFFF, capture_us)
+                    if udp:
+                        # One packet per datagram; TCP only carries the handshake and our liveness
+                        held = self._send_datagram(udp, target, header + data, held)
+                        self.frames_sent += 1
+                        index += 1
+                        if self._control_closed(conn):
+                            break
+                        continue
+                    data = length + header + data
+
+                if self.write_size:
+                    # Re-chunk the byte stream into arbitrary write sizes
+                    pending += data
+                    while len(pending) >= self.write_size:
+                        conn.sendall(pending[:self.write_size])
+                        pending = pending[self.write_size:]
+                else:
+                    conn.sendall(data)
+                self.frames_sent += 1
+                index += 1
+        finally:
+            if udp:
+                udp.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake MicRouter phone")
+    parser.add_argument("--port", type=int, default=6000)
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--frame-bytes", type=int, default=960)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=float, default=0.0, help="seconds between stalls")
+    parser.add_argument("--burst-ms", type=float, default=0.0, help="stall length")
+    parser.add_argument("--write-size", type=int, default=0)
+    parser.add_argument("--protocol", type=int, choices=(1, 2), default=1)
+    parser.add_argument("--batch", type=int, default=1, help="most frames per packet offered (v2)")
+    parser.add_argument("--transport", choices=("tcp", "udp"), default="tcp", help="audio transport offered (v2)")
+    parser.add_argument("--udp-loss", type=float, default=0.0, help="share of datagrams dropped")
+    parser.add_argument("--udp-reorder", type=float, default=0.0, help="share of datagrams delayed by one")
+    args = parser.parse_args()
+
+    phone = FakePhone(args.port, args.rate, args.frame_bytes, args.jitter_ms,
+                      args.burst_every, args.burst_ms, args.write_size,
+                      protocol=args.protocol, max_batch=args.batch, transport=args.transport,
+                      udp_loss=args.udp_loss, udp_reorder=args.udp_reorder)
+    print(f"[*] Fake phone listening on {phone.port}")
+    phone.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        phone.stop()
+
+
+if __name__ == "__main__":
+    main()
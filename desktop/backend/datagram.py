@@ -0,0 +1,195 @@
+import socket
+import time
+
+from protocol import FRAME_HEADER
+
+SEQ_MASK = 0xFFFFFFFF
+# Largest UDP payload
+MAX_DATAGRAM = 65507
+
+# ReorderBuffer.push() results
+HELD = 0   # Stored until its turn
+LATE = 1   # Its turn has passed (played or concealed): not stored
+AHEAD = 2  # Too far ahead to wait for the gap: flush with pop(flush=True), then push again
+DUPLICATE = 3  # Already held: dropped
+
+LOST = None  # Yielded by pop() for a packet given up on
+
+
+class ReorderBuffer:
+    """
+    Puts sequence-numbered packets back in order.
+
+    Packets are copied into a fixed set of preallocated slots indexed by
+    sequence number, so nothing is allocated per packet. A missing packet is
+    waited for until a packet behind it has been held for `window_ms`
+    (or the slots run out); then it is reported LOST so the caller can
+    conceal it, and playout carries on with the packets behind it.
+    """
+
+    def __init__(self, step=1, window_ms=20.0, slots=16, max_packet=MAX_DATAGRAM):
+        self.step = step  # Sequence numbers per packet (frames per packet)
+        self.window = window_ms / 1000.0
+        self.slots = slots
+        self._data = [bytearray(max_packet) for _ in range(slots)]
+        self._views = [memoryview(data) for data in self._data]
+        self._seq = [None] * slots
+        self._len = [0] * slots
+        self._arrival = [0.0] * slots
+        self.held = 0
+        self.expected = None
+        self._highest = 0  # Furthest held packet, in sequence numbers ahead of `expected`
+
+        self.reordered = 0
+        self.lost = 0
+        self.duplicates = 0
+
+    def _slot(self, seq):
+        return (seq // self.step) % self.slots
+
+    def push(self, seq, data, now):
+        """Stores a packet (copied). Returns HELD, LATE, AHEAD or DUPLICATE."""
+        if self.expected is None:
+            self.expected = seq
+        ahead = (seq - self.expected) & SEQ_MASK
+        if ahead >= 0x80000000:
+            return LATE
+        if ahead // self.step >= self.slots:
+            return AHEAD
+        slot = self._slot(seq)
+        if self._seq[slot] == seq:
+            self.duplicates += 1
+            return DUPLICATE
+        if self.held and ahead < self._highest:
+            # Filled a gap before it was given up on
+            self.reordered += 1
+        n = len(data)
+        self._views[slot][:n] = data
+        self._seq[slot] = seq
+        self._len[slot] = n
+        self._arrival[slot] = now
+        if not self.held or ahead > self._highest:
+            self._highest = ahead
+        self.held += 1
+        return HELD
+
+    def deadline(self):
+        """When the oldest held packet stops waiting for the gap ahead of it, or None."""
+        if not self.held:
+            return None
+        return min(self._arrival[i] for i in range(self.slots) if self._seq[i] is not None) + self.window
+
+    def pop(self, now, flush=False):
+        """
+        Yields the packets whose turn has come, in order, as memoryviews
+        (valid until the next push), and LOST for every packet given up on.
+        With `flush`, nothing more is waited for.
+        """
+        while self.held:
+            slot = self._slot(self.expected)
+            if self._seq[slot] == self.expected:
+                self._seq[slot] = None
+                self.held -= 1
+                self._highest -= self.step
+                yield self._views[slot][:self._len[slot]]
+            elif flush or self.held >= self.slots - 1 or now >= self.deadline():
+                self.lost += 1
+                self._highest -= self.step
+                yield LOST
+            else:
+                return
+            self.expected = (self.expected + self.step) & SEQ_MASK
+        if flush:
+            self.expected = None
+
+    def get_stats(self):
+        return {"window_ms": round(self.window * 1000, 1), "held": self.held,
+                "reordered": self.reordered, "lost": self.lost, "duplicates": self.duplicates}
+
+
+class DatagramReceiver:
+    """
+    Reads the phone's audio datagrams ([FRAME_HEADER][PCM], one packet each)
+    from a non-blocking UDP socket and hands them on in sequence order, so
+    one lost packet costs one concealed packet instead of stalling every
+    packet behind it like a TCP retransmit does.
+    """
+
+    def __init__(self, sock, peer_host, step=1, window_ms=20.0):
+        self.sock = sock
+        self.peer_host = peer_host
+        self.reorder = ReorderBuffer(step, window_ms)
+        self._buffer = bytearray(MAX_DATAGRAM)
+        self._view = memoryview(self._buffer)
+        self.datagrams = 0
+        self.rejected = 0  # From another host, or too short for a header
+        self.last_datagram = time.monotonic()
+        sock.setblocking(False)
+        self.drain()
+
+    def drain(self):
+        """Throws away whatever is queued (left over from an earlier connection)."""
+        try:
+            while True:
+                self.sock.recv_into(self._buffer)
+        except (BlockingIOError, InterruptedError, ConnectionResetError):
+            pass
+
+    def timeout(self, now):
+        """Seconds until a held packet stops waiting, or None."""
+        deadline = self.reorder.deadline()
+        return None if deadline is None else max(0.0, deadline - now)
+
+    def receive(self, play, conceal):
+        """
+        Reads every queued datagram, then calls play(packet) and conceal() in
+        sequence order for what is ready. Returns the number of datagrams read.
+        """
+        reorder = self.reorder
+        count = 0
+        while True:
+            try:
+                n, addr = self.sock.recvfrom_into(self._buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                # Windows reports an earlier ICMP "port unreachable" here
+                continue
+            now = time.monotonic()
+            if addr[0] != self.peer_host or n < FRAME_HEADER.size:
+                self.rejected += 1
+                continue
+            count += 1
+            data = self._view[:n]
+            seq = FRAME_HEADER.unpack_from(data)[0]
+            status = reorder.push(seq, data, now)
+            if status == AHEAD:
+                self._release(play, conceal, now, flush=True)
+                status = reorder.push(seq, data, now)
+            if status == LATE:
+                # Passed on so the link stats count it; it is not played
+                play(data)
+        if count:
+            self.datagrams += count
+            self.last_datagram = time.monotonic()
+        self._release(play, conceal, time.monotonic())
+        return count
+
+    def _release(self, play, conceal, now, flush=False):
+        for packet in self.reorder.pop(now, flush):
+            if packet is LOST:
+                conceal()
+            else:
+                play(packet)
+
+    def get_stats(self):
+        return {"datagrams": self.datagrams, "rejected": self.rejected, **self.reorder.get_stats()}
+
+
+def open_socket(host="0.0.0.0", port=0, rcvbuf=1 << 18):
+    """A UDP socket for the phone's datagrams; port 0 picks a free one."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try: sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    except OSError: pass
+    sock.bind((host, port))
+    return sock
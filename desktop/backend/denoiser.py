@@ -4,28 +4,53 @@ import numpy as np
 import platform
 
 class RNNoise:
-    def __init__(self):
-        self.lib = self._load_library()
-        
+    # Constants (48kHz audio, 10ms frame = 480 samples)
+    SAMPLE_RATE = 48000
+    FRAME_SIZE = 480
+
+    def __init__(self, lib=None):
+        self.lib = lib if lib is not None else self.load_library()
+
         # Initialize RNNoise State
         # rnnoise_create(model) -> returns state pointer
         self.lib.rnnoise_create.restype = ctypes.c_void_p
         self.lib.rnnoise_create.argtypes = [ctypes.c_void_p]
         self.state = self.lib.rnnoise_create(None)
-        
-        # Constants (48kHz audio, 10ms frame = 480 samples)
-        self.FRAME_SIZE = 480 
-        self.buffer = np.array([], dtype=np.int16)
 
         # Define process function: (state, output_float*, input_float*)
+        # Pointers are passed as plain addresses so no ctypes objects are built per call
         self.lib.rnnoise_process_frame.argtypes = [
-            ctypes.c_void_p, 
-            ctypes.POINTER(ctypes.c_float), 
-            ctypes.POINTER(ctypes.c_float)
+            ctypes.c_void_p,
+            ctypes.c_void_p,
+            ctypes.c_void_p
         ]
+        # Returns the frame's voice activity probability (0..1)
         self.lib.rnnoise_process_frame.restype = ctypes.c_float
+        self._process_frame = self.lib.rnnoise_process_frame
+        # VAD probability of the most recent frame
+        self.vad = 0.0
+
+        # --- OPTIMIZATION: Persistent work buffers, resolved to addresses once ---
+        # Single-frame buffers serve the common 10ms case without any slicing;
+        # batch buffers grow (rarely) to the largest batch seen, never shrink
+        self._in = np.zeros(self.FRAME_SIZE, dtype=np.float32)
+        self._out = np.zeros(self.FRAME_SIZE, dtype=np.float32)
+        self._in_addr = self._in.ctypes.data
+        self._out_addr = self._out.ctypes.data
+        self._reserve(self.FRAME_SIZE)
+        # Typed clip bounds avoid per-call scalar conversion
+        self._lo = np.float32(-32768)
+        self._hi = np.float32(32767)
 
-    def _load_library(self):
+        # Leftover samples (< 1 frame) carried between chunks of odd sizes
+        self._carry = np.zeros(self.FRAME_SIZE, dtype=np.int16)
+        self._carry_len = 0
+
+        # Output buffer for the bytes-in/bytes-out process() wrapper
+        self._bytes_out = np.zeros(self.FRAME_SIZE, dtype=np.int16)
+
+    @staticmethod
+    def load_library():
         # Look for the DLL in the 'libs' folder next to this script
         base_path = os.path.dirname(os.path.abspath(__file__))
         lib_name = "rnnoise.dll" if platform.system() == "Windows" else "rnnoise.so"
@@ -37,50 +62,129 @@ class RNNoise:
 
         if not os.path.exists(lib_path):
             raise FileNotFoundError(f"Could not find {lib_name}. It will be built by GitHub Actions.")
-            
+
         return ctypes.cdll.LoadLibrary(lib_path)
 
+    def _reserve(self, samples):
+        self._batch_in = np.zeros(samples, dtype=np.float32)
+        self._batch_out = np.zeros(samples, dtype=np.float32)
+        self._batch_in_addr = self._batch_in.ctypes.data
+        self._batch_out_addr = self._batch_out.ctypes.data
+
+    def process_many(self, samples, out):
+        """
+        Denoises a whole number of frames (int16, len a multiple of FRAME_SIZE)
+        into the caller-provided int16 buffer `out`. `out` may be `samples`.
+        Raises ValueError otherwise: RNNoise would read and write past the buffers.
+        """
+        n = len(samples)
+        if n % self.FRAME_SIZE:
+            raise ValueError(f"{n} samples is not a whole number of {self.FRAME_SIZE}-sample frames")
+        if len(out) < n:
+            raise ValueError(f"Output buffer holds {len(out)} samples, {n} needed")
+        if n == self.FRAME_SIZE:
+            frame_in, frame_out = self._in, self._out
+            frame_in[:] = samples
+            self.vad = self._process_frame(self.state, self._out_addr, self._in_addr)
+        else:
+            if len(self._batch_in) < n:
+                self._reserve(n)
+            frame_in = self._batch_in[:n]
+            frame_out = self._batch_out[:n]
+
+            # One vectorized conversion for the whole batch, then one C call per frame
+            frame_in[:] = samples
+            step = self.FRAME_SIZE * 4  # bytes per float32 frame
+            process_frame, state = self._process_frame, self.state
+            in_addr, out_addr = self._batch_in_addr, self._batch_out_addr
+            for offset in range(0, n * 4, step):
+                self.vad = process_frame(state, out_addr + offset, in_addr + offset)
+
+        # Clip instead of letting out-of-range floats wrap around in int16
+        np.minimum(frame_out, self._hi, out=frame_out)
+        np.maximum(frame_out, self._lo, out=frame_out)
+        out[:n] = frame_out
+        return out
+
+    def process_float(self, samples, out, vad=None):
+        """
+        Denoises whole frames of float32 samples (int16 scale) into `out`
+        (float32, may be `samples`). For callers that already keep audio in
+        float, such as the DSP chain; no int16 conversion or clipping.
+        If `vad` is given, it receives each frame's voice probability.
+        Returns the highest voice probability among the frames.
+        """
+        n = len(samples)
+        step = self.FRAME_SIZE
+        process_frame, state = self._process_frame, self.state
+        in_addr, out_addr = self._in_addr, self._out_addr
+        peak = 0.0
+        for i, offset in enumerate(range(0, n - n % step, step)):
+            # Through the single-frame buffers: RNNoise is not guaranteed to work in place
+            self._in[:] = samples[offset:offset + step]
+            self.vad = p = process_frame(state, out_addr, in_addr)
+            out[offset:offset + step] = self._out
+            if vad is not None:
+                vad[i] = p
+            if p > peak:
+                peak = p
+        return peak
+
+    def process_into(self, samples, out):
+        """
+        Denoises an int16 chunk of any length into `out`, which needs room for
+        len(samples) + FRAME_SIZE samples. Samples that don't complete a frame
+        are carried over to the next call.
+        Returns the number of samples written (a multiple of FRAME_SIZE).
+        """
+        n = len(samples)
+        if n == self.FRAME_SIZE and not self._carry_len:
+            self.process_many(samples, out)
+            return n
+
+        pos = 0
+        written = 0
+
+        # Complete the frame left over from the previous chunk first
+        if self._carry_len:
+            take = min(self.FRAME_SIZE - self._carry_len, n)
+            self._carry[self._carry_len:self._carry_len + take] = samples[:take]
+            self._carry_len += take
+            pos = take
+            if self._carry_len < self.FRAME_SIZE:
+                return 0
+            self.process_many(self._carry, out[:self.FRAME_SIZE])
+            self._carry_len = 0
+            written = self.FRAME_SIZE
+
+        # Fast path: every whole frame in one batch
+        whole = (n - pos) // self.FRAME_SIZE * self.FRAME_SIZE
+        if whole:
+            self.process_many(samples[pos:pos + whole], out[written:written + whole])
+            pos += whole
+            written += whole
+
+        rest = n - pos
+        if rest:
+            self._carry[:rest] = samples[pos:]
+            self._carry_len = rest
+        return written
+
     def process(self, chunk_bytes):
         """
-        Takes raw int16 bytes. Returns denoised raw int16 bytes.
+        Takes raw int16 bytes. Returns denoised raw int16 bytes
+        (empty until a full 10ms frame has been collected).
         """
-        # --- OPTIMIZATION: Fast Path for exact 10ms chunks ---
-        if len(chunk_bytes) == 960: # 480 samples * 2 bytes
-            # Convert bytes directly to float input buffer
-            frame_float = np.frombuffer(chunk_bytes, dtype=np.int16).astype(np.float32)
-            
-            # Prepare C pointers
-            in_ptr = frame_float.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
-            out_float = np.zeros(self.FRAME_SIZE, dtype=np.float32)
-            out_ptr = out_float.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
-
-            # Process immediately
-            self.lib.rnnoise_process_frame(self.state, out_ptr, in_ptr)
-
-            return out_float.astype(np.int16).tobytes()
-        
-        # --- Existing Slow Path (Buffering) for other sizes ---
-        new_data = np.frombuffer(chunk_bytes, dtype=np.int16)
-        self.buffer = np.concatenate((self.buffer, new_data))
-        
-        output_bytes = bytearray()
-        
-        while len(self.buffer) >= self.FRAME_SIZE:
-            frame = self.buffer[:self.FRAME_SIZE]
-            self.buffer = self.buffer[self.FRAME_SIZE:]
-
-            frame_float = frame.astype(np.float32)
-            in_ptr = frame_float.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
-            out_float = np.zeros(self.FRAME_SIZE, dtype=np.float32)
-            out_ptr = out_float.ctypes.data_as(ctypes.POINTER(ctypes.c_float))
-
-            self.lib.rnnoise_process_frame(self.state, out_ptr, in_ptr)
-
-            processed_frame = out_float.astype(np.int16)
-            output_bytes.extend(processed_frame.tobytes())
-
-        return bytes(output_bytes)
+        samples = np.frombuffer(chunk_bytes, dtype=np.int16, count=len(chunk_bytes) // 2)
+        if len(self._bytes_out) < len(samples) + self.FRAME_SIZE:
+            self._bytes_out = np.zeros(len(samples) + self.FRAME_SIZE, dtype=np.int16)
+        written = self.process_into(samples, self._bytes_out)
+        return self._bytes_out[:written].tobytes()
 
     def destroy(self):
+        """Frees the native state; the instance can't process afterwards. Safe to call twice."""
+        if self.state is None:
+            return
         self.lib.rnnoise_destroy.argtypes = [ctypes.c_void_p]
         self.lib.rnnoise_destroy(self.state)
+        self.state = None
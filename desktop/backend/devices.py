@@ -0,0 +1,219 @@
+import threading
+import time
+
+PA_INT16 = 8  # pyaudio.paInt16
+
+
+def _comparable(entry):
+    # PortAudio indices move around on every re-scan; they are not a change in themselves
+    return {key: value for key, value in entry.items() if key != "index"}
+
+
+class DeviceRegistry:
+    """
+    Cached list of output devices with stable ids and metadata.
+
+    Lookups (get_devices, stream start) only read the cache; enumeration runs
+    once at startup and then on a background thread. Each entry is a plain
+    dict: "id" (host API + name, stable across re-scans and replugs), "name",
+    the current PortAudio "index", "host_api", "default_sample_rate", output
+    latencies, and "rate": the first of the default / 48k / 44.1k rates that
+    PortAudio confirmed for mono int16 output, so opening the stream later
+    neither probes nor fails (None if none could be confirmed).
+
+    PortAudio only notices hotplugged devices after it is re-initialized,
+    which would kill open streams, so the background refresh re-initializes
+    only while `busy()` is False (no session or output stream). `lock` is
+    held while PortAudio is re-initialized; hold it while opening or closing
+    streams. A stream start that arrives mid-scan waits for that scan, so
+    the periodic re-scan is rare; request_refresh() (the UI's refresh) runs
+    one right away.
+    """
+
+    # A new instance can't be scanned outside the lock and swapped in: Pa_Initialize is
+    # reference counted, so PortAudio only re-initializes once every instance is terminated
+    REFRESH_INTERVAL = 60.0
+    CANDIDATE_RATES = (48000, 44100)
+
+    def __init__(self, pa_factory, sample_format=PA_INT16, busy=None, on_change=None,
+                 interval=REFRESH_INTERVAL):
+        self.pa_factory = pa_factory  # Creates a PyAudio instance (None: no PortAudio)
+        self.pa = pa_factory() if pa_factory else None
+        self.sample_format = sample_format
+        self.busy = busy or (lambda: False)
+        self.on_change = on_change  # Callable taking a diff dict, called from the refresh thread
+        self.interval = interval
+        self.lock = threading.RLock()
+
+        # Replaced as a whole on every scan, so readers never see a partial list
+        self.devices = {}
+        self.default_id = None
+        self.scans = 0
+        self.last_scan_ms = 0.0
+
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def refresh(self, reinit=True):
+        """
+        Re-enumerates the output devices (re-initializing PortAudio first if
+        `reinit`, so hotplugged devices show up). Returns the diff, or None if
+        nothing changed or the scan was skipped because a stream is open.
+        """
+        with self.lock:
+            if self.pa is None:
+                return None
+            if reinit:
+                if self.busy():
+                    return None
+                try: self.pa.terminate()
+                except Exception: pass
+                self.pa = self.pa_factory()
+            t0 = time.perf_counter()
+            devices, default_id = self._enumerate()
+            self.last_scan_ms = (time.perf_counter() - t0) * 1000
+
+        old = self.devices
+        self.devices = devices
+        self.default_id = default_id
+        self.scans += 1
+        diff = self.diff(old, devices)
+        if diff and self.on_change:
+            self.on_change(diff)
+        return diff
+
+    def _enumerate(self):
+        """Walks every host API and device. Prefers WASAPI (low latency) when a device appears under several APIs."""
+        pa = self.pa
+
+        # 1. Host API names, and the WASAPI index
+        api_names = {}
+        wasapi_index = -1
+        try:
+            for i in range(pa.get_host_api_count()):
+                api_names[i] = pa.get_host_api_info_by_index(i).get("name", "")
+                if wasapi_index < 0 and "WASAPI" in api_names[i]:
+                    wasapi_index = i
+        except Exception: pass
+
+        try:
+            total_devices = pa.get_device_count()
+        except Exception:
+            total_devices = 0
+
+        # 2. Output devices by name: a WASAPI entry replaces any other,
+        # a generic one (MME/DirectSound) is only kept if the name is new
+        by_name = {}
+        for i in range(total_devices):
+            try:
+                dev = pa.get_device_info_by_index(i)
+                if dev.get("maxOutputChannels") > 0:
+                    name = dev.get("name")
+                    if dev.get("hostApi") == wasapi_index or name not in by_name:
+                        by_name[name] = (i, dev)
+            except Exception: continue
+
+        try:
+            default_name = pa.get_default_output_device_info().get("name")
+        except Exception:
+            default_name = None
+
+        # 3. Metadata, and the rate each device is known to accept
+        devices = {}
+        default_id = None
+        for name, (index, dev) in by_name.items():
+            device_id = f"{api_names.get(dev.get('hostApi'), '')}:{name}"
+            default_rate = int(dev.get("defaultSampleRate") or 0)
+            devices[device_id] = {
+                "id": device_id,
+                "name": name,
+                "index": index,
+                "host_api": api_names.get(dev.get("hostApi"), ""),
+                "default_sample_rate": default_rate,
+                "low_latency_ms": round(float(dev.get("defaultLowOutputLatency") or 0) * 1000, 1),
+                "high_latency_ms": round(float(dev.get("defaultHighOutputLatency") or 0) * 1000, 1),
+                "max_channels": dev.get("maxOutputChannels"),
+                "rate": self._supported_rate(index, default_rate),
+                "default": name == default_name,
+            }
+            if name == default_name:
+                default_id = device_id
+        return devices, default_id
+
+    def _supported_rate(self, index, default_rate):
+        """The first rate PortAudio accepts for mono int16 output on the device, or None."""
+        for rate in (default_rate, *self.CANDIDATE_RATES):
+            if not rate:
+                continue
+            try:
+                if self.pa.is_format_supported(rate, output_device=index, output_channels=1,
+                                               output_format=self.sample_format):
+                    return rate
+            except ValueError:
+                continue
+            except Exception:
+                break
+        return None
+
+    @staticmethod
+    def diff(old, new):
+        """{"added": [...], "removed": [...], "changed": [...]} between two scans, or None."""
+        added = [entry for key, entry in new.items() if key not in old]
+        removed = [entry for key, entry in old.items() if key not in new]
+        changed = [entry for key, entry in new.items()
+                   if key in old and _comparable(entry) != _comparable(old[key])]
+        if not (added or removed or changed):
+            return None
+        return {"added": added, "removed": removed, "changed": changed}
+
+    def list(self):
+        return list(self.devices.values())
+
+    def get(self, key):
+        """Entry by id or by name (as shown in the UI), or None."""
+        devices = self.devices
+        entry = devices.get(key)
+        if entry is None and key is not None:
+            entry = next((e for e in devices.values() if e["name"] == key), None)
+        return entry
+
+    def default(self):
+        return self.devices.get(self.default_id)
+
+    def start(self):
+        """Starts the background refresh (no-op with interval 0)."""
+        if not self.interval or self._thread:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request_refresh(self):
+        """Makes the background thread re-scan now."""
+        self._wake.set()
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if not self._running:
+                break
+            try:
+                self.refresh()
+            except Exception:
+                pass
+
+    def close(self):
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        with self.lock:
+            if self.pa is not None:
+                try: self.pa.terminate()
+                except Exception: pass
+
+    def get_stats(self):
+        return {"devices": len(self.devices), "scans": self.scans, "last_scan_ms": round(self.last_scan_ms, 1)}
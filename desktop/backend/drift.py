@@ -0,0 +1,93 @@
+import time
+
+
+class DriftEstimator:
+    """
+    Tracks the phone-vs-soundcard clock drift from the playout buffer level.
+
+    If the phone's clock runs fast the buffer slowly fills, if it runs slow
+    it drains. A PI controller on the smoothed buffer depth produces a
+    resampling correction in ppm: the proportional part pulls the depth back
+    to target, the integral part converges to the actual clock drift, which
+    is what we report.
+    """
+
+    # Buffer level smoothing time constant (seconds); hides network jitter
+    SMOOTHING_S = 2.0
+    # ppm of correction per ms of depth error
+    KP = 40.0
+    # ppm per (ms * s) of accumulated error
+    KI = 0.4
+    # Real clocks are within a few hundred ppm; anything beyond is not drift
+    MAX_PPM = 1000.0
+    # Errors larger than this are transients (overrun trims, refills), not drift:
+    # they are clamped for the proportional part and not integrated
+    MAX_ERROR_MS = 20.0
+    # A moved target (the adaptive jitter buffer grows it at once) is approached at this
+    # pace, with the matching correction fed forward; integration waits until it is reached
+    TARGET_SLEW_MS_PER_S = 0.5
+    # Observations further apart than this follow a pause (re-prime, closed gate,
+    # reconnect): timing restarts instead of integrating the whole gap
+    MAX_GAP_S = 0.5
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.smoothed_ms = None
+        self.drift_ppm = 0.0      # Integral term: the estimated clock drift
+        self.correction_ppm = 0.0  # What the resampler is told to apply
+        self.reference_ms = None   # Depth the loop steers to, following the target
+        self._last = None
+
+    def pause(self):
+        """Observations stop for a while; the estimate is kept, the next update restarts timing."""
+        self._last = None
+        # The buffer re-primes to the target
+        self.reference_ms = None
+
+    def update(self, depth_ms, target_ms, now=None):
+        """Feeds one buffer level observation. Returns the correction in ppm."""
+        if now is None:
+            now = time.monotonic()
+        if self._last is None or now - self._last > self.MAX_GAP_S:
+            self._last = now
+            if self.smoothed_ms is None:
+                self.smoothed_ms = depth_ms
+            if self.reference_ms is None:
+                self.reference_ms = target_ms
+            return self.correction_ppm
+
+        dt = now - self._last
+        self._last = now
+        if dt <= 0:
+            return self.correction_ppm
+
+        alpha = min(1.0, dt / self.SMOOTHING_S)
+        self.smoothed_ms += (depth_ms - self.smoothed_ms) * alpha
+
+        # --- OPTIMIZATION: bumpless target changes ---
+        # Stepping the error by a target change would wind the integral up to hundreds of
+        # ppm of phantom drift. The reference ramps to the new target instead and the
+        # ramp's own correction is fed forward, so the loop only sees real mismatch.
+        step = self.TARGET_SLEW_MS_PER_S * dt
+        move = max(-step, min(step, target_ms - self.reference_ms))
+        self.reference_ms += move
+        feedforward = -move / dt * 1000.0  # Filling at 1ms/s takes 1000ppm slower consumption
+
+        error = self.smoothed_ms - self.reference_ms
+        if abs(error) <= self.MAX_ERROR_MS and self.reference_ms == target_ms:
+            self.drift_ppm += self.KI * error * dt
+            self.drift_ppm = max(-self.MAX_PPM, min(self.MAX_PPM, self.drift_ppm))
+        error = max(-self.MAX_ERROR_MS, min(self.MAX_ERROR_MS, error))
+
+        # Buffer too full -> consume input faster (positive ppm) and vice versa
+        correction = self.drift_ppm + self.KP * error + feedforward
+        self.correction_ppm = max(-self.MAX_PPM, min(self.MAX_PPM, correction))
+        return self.correction_ppm
+
+    def get_stats(self):
+        return {
+            "drift_ppm": round(self.drift_ppm, 1),
+            "correction_ppm": round(self.correction_ppm, 1),
+        }
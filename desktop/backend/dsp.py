@@ -0,0 +1,535 @@
+import math
+import threading
+import numpy as np
+from time import perf_counter_ns
+
+FULL_SCALE = 32768.0
+CEILING = 32767.0
+FRAME_SIZE = 480  # RNNoise frame; the chain keeps this much headroom for carried samples
+
+
+class Stage:
+    """
+    One step of the DSP chain.
+
+    process(buf, n) works in place on buf[:n] (float32, int16 scale) and
+    returns the number of valid samples afterwards; only the denoiser ever
+    changes it. Scratch space is allocated once in allocate(), so stages can
+    be configured, toggled and reordered while streaming without allocating.
+    """
+
+    name = ""
+    # Tunable parameters and their types, as accepted by configure()
+    PARAMS = {}
+
+    def __init__(self):
+        self.enabled = False
+        self.rate = 48000
+
+    def allocate(self, capacity):
+        pass
+
+    def set_rate(self, rate):
+        self.rate = rate
+        self.prepare()
+
+    def prepare(self):
+        """Recomputes coefficients after a parameter or rate change."""
+        pass
+
+    def reset(self):
+        """Clears signal state (filter memory, carried samples) between streams."""
+        pass
+
+    def close(self):
+        """Frees native resources held by the stage."""
+        pass
+
+    def configure(self, **params):
+        for key, value in params.items():
+            if key == "enabled":
+                self.enabled = bool(value)
+            elif key in self.PARAMS:
+                setattr(self, key, self.PARAMS[key](value))
+            else:
+                raise ValueError(f"Unknown parameter '{key}' for stage '{self.name}'")
+        self.prepare()
+
+    def get_config(self):
+        return {"enabled": self.enabled, **{key: getattr(self, key) for key in self.PARAMS}}
+
+    def process(self, buf, n):
+        return n
+
+
+class GainRamp:
+    """Applies a gain moving linearly from one value to another across a block."""
+
+    def __init__(self, capacity):
+        self._base = np.arange(1, capacity + 1, dtype=np.float32)
+        self._ramp = np.zeros(capacity, dtype=np.float32)
+
+    def apply(self, x, start, end):
+        n = len(x)
+        if start == end:
+            if start != 1.0:
+                np.multiply(x, np.float32(start), out=x)
+            return
+        ramp = self._ramp[:n]
+        np.multiply(self._base[:n], np.float32((end - start) / n), out=ramp)
+        np.add(ramp, np.float32(start), out=ramp)
+        np.multiply(x, ramp, out=x)
+
+
+class Denoise(Stage):
+    """RNNoise on whole 10ms frames; needs 48kHz and carries partial frames over."""
+
+    name = "denoise"
+    SAMPLE_RATE = 48000
+
+    def __init__(self, rnnoise=None, native=True):
+        super().__init__()
+        self.rnnoise = rnnoise
+        # False for chains that only hold settings: enabling then allocates no RNNoise state
+        self.native = native
+        # Held while RNNoise runs, so the state is never freed under the stream thread
+        self._lock = threading.Lock()
+        self._carry_len = 0
+        # Highest voice probability among the frames of the last block (None before the first)
+        self.vad = None
+
+    def allocate(self, capacity):
+        # Carried samples at the head, the new block behind them
+        work = np.zeros(capacity + FRAME_SIZE, dtype=np.float32)
+        if getattr(self, "_work", None) is not None:
+            work[:self._carry_len] = self._work[:self._carry_len]
+        self._work = work
+
+    def configure(self, **params):
+        if params.get("enabled"):
+            from denoiser import RNNoise
+            if not self.native:
+                RNNoise.load_library()  # Only checks the library is there (raises if missing)
+            elif self.rnnoise is None:
+                self.rnnoise = RNNoise()  # May raise if the library is missing
+        elif "enabled" in params:
+            # Disabled: give the native state back, a fresh one is made when re-enabled
+            self.close()
+        super().configure(**params)
+
+    def reset(self):
+        self._carry_len = 0
+        self.vad = None
+
+    def close(self):
+        with self._lock:
+            rnnoise, self.rnnoise = self.rnnoise, None
+            self._carry_len = 0
+        if rnnoise is not None:
+            rnnoise.destroy()
+
+    def process(self, buf, n):
+        with self._lock:
+            rnnoise = self.rnnoise
+            if rnnoise is None:
+                return n
+            carry = self._carry_len
+            total = carry + n
+            whole = total // FRAME_SIZE * FRAME_SIZE
+            if not carry and whole == n:
+                # Aligned block: denoise straight into the chain buffer
+                if n:
+                    self.vad = rnnoise.process_float(buf[:n], buf[:n])
+                return n
+
+            work = self._work
+            work[carry:total] = buf[:n]
+            if whole:
+                self.vad = rnnoise.process_float(work[:whole], buf[:whole])
+            rest = total - whole
+            if rest and whole:
+                work[:rest] = work[whole:total]
+            self._carry_len = rest
+            return whole
+
+
+class Gate(Stage):
+    """
+    Noise gate driven by the denoiser's voice activity probability.
+
+    Opens as soon as a block's VAD reaches `threshold`, stays open for
+    `hold_ms` after the last voiced block, then fades out over `release_ms`.
+    While closed the chain stops here and hands back silence, so the stages
+    after it (and the session's metering) are skipped; with `skip_output` the
+    session does not even queue the silence. Stays open without a VAD reading.
+    """
+
+    name = "gate"
+    PARAMS = {"threshold": float, "hold_ms": float, "release_ms": float, "skip_output": bool}
+
+    def __init__(self, source=None):
+        super().__init__()
+        self.source = source  # The Denoise stage providing VAD
+        self.threshold = 0.6
+        self.hold_ms = 300.0
+        self.release_ms = 50.0
+        self.skip_output = False
+        self.level = 1.0
+        self.closed = False
+        self._hold_left = 0
+
+    def allocate(self, capacity):
+        self._ramp = GainRamp(capacity + FRAME_SIZE)
+
+    def reset(self):
+        self.level = 1.0
+        self.closed = False
+        self._hold_left = 0
+
+    def process(self, buf, n):
+        source = self.source
+        vad = source.vad if source is not None and source.enabled else None
+        start = self.level
+        if vad is None or vad >= self.threshold:
+            self._hold_left = int(self.rate * self.hold_ms / 1000)
+            end = 1.0
+        elif self._hold_left > 0:
+            self._hold_left -= n
+            end = 1.0
+        else:
+            end = max(0.0, start - n / max(1.0, self.rate * self.release_ms / 1000))
+        self.level = end
+        self.closed = start == 0.0 and end == 0.0
+        if not self.closed:
+            # Opening fades in across the block, closing fades out over release_ms
+            self._ramp.apply(buf[:n], start, end)
+        return n
+
+
+class HighPass(Stage):
+    """
+    First-order high-pass (DC and rumble removal).
+
+    The recursion y[i] = a * (y[i-1] + x[i] - x[i-1]) is evaluated in closed
+    form, y[i] = a^(i+1) * (y[-1] + sum_k a^-k * dx[k]), with one cumsum per
+    block instead of a Python loop per sample. Blocks are kept short enough
+    that a^-k stays well within float64 precision.
+    """
+
+    name = "highpass"
+    PARAMS = {"cutoff_hz": float}
+    MAX_GROWTH = 1e6
+
+    def __init__(self):
+        super().__init__()
+        self.cutoff_hz = 80.0
+        self._x_prev = 0.0
+        self._y_prev = 0.0
+        self.prepare()
+
+    def allocate(self, capacity):
+        # float64 scratch: the a^-k scaling needs the precision, and mixed-type
+        # ufunc calls would allocate casting buffers
+        self._x = np.zeros(FRAME_SIZE, dtype=np.float64)
+        self._diff = np.zeros(FRAME_SIZE, dtype=np.float64)
+
+    def prepare(self):
+        a = math.exp(-2 * math.pi * max(self.cutoff_hz, 1.0) / self.rate)
+        self.block = max(1, min(FRAME_SIZE, int(math.log(self.MAX_GROWTH) / -math.log(a))))
+        k = np.arange(self.block, dtype=np.float64)
+        self._pow_neg = a ** -k
+        self._pow_pos = a ** (k + 1)
+
+    def reset(self):
+        self._x_prev = 0.0
+        self._y_prev = 0.0
+
+    def process(self, buf, n):
+        block = self.block
+        for start in range(0, n, block):
+            out = buf[start:min(n, start + block)]
+            m = len(out)
+            x = self._x[:m]
+            d = self._diff[:m]
+            x[:] = out
+            np.subtract(x[1:], x[:-1], out=d[1:])
+            d[0] = x[0] - self._x_prev
+            self._x_prev = x[-1]
+
+            np.multiply(d, self._pow_neg[:m], out=d)
+            np.add.accumulate(d, out=d)
+            np.add(d, self._y_prev, out=d)
+            np.multiply(d, self._pow_pos[:m], out=d)
+            self._y_prev = d[-1]
+            out[:] = d
+        return n
+
+
+class Gain(Stage):
+    """Static gain; changes are ramped over `ramp_ms` so they never click."""
+
+    name = "gain"
+    PARAMS = {"gain": float, "ramp_ms": float}
+
+    def __init__(self):
+        super().__init__()
+        self.enabled = True
+        self.gain = 1.0
+        self.ramp_ms = 20.0
+        self.current = 1.0
+        self._step = 0.0
+        self._ramp_left = 0
+
+    def allocate(self, capacity):
+        self._ramp = GainRamp(capacity + FRAME_SIZE)
+
+    def prepare(self):
+        if self.gain != self.current:
+            self._ramp_left = max(1, int(self.rate * self.ramp_ms / 1000))
+            self._step = (self.gain - self.current) / self._ramp_left
+
+    def reset(self):
+        self.current = self.gain
+        self._ramp_left = 0
+
+    def process(self, buf, n):
+        k = 0
+        if self._ramp_left:
+            k = min(n, self._ramp_left)
+            end = self.current + self._step * k
+            self._ramp_left -= k
+            if not self._ramp_left:
+                end = self.gain
+            self._ramp.apply(buf[:k], self.current, end)
+            self.current = end
+        if k < n:
+            self._ramp.apply(buf[k:n], self.current, self.current)
+        return n
+
+
+class SoftLimiter(Stage):
+    """
+    Leaves everything below `threshold` (fraction of full scale) untouched and
+    bends peaks above it smoothly (tanh knee) towards full scale, instead of
+    hard clipping. Frames that stay below the threshold cost two reductions.
+    """
+
+    name = "limiter"
+    PARAMS = {"threshold": float}
+
+    def __init__(self):
+        super().__init__()
+        self.enabled = True
+        self.threshold = 0.9
+        self.prepare()
+
+    def allocate(self, capacity):
+        self._excess = np.zeros(capacity + FRAME_SIZE, dtype=np.float32)
+        self._shaped = np.zeros(capacity + FRAME_SIZE, dtype=np.float32)
+
+    def prepare(self):
+        self.threshold = min(max(self.threshold, 0.1), 0.999)
+        self._knee = np.float32(self.threshold * CEILING)
+        self._range = np.float32(CEILING - self._knee)
+
+    def process(self, buf, n):
+        x = buf[:n]
+        if max(x.max(), -x.min()) <= self._knee:
+            return n
+        excess = self._excess[:n]
+        shaped = self._shaped[:n]
+        # excess = max(|x| - knee, 0); shaped = range * tanh(excess / range)
+        np.abs(x, out=excess)
+        np.subtract(excess, self._knee, out=excess)
+        np.maximum(excess, 0, out=excess)
+        np.divide(excess, self._range, out=shaped)
+        np.tanh(shaped, out=shaped)
+        np.multiply(shaped, self._range, out=shaped)
+        # Pull each sample back by (excess - shaped), towards zero
+        np.subtract(excess, shaped, out=excess)
+        np.copysign(excess, x, out=excess)
+        np.subtract(x, excess, out=x)
+        return n
+
+
+class AutoGain(Stage):
+    """
+    Automatic gain control towards a target RMS level (dBFS).
+    Gain falls quickly (attack) and rises slowly (release); frames below the
+    gate are treated as silence and leave the gain where it is, so noise is
+    not pumped up between words.
+    """
+
+    name = "agc"
+    PARAMS = {"target_db": float, "max_gain_db": float, "min_gain_db": float,
+              "attack_ms": float, "release_ms": float, "gate_db": float}
+
+    def __init__(self):
+        super().__init__()
+        self.target_db = -20.0
+        self.max_gain_db = 20.0
+        self.min_gain_db = -10.0
+        self.attack_ms = 20.0
+        self.release_ms = 1000.0
+        self.gate_db = -55.0
+        self.gain_db = 0.0
+
+    def allocate(self, capacity):
+        self._ramp = GainRamp(capacity + FRAME_SIZE)
+
+    def reset(self):
+        self.gain_db = 0.0
+
+    def process(self, buf, n):
+        if not n:
+            return n
+        x = buf[:n]
+        power = float(np.dot(x, x)) / n
+        level_db = 10 * math.log10(power / (FULL_SCALE * FULL_SCALE)) if power > 0 else -120.0
+
+        start = self.gain_db
+        if level_db > self.gate_db:
+            desired = min(self.max_gain_db, max(self.min_gain_db, self.target_db - level_db))
+            tau_ms = self.attack_ms if desired < start else self.release_ms
+            coef = 1.0 - math.exp(-n / (self.rate * max(tau_ms, 0.1) / 1000))
+            self.gain_db = start + (desired - start) * coef
+
+        self._ramp.apply(x, 10 ** (start / 20), 10 ** (self.gain_db / 20))
+        return n
+
+
+class DspChain:
+    """
+    Configurable, reorderable in-place processing chain.
+
+    Frames are converted once into a float32 buffer allocated per stream,
+    run through the enabled stages in `order`, then clamped and converted
+    back into a preallocated int16 buffer. Reconfiguring never reallocates.
+    """
+
+    STAGES = (Denoise, Gate, HighPass, AutoGain, Gain, SoftLimiter)
+    DEFAULT_ORDER = ("denoise", "gate", "highpass", "agc", "gain", "limiter")
+
+    def __init__(self, sample_rate=48000, capacity=65536 // 2, native=True):
+        self.rate = sample_rate
+        self.stages = {cls.name: cls() for cls in self.STAGES}
+        # Settings-only chains (templates) never allocate denoiser state
+        self.stages["denoise"].native = native
+        self.gate = self.stages["gate"]
+        self.gate.source = self.stages["denoise"]
+        # True when the last block was cut by the closed gate
+        self.gated = False
+        self.order = list(self.DEFAULT_ORDER)
+        # Bumped on every settings change, so copies of the chain know when to resync
+        self.version = 0
+        self._allocate(capacity)
+        self.set_rate(sample_rate)
+        self._refresh()
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity + FRAME_SIZE, dtype=np.float32)
+        self.out = np.zeros(capacity + FRAME_SIZE, dtype=np.int16)
+        self.silence = np.zeros(capacity + FRAME_SIZE, dtype=np.int16)
+        for stage in self.stages.values():
+            stage.allocate(capacity)
+
+    def _refresh(self):
+        # Replaced as a whole, so the stream thread never sees a half-built list
+        self.active = [self.stages[name] for name in self.order if self.stages[name].enabled]
+
+    @property
+    def required_rate(self):
+        """48kHz while the denoiser is active (RNNoise only works there), else None."""
+        denoise = self.stages["denoise"]
+        return Denoise.SAMPLE_RATE if denoise.enabled and denoise.rnnoise else None
+
+    @property
+    def vad(self):
+        """Voice probability of the last block, or None while the denoiser is off."""
+        denoise = self.stages["denoise"]
+        return denoise.vad if denoise.enabled and denoise.rnnoise else None
+
+    def set_rate(self, rate):
+        self.rate = rate
+        for stage in self.stages.values():
+            stage.set_rate(rate)
+        self.version += 1
+
+    def reset(self):
+        for stage in self.stages.values():
+            stage.reset()
+
+    def close(self):
+        """Frees the denoiser's native state. The chain still works, without it."""
+        for stage in self.stages.values():
+            stage.close()
+
+    def configure(self, name, **params):
+        stage = self.stages.get(name)
+        if stage is None:
+            raise ValueError(f"Unknown DSP stage '{name}'")
+        stage.configure(**params)
+        self._refresh()
+        self.version += 1
+
+    def set_order(self, order):
+        """Stages run in this order; stages left out are bypassed."""
+        order = list(order)
+        unknown = [name for name in order if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown DSP stage(s): {', '.join(unknown)}")
+        if len(set(order)) != len(order):
+            raise ValueError("DSP order lists a stage twice")
+        self.order = order
+        self._refresh()
+        self.version += 1
+
+    def apply(self, settings):
+        """Applies {"order": [...], "stages": {name: {param: value}}} (both optional)."""
+        if settings.get("order") is not None:
+            self.set_order(settings["order"])
+        for name, params in (settings.get("stages") or {}).items():
+            self.configure(name, **params)
+
+    def describe(self):
+        return {
+            "order": list(self.order),
+            "stages": {name: stage.get_config() for name, stage in self.stages.items()},
+        }
+
+    def process(self, samples, stats=None):
+        """
+        Runs int16 `samples` through the chain. Returns an int16 view of the
+        output buffer (valid until the next call), possibly shorter than the
+        input while the denoiser collects a frame. While the gate is closed,
+        `gated` is set and the result is a view of preallocated silence.
+        """
+        self.gated = False
+        gate = self.gate
+        n = len(samples)
+        if n > self.capacity:
+            self._allocate(n)
+        buf = self.buffer
+        buf[:n] = samples
+
+        for stage in self.active:
+            if stats:
+                t0 = perf_counter_ns()
+                n = stage.process(buf, n)
+                stats.record(stage.name, perf_counter_ns() - t0)
+            else:
+                n = stage.process(buf, n)
+            if not n:
+                return self.out[:0]
+            if stage is gate and gate.closed:
+                self.gated = True
+                return self.silence[:n]
+
+        x = buf[:n]
+        np.minimum(x, np.float32(CEILING), out=x)
+        np.maximum(x, np.float32(-FULL_SCALE), out=x)
+        np.rint(x, out=x)
+        out = self.out[:n]
+        out[:] = x
+        return out
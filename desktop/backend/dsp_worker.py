@@ -0,0 +1,246 @@
+import json
+import multiprocessing
+import struct
+from multiprocessing import shared_memory
+from time import perf_counter_ns
+
+import numpy as np
+
+from dsp import DspChain, FRAME_SIZE
+
+# Pipe messages start with a tag byte. Frames only ever travel as a slot index
+# and a sample count; the samples themselves stay in shared memory.
+FRAME = struct.Struct("<cII")     # b"F", slot, samples in
+# b"R", slot, samples out, processing ns, AGC gain (dB), VAD (-1: none), gated
+RESULT = struct.Struct("<cIIQdd?")
+CONFIG = b"C"                     # + JSON chain settings (with "rate")
+RESET = b"X"
+QUIT = b"Q"
+READY = b"K"
+ERROR = b"E"                      # + message
+
+
+class WorkerError(RuntimeError):
+    """The DSP worker process failed, hung or went away."""
+
+
+class SharedFrameRing:
+    """
+    Fixed-size int16 frame slots in one shared memory block, used round-robin.
+
+    The creating side owns (and unlinks) the block; the other process attaches
+    by name. A slot's contents stay valid until it comes round again, `slots`
+    frames later.
+    """
+
+    def __init__(self, slots, slot_samples, name=None):
+        self.slots = slots
+        self.slot_samples = slot_samples
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=slots * slot_samples * 2)
+        self.frames = np.ndarray((slots, slot_samples), dtype=np.int16, buffer=self.shm.buf)
+        self._next = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def next_slot(self):
+        slot = self._next
+        self._next = (slot + 1) % self.slots
+        return slot
+
+    def close(self):
+        # Views into the block must be gone before it can be closed
+        self.frames = None
+        try: self.shm.close()
+        except BufferError: pass
+        if self.owner:
+            try: self.shm.unlink()
+            except FileNotFoundError: pass
+
+
+def worker_main(shm_name, slots, slot_samples, capacity, conn):
+    """Entry point of the worker process: runs frames through its own DspChain until told to quit."""
+    ring = SharedFrameRing(slots, slot_samples, name=shm_name)
+    frames = ring.frames
+    chain = DspChain(capacity=capacity)
+    conn.send_bytes(READY)
+    try:
+        while True:
+            try:
+                message = conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+            tag = message[:1]
+            if tag == b"F":
+                _, slot, n = FRAME.unpack(message)
+                t0 = perf_counter_ns()
+                # The chain copies the input into its float buffer, so the
+                # output can go back into the same slot
+                out = chain.process(frames[slot, :n])
+                frames[slot, :len(out)] = out
+                vad = chain.vad
+                conn.send_bytes(RESULT.pack(b"R", slot, len(out), perf_counter_ns() - t0,
+                                            chain.stages["agc"].gain_db,
+                                            -1.0 if vad is None else vad, chain.gated))
+            elif tag == CONFIG:
+                settings = json.loads(message[1:])
+                try:
+                    chain.apply(settings)
+                    if settings["rate"] != chain.rate:
+                        chain.set_rate(settings["rate"])
+                except Exception as e:
+                    conn.send_bytes(ERROR + str(e).encode('utf-8'))
+            elif tag == RESET:
+                chain.reset()
+            elif tag == QUIT:
+                break
+    finally:
+        chain.close()
+        frames = None
+        ring.close()
+
+
+class DspWorker:
+    """
+    Runs the DSP chain in a separate process, so denoising and gain math no
+    longer share the GIL with the UI handler, the watchdog and socket I/O.
+
+    Frames are copied into a SharedFrameRing slot; only the slot index and
+    sample count cross the pipe, and the reply points at the processed samples
+    in the same slot. The pipe's read/write syscalls also order the shared
+    memory accesses, so no locks are involved. The caller's DspChain stays the
+    source of truth for settings; the worker's copy is resynced whenever its
+    `version` moves.
+
+    process() is synchronous (no added buffering latency): the stream thread
+    sleeps in the pipe read while the worker computes. `last_overhead_ns` is
+    the round trip minus the worker's own processing time.
+    """
+
+    START_TIMEOUT = 10.0
+    # A reply later than this means the worker is hung; the caller falls back in-process
+    TIMEOUT = 0.25
+
+    def __init__(self, capacity=65536 // 2, slots=2, timeout=TIMEOUT):
+        self.capacity = capacity
+        self.slots = slots
+        self.timeout = timeout
+        self.ring = None
+        self.conn = None
+        self.process_handle = None
+        self._version = None
+
+        self.frames = 0
+        self.last_work_ns = 0
+        self.last_overhead_ns = 0
+        self.agc_gain_db = 0.0
+        # The worker chain's `vad` and `gated` after the last frame
+        self.vad = None
+        self.gated = False
+
+    @property
+    def pid(self):
+        return self.process_handle.pid if self.process_handle else None
+
+    def start(self):
+        """Spawns the worker and waits until it is ready. Raises WorkerError on failure."""
+        # spawn: forking a process that already runs audio threads is not safe
+        ctx = multiprocessing.get_context("spawn")
+        # Headroom for samples the denoiser carries between frames
+        self.ring = SharedFrameRing(self.slots, self.capacity + FRAME_SIZE)
+        self.conn, child_conn = ctx.Pipe()
+        self.process_handle = ctx.Process(
+            target=worker_main, name="dsp-worker", daemon=True,
+            args=(self.ring.name, self.slots, self.ring.slot_samples, self.capacity, child_conn))
+        try:
+            self.process_handle.start()
+        except Exception as e:
+            self.close()
+            raise WorkerError(f"Could not start DSP worker: {e}")
+        child_conn.close()
+        try:
+            if not self.conn.poll(self.START_TIMEOUT) or self.conn.recv_bytes() != READY:
+                raise WorkerError("DSP worker did not start")
+        except (EOFError, OSError):
+            self.close()
+            raise WorkerError("DSP worker exited during startup")
+        except WorkerError:
+            self.close()
+            raise
+
+    def sync(self, chain):
+        """Sends the chain's current settings and rate to the worker."""
+        settings = chain.describe()
+        settings["rate"] = chain.rate
+        self._send(CONFIG + json.dumps(settings).encode('utf-8'))
+        self._version = chain.version
+
+    def reset(self):
+        """Clears the worker chain's signal state (between streams)."""
+        self._send(RESET)
+
+    def process(self, samples, chain):
+        """
+        Runs int16 `samples` through the worker, after syncing `chain`'s
+        settings if they changed. Returns an int16 view of the output in
+        shared memory (valid for the next `slots - 1` calls).
+        """
+        if chain.version != self._version:
+            self.sync(chain)
+        n = len(samples)
+        if n > self.capacity:
+            raise WorkerError(f"Frame of {n} samples does not fit the DSP worker's slots")
+        slot = self.ring.next_slot()
+        self.ring.frames[slot, :n] = samples
+
+        t0 = perf_counter_ns()
+        self._send(FRAME.pack(b"F", slot, n))
+        try:
+            if not self.conn.poll(self.timeout):
+                raise WorkerError("DSP worker timed out")
+            reply = self.conn.recv_bytes()
+        except (EOFError, OSError) as e:
+            raise WorkerError(f"DSP worker lost: {e}")
+        elapsed = perf_counter_ns() - t0
+
+        if reply[:1] != b"R":
+            raise WorkerError(f"DSP worker error: {reply[1:].decode('utf-8', 'replace')}")
+        _, out_slot, out_len, work_ns, agc_gain_db, vad, gated = RESULT.unpack(reply)
+        if out_slot != slot:
+            raise WorkerError("DSP worker replied for the wrong slot")
+        self.last_work_ns = work_ns
+        self.last_overhead_ns = max(0, elapsed - work_ns)
+        self.agc_gain_db = agc_gain_db
+        self.vad = None if vad < 0 else vad
+        self.gated = gated
+        self.frames += 1
+        return self.ring.frames[slot, :out_len]
+
+    def _send(self, message):
+        try:
+            self.conn.send_bytes(message)
+        except (OSError, ValueError) as e:
+            raise WorkerError(f"DSP worker lost: {e}")
+
+    def close(self):
+        """Stops the worker process and frees the shared memory."""
+        if self.conn:
+            try: self.conn.send_bytes(QUIT)
+            except Exception: pass
+        if self.process_handle and self.process_handle.pid is not None:
+            self.process_handle.join(timeout=1.0)
+            if self.process_handle.is_alive():
+                self.process_handle.terminate()
+                self.process_handle.join(timeout=1.0)
+        if self.conn:
+            try: self.conn.close()
+            except Exception: pass
+            self.conn = None
+        if self.ring:
+            self.ring.close()
+            self.ring = None
+
+    def get_stats(self):
+        return {"pid": self.pid, "frames": self.frames}
@@ -0,0 +1,141 @@
+import threading
+import time
+import numpy as np
+
+from ring_buffer import SampleRing
+
+
+class JitterBuffer:
+    """
+    Playout buffer that sits between the network reader and the audio writer.
+
+    The reader pushes frames as they arrive, the writer (a blocking writer
+    thread or the PortAudio callback) pulls fixed-size blocks. The target
+    depth follows the measured arrival jitter and audio is dropped when the
+    buffer runs too far ahead, so latency stays bounded no matter how bursty
+    the link is. Samples live in a preallocated ring, so steady-state
+    playout does not allocate.
+    """
+
+    # Jitter smoothing factor (RFC 3550 uses 1/16)
+    JITTER_GAIN = 1.0 / 16
+    # Target depth = JITTER_MULT * jitter + one frame of safety margin
+    JITTER_MULT = 3.0
+    # Fraction of the gap closed per frame when shrinking the target
+    SHRINK_RATE = 0.002
+
+    def __init__(self, sample_rate, target_ms=40, min_ms=20, max_ms=200, adaptive=True):
+        self.sample_rate = sample_rate
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.adaptive = adaptive
+        self.target_ms = self._clamp(target_ms)
+
+        # Room for the overrun limit at max target plus some slack
+        self._ring = SampleRing(sample_rate * (2 * max_ms + 100) // 1000)
+        self._lock = threading.Lock()
+        self._priming = True
+
+        self._last_arrival = None
+        self.jitter_ms = 0.0
+
+        self.underruns = 0
+        self.overruns = 0
+        self.dropped_samples = 0
+
+    def _clamp(self, ms):
+        return max(self.min_ms, min(self.max_ms, ms))
+
+    def _ms_to_samples(self, ms):
+        return int(ms * self.sample_rate / 1000)
+
+    def configure(self, target_ms=None, adaptive=None):
+        """Applies new settings while streaming."""
+        with self._lock:
+            if adaptive is not None:
+                self.adaptive = bool(adaptive)
+            if target_ms is not None:
+                self.target_ms = self._clamp(float(target_ms))
+
+    @property
+    def depth_ms(self):
+        return self._ring.available * 1000.0 / self.sample_rate
+
+    @property
+    def playing(self):
+        """False while (re)filling to the target depth."""
+        return not self._priming
+
+    def push(self, frame, now=None):
+        """
+        Queues one frame of int16 PCM (called by the network reader).
+        Accepts bytes-like objects or an int16 array; the samples are copied
+        into the ring, so the caller may reuse its buffer afterwards.
+        """
+        if now is None:
+            now = time.monotonic()
+        samples = frame if isinstance(frame, np.ndarray) else np.frombuffer(frame, dtype=np.int16)
+        frame_ms = len(samples) * 1000.0 / self.sample_rate
+
+        with self._lock:
+            # --- Arrival jitter (deviation from the nominal frame period) ---
+            if self._last_arrival is not None:
+                deviation = abs((now - self._last_arrival) * 1000.0 - frame_ms)
+                self.jitter_ms += (deviation - self.jitter_ms) * self.JITTER_GAIN
+            self._last_arrival = now
+
+            if self.adaptive:
+                desired = self._clamp(self.JITTER_MULT * self.jitter_ms + frame_ms)
+                if desired > self.target_ms:
+                    # Grow immediately so the next burst is absorbed
+                    self.target_ms = desired
+                else:
+                    # Shrink slowly so a single quiet second doesn't undo it
+                    self.target_ms += (desired - self.target_ms) * self.SHRINK_RATE
+
+            lost = self._ring.write(samples)
+
+            # --- Overrun: too far ahead, drop the oldest audio back to target ---
+            limit_ms = self.target_ms * 2 + frame_ms
+            if lost or self.depth_ms > limit_ms:
+                self.overruns += 1
+                excess = self._ring.available - self._ms_to_samples(self.target_ms)
+                self.dropped_samples += lost + self._ring.drop(excess)
+
+            if self._priming and self.depth_ms >= self.target_ms:
+                self._priming = False
+
+    def read_into(self, out):
+        """
+        Fills `out` (an int16 array) with the next block of audio.
+        Whatever could not be filled is zeroed. Returns False when the block
+        is pure silence because the buffer is refilling after an underrun.
+        """
+        with self._lock:
+            if self._priming:
+                out[:] = 0
+                return False
+            n = self._ring.read_into(out)
+            if n < len(out):
+                out[n:] = 0
+                self.underruns += 1
+                self._priming = True
+            return n > 0
+
+    def clear(self):
+        with self._lock:
+            self._ring.clear()
+            self._priming = True
+            # The gap before the next frame (e.g. a reconnect) is not network jitter
+            self._last_arrival = None
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "depth_ms": round(self.depth_ms, 1),
+                "target_ms": round(self.target_ms, 1),
+                "jitter_ms": round(self.jitter_ms, 2),
+                "underruns": self.underruns,
+                "overruns": self.overruns,
+                "dropped_ms": round(self.dropped_samples * 1000.0 / self.sample_rate, 1),
+            }
@@ -0,0 +1,100 @@
+import numpy as np
+
+FULL_SCALE = 32768.0
+
+
+class LevelMeter:
+    """
+    RMS / peak / clip metering for the visualizer.
+
+    Frames are copied into a preallocated int64 window (one slice assignment
+    per frame); the statistics run once per window instead of once per frame:
+    an exact int64 sum of squares (a dot product, no temporaries), min/max for
+    the peak, and a clip count that is only evaluated when the peak actually
+    hit full scale. Each full
+    window yields one reading, so readings come at a fixed rate in audio
+    time (window_ms) no matter how frames are sized.
+    """
+
+    def __init__(self, sample_rate, window_ms=33.3, waveform_points=0):
+        self.sample_rate = sample_rate
+        self.window_ms = window_ms
+        self.waveform_points = waveform_points
+        self.clipped_total = 0
+        self._alloc()
+
+    def _alloc(self):
+        n = max(1, int(self.sample_rate * self.window_ms / 1000))
+        self._window = np.zeros(n, dtype=np.int64)
+        self._mask = np.zeros(n, dtype=bool)
+        self._fill = 0
+
+    def configure(self, sample_rate=None, window_ms=None, waveform_points=None):
+        """Changes settings; the current partial window is discarded."""
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if window_ms is not None:
+            self.window_ms = window_ms
+        if waveform_points is not None:
+            self.waveform_points = waveform_points
+        self._alloc()
+
+    def reset(self):
+        self._fill = 0
+        self.clipped_total = 0
+
+    def update(self, samples):
+        """
+        Feeds int16 samples. Returns a reading dict when a window completed
+        (the latest one, if several did), otherwise None.
+        """
+        window = self._window
+        total = len(samples)
+        fill = self._fill
+        if fill + total < len(window):
+            # Common case: the frame fits without completing the window
+            window[fill:fill + total] = samples
+            self._fill = fill + total
+            return None
+
+        reading = None
+        offset = 0
+        while offset < total:
+            n = min(total - offset, len(window) - self._fill)
+            window[self._fill:self._fill + n] = samples[offset:offset + n]
+            self._fill += n
+            offset += n
+            if self._fill == len(window):
+                reading = self._measure()
+                self._fill = 0
+        return reading
+
+    def _measure(self):
+        window = self._window
+        sum_squares = int(np.dot(window, window))
+        peak = max(int(window.max()), -int(window.min()))
+
+        clipped = 0
+        if peak >= 32767:
+            # Full-scale samples are what the gain stage's clip produces
+            clipped = np.count_nonzero(np.greater_equal(window, 32767, out=self._mask))
+            clipped += np.count_nonzero(np.less_equal(window, -32767, out=self._mask))
+            self.clipped_total += clipped
+
+        rms = (sum_squares / len(window)) ** 0.5
+        reading = {
+            "rms": round(rms / FULL_SCALE, 4),
+            "peak": round(min(peak / FULL_SCALE, 1.0), 4),
+            "clipped": int(clipped),
+        }
+        if self.waveform_points:
+            reading["waveform"] = self._waveform()
+        return reading
+
+    def _waveform(self):
+        """Peak envelope of the window in `waveform_points` buckets, 0..1."""
+        points = min(self.waveform_points, len(self._window))
+        step = len(self._window) // points
+        buckets = self._window[:points * step].reshape(points, step)
+        envelope = np.maximum(buckets.max(axis=1), -buckets.min(axis=1))
+        return np.round(envelope / FULL_SCALE, 3).tolist()
@@ -0,0 +1,127 @@
+from time import perf_counter_ns
+
+import numpy as np
+
+from sinks import ClockedSink
+from stats import RollingHistogram
+
+
+class OutputMixer:
+    """
+    Sums every session playing to one output device into a single stream.
+
+    Each source is a JitterBuffer (already at the device rate and gain
+    applied). Blocks are read into rows of a preallocated scratch matrix and
+    summed in one vectorized int32 reduction, so every extra phone costs one
+    ring copy per block rather than its own output stream and thread.
+
+    Taps (recordings, extra files / FIFOs) get every block the output plays,
+    as the same bytes object the stream was handed.
+    """
+
+    def __init__(self, rate, block_frames, max_sources=8):
+        self.rate = rate
+        self.block_frames = block_frames
+        # Replaced (never mutated) so the audio thread can iterate without a lock
+        self._sources = ()
+        self._taps = ()
+        self._scratch = np.zeros((max_sources, block_frames), dtype=np.int16)
+        self._acc = np.zeros(block_frames, dtype=np.int32)
+        # Typed clip bounds: np.minimum/np.maximum with these beat np.clip on short blocks
+        self._lo = np.int32(-32768)
+        self._hi = np.int32(32767)
+
+        # Output stream plumbing, owned by the backend
+        self.stream = None
+        self.playout_thread = None
+        self.stop_event = None
+        self.users = 0  # Sessions holding this output, including ones not yet added as sources
+        # Set once a realtime session plays here: the playout thread then raises its own priority
+        self.realtime = False
+        # When the output last took a block (perf_counter_ns) and the audio the device buffers past it
+        self.last_block_ns = 0
+        self.output_latency = 0.0
+        self.underflows = 0
+        self.mix_time = RollingHistogram()
+
+    @property
+    def sources(self):
+        return self._sources
+
+    def add_source(self, jbuf):
+        self._sources = self._sources + (jbuf,)
+
+    def remove_source(self, jbuf):
+        self._sources = tuple(s for s in self._sources if s is not jbuf)
+
+    @property
+    def taps(self):
+        return self._taps
+
+    def add_tap(self, tap):
+        self._taps = self._taps + (tap,)
+
+    def remove_tap(self, tap):
+        self._taps = tuple(t for t in self._taps if t is not tap)
+
+    def slack_ms(self, now_ns=None):
+        """
+        How long the device can go without another block: the pause the
+        output (which needs the GIL to deliver the next one) can absorb now.
+        """
+        if not self.last_block_ns:
+            return 0.0
+        if now_ns is None:
+            now_ns = perf_counter_ns()
+        buffered_s = max(self.block_frames / self.rate, self.output_latency)
+        return (self.last_block_ns + buffered_s * 1e9 - now_ns) / 1e6
+
+    def _reserve(self, sources, frames):
+        rows = max(sources, self._scratch.shape[0])
+        cols = max(frames, self._scratch.shape[1])
+        if (rows, cols) != self._scratch.shape:
+            self._scratch = np.zeros((rows, cols), dtype=np.int16)
+            self._acc = np.zeros(cols, dtype=np.int32)
+
+    def mix_into(self, out):
+        """Fills `out` (int16) with the next block of the mix."""
+        sources = self._sources
+        n = len(out)
+        if not sources:
+            out[:] = 0
+            return
+        if len(sources) == 1:
+            # Nothing to mix: read straight into the output block
+            sources[0].read_into(out)
+            return
+
+        if len(sources) > self._scratch.shape[0] or n > self._scratch.shape[1]:
+            self._reserve(len(sources), n)
+        scratch = self._scratch[:len(sources), :n]
+        audible = False
+        for row, jbuf in zip(scratch, sources):
+            # read_into() zeroes the row while a buffer is refilling
+            audible |= jbuf.read_into(row)
+        if not audible:
+            out[:] = 0
+            return
+
+        acc = self._acc[:n]
+        np.sum(scratch, axis=0, dtype=np.int32, out=acc)
+        np.minimum(acc, self._hi, out=acc)
+        np.maximum(acc, self._lo, out=acc)
+        out[:] = acc
+
+    def get_stats(self):
+        payload = {
+            "rate": self.rate,
+            "sources": len(self._sources),
+            "device_underflows": self.underflows,
+            "mix_us": self.mix_time.summary(1e-3),
+        }
+        # Null / file sinks report their own counters; PortAudio streams have none
+        if isinstance(self.stream, ClockedSink):
+            payload["sink"] = self.stream.get_stats()
+        if self._taps:
+            payload["taps"] = [tap.get_stats() for tap in self._taps]
+        return payload
@@ -0,0 +1,326 @@
+"""
+Offline processing: runs recorded streams through the same DSP chain as the
+live sessions (denoise, gate, high-pass, AGC, gain, limiter), as fast as the
+CPU allows, and reports throughput in 10ms frames per second per core.
+
+Inputs are WAV files (16-bit PCM, any rate, channels are mixed down) or raw
+little-endian int16 mono PCM (--rate). Files are memory-mapped and processed
+in large batches; several files are spread over a process pool, each with
+its own RNNoise state.
+
+    python offline.py take1.wav take2.raw -o processed/ --denoise --gain 1.5
+    python offline.py recordings/*.wav --dsp settings.json --workers 4
+    python offline.py long.wav --denoise          # no -o: throughput only
+"""
+import argparse
+import ctypes
+import json
+import os
+import struct
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from dsp import DspChain, FRAME_SIZE
+from resampler import StreamingResampler
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# Throughput is counted in RNNoise-sized frames: 10ms of input audio
+FRAMES_PER_SECOND = 100
+
+
+def read_wav_header(path):
+    """Returns (data offset, data bytes, rate, channels) of a 16-bit PCM WAV file."""
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise ValueError(f"{path}: not a WAV file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path}: no audio data")
+            chunk, size = struct.unpack('<4sI', header)
+            if chunk == b'fmt ':
+                fmt = f.read(size)
+                if len(fmt) < 16:
+                    raise ValueError(f"{path}: truncated format chunk")
+                f.seek(size & 1, 1)
+            elif chunk == b'data':
+                if fmt is None:
+                    raise ValueError(f"{path}: audio data before its format")
+                break
+            else:
+                # LIST, fact, cue... (chunks are padded to even sizes)
+                f.seek(size + (size & 1), 1)
+        offset = f.tell()
+
+    tag, channels, rate, _, _, bits = struct.unpack_from('<HHIIHH', fmt)
+    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack_from('<H', fmt, 24)[0]  # First field of the sub-format GUID
+    if tag != WAVE_FORMAT_PCM or bits != 16 or not channels:
+        raise ValueError(f"{path}: only 16-bit PCM is supported (format {tag:#x}, {bits} bits)")
+    # Recorders killed mid-take leave the size at 0 or 0xFFFFFFFF: use what is there
+    available = os.path.getsize(path) - offset
+    if size in (0, 0xFFFFFFFF) or size > available:
+        size = available
+    return offset, size, rate, channels
+
+
+class AudioFile:
+    """
+    Read-only, memory-mapped int16 audio: a WAV file or raw PCM at `rate`.
+    Nothing is read from disk until a block is asked for.
+    """
+
+    def __init__(self, path, rate=None):
+        self.path = path
+        if path.lower().endswith(".wav"):
+            offset, size, rate, channels = read_wav_header(path)
+        else:
+            if not rate:
+                raise ValueError(f"{path}: raw PCM needs a sample rate")
+            offset, size, channels = 0, os.path.getsize(path), 1
+        self.rate = rate
+        self.channels = channels
+        count = size // (2 * channels)
+        if count:
+            self.samples = np.memmap(path, dtype='<i2', mode='r', offset=offset, shape=(count, channels))
+        else:
+            self.samples = np.zeros((0, channels), dtype=np.int16)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def read_into(self, start, out):
+        """Copies mono samples from `start` into the int16 array `out`. Returns the count."""
+        block = self.samples[start:start + len(out)]
+        n = len(block)
+        if self.channels == 1:
+            out[:n] = block[:, 0]
+        else:
+            out[:n] = block.sum(axis=1, dtype=np.int32) // self.channels
+        return n
+
+    def close(self):
+        mm = getattr(self.samples, "_mmap", None)
+        self.samples = None
+        if mm is not None:
+            mm.close()
+
+
+class AudioWriter:
+    """Mono int16 output: WAV if the name ends in .wav, else raw PCM."""
+
+    def __init__(self, path, rate):
+        self.wav = path.lower().endswith(".wav")
+        if self.wav:
+            self.file = wave.open(path, 'wb')
+            self.file.setnchannels(1)
+            self.file.setsampwidth(2)
+            self.file.setframerate(rate)
+        else:
+            self.file = open(path, 'wb')
+
+    def write(self, samples):
+        data = samples.astype('<i2', copy=False).tobytes()
+        if self.wav:
+            self.file.writeframes(data)
+        else:
+            self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+def build_chain(settings, rate, capacity, lib=None):
+    """
+    A DspChain configured like a live session (`settings` as from
+    DspChain.describe() / 'set_dsp'), running at 48kHz if the denoiser is
+    on and at `rate` otherwise. `lib` overrides the RNNoise library (a path
+    or a loaded library).
+    """
+    chain = DspChain(rate, capacity)
+    if lib is not None:
+        from denoiser import RNNoise
+        chain.stages["denoise"].rnnoise = RNNoise(ctypes.cdll.LoadLibrary(lib) if isinstance(lib, str) else lib)
+    chain.apply(settings or {})
+    chain.set_rate(chain.required_rate or rate)
+    return chain
+
+
+def process_file(path, output=None, settings=None, rate=None, out_rate=None, batch_ms=1000.0, lib=None,
+                 quality="medium"):
+    """
+    Runs one recording through the chain and writes the result to `output`
+    (mono, at `out_rate`, default the input's rate; None writes nothing).
+    The output has exactly the input's duration. Returns a result dict.
+    """
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    audio = AudioFile(path, rate)
+    in_rate = audio.rate
+    out_rate = out_rate or in_rate
+    expected = len(audio) * out_rate // in_rate
+    block = max(FRAME_SIZE, int(in_rate * batch_ms / 1000))
+    chain = writer = None
+    try:
+        # Room for a whole block at the chain's rate (48kHz with the denoiser on)
+        chain = build_chain(settings, in_rate, block * max(48000, in_rate) // in_rate + FRAME_SIZE * 2, lib)
+        # --- OPTIMIZATION: one big block per call; only the rate conversions allocate ---
+        to_chain = StreamingResampler(in_rate, chain.rate, quality) if chain.rate != in_rate else None
+        from_chain = StreamingResampler(chain.rate, out_rate, quality) if out_rate != chain.rate else None
+        writer = AudioWriter(output, out_rate) if output else None
+        mono = np.zeros(block, dtype=np.int16)
+        written = 0
+
+        def run(samples):
+            nonlocal written
+            if to_chain:
+                samples = to_chain.process(samples)
+            out = chain.process(samples)
+            if from_chain:
+                out = from_chain.process(out)
+            out = out[:expected - written]
+            if writer and len(out):
+                writer.write(out)
+            written += len(out)
+
+        for start in range(0, len(audio), block):
+            run(mono[:audio.read_into(start, mono)])
+        # Flush the denoiser's partial frame and the resamplers' filter tails
+        mono[:] = 0
+        for _ in range(4):
+            if written >= expected:
+                break
+            run(mono[:max(FRAME_SIZE, in_rate // 20)])
+        if written < expected and writer:
+            writer.write(np.zeros(expected - written, dtype=np.int16))
+    finally:
+        if writer:
+            writer.close()
+        audio.close()
+        denoiser = chain.stages["denoise"].rnnoise if chain else None
+        if denoiser is not None:
+            denoiser.destroy()
+
+    seconds = expected / out_rate
+    return {
+        "path": path,
+        "output": output,
+        "rate": in_rate,
+        "out_rate": out_rate,
+        "seconds": round(seconds, 3),
+        "frames": expected * FRAMES_PER_SECOND // out_rate,
+        "cpu_s": time.process_time() - cpu_started,
+        "wall_s": time.perf_counter() - started,
+    }
+
+
+def _run_job(job):
+    # In a pool worker: a broken file is reported, the others carry on
+    try:
+        return process_file(**job)
+    except Exception as e:
+        return {"path": job["path"], "error": str(e)}
+
+
+def process_files(jobs, workers=None):
+    """
+    Runs process_file(**job) for every job dict, across `workers` processes
+    (default: one per CPU; 1 runs in this process). Yields each result as it
+    finishes; failed files yield {"path", "error"}.
+    """
+    workers = min(len(jobs), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        for job in jobs:
+            yield _run_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for future in as_completed([pool.submit(_run_job, job) for job in jobs]):
+            yield future.result()
+
+
+def summarize(results, wall_s, workers):
+    """Totals over the successful results: audio, CPU time, frames/s per core and overall."""
+    done = [r for r in results if "error" not in r]
+    frames = sum(r["frames"] for r in done)
+    seconds = sum(r["seconds"] for r in done)
+    cpu_s = sum(r["cpu_s"] for r in done)
+    return {
+        "files": len(done),
+        "failed": len(results) - len(done),
+        "workers": workers,
+        "seconds": round(seconds, 3),
+        "frames": frames,
+        "cpu_s": round(cpu_s, 3),
+        "wall_s": round(wall_s, 3),
+        "frames_per_s_per_core": round(frames / cpu_s) if cpu_s else None,
+        "frames_per_s": round(frames / wall_s) if wall_s else None,
+        "realtime_factor": round(seconds / wall_s, 1) if wall_s else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run recorded streams through the MicRouter DSP chain.")
+    parser.add_argument("inputs", nargs="+", help="WAV (16-bit PCM) or raw int16 mono PCM files")
+    parser.add_argument("-o", "--output", help="directory for the processed files (default: write nothing)")
+    parser.add_argument("--rate", type=int, default=48000, help="sample rate of raw PCM inputs")
+    parser.add_argument("--out-rate", type=int, help="output sample rate (default: the input's)")
+    parser.add_argument("--dsp", help="JSON chain settings, as sent with 'set_dsp' or returned by 'get_dsp'")
+    parser.add_argument("--denoise", action="store_true", help="enable RNNoise")
+    parser.add_argument("--gain", type=float, help="linear output gain")
+    parser.add_argument("--lib", help="RNNoise shared library (default: the one next to denoiser.py)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-ms", type=float, default=1000.0, help="audio per chain call")
+    parser.add_argument("--quality", choices=tuple(StreamingResampler.QUALITY), default="medium")
+    args = parser.parse_args(argv)
+
+    settings = {"stages": {}}
+    if args.dsp:
+        with open(args.dsp) as f:
+            loaded = json.load(f)
+        # get_dsp answers carry the settings in "payload"
+        settings = dict(loaded.get("payload", loaded))
+        settings["stages"] = dict(settings.get("stages") or {})
+    if args.denoise:
+        settings["stages"]["denoise"] = {**settings["stages"].get("denoise", {}), "enabled": True}
+    if args.gain is not None:
+        settings["stages"]["gain"] = {**settings["stages"].get("gain", {}), "gain": args.gain}
+
+    jobs = []
+    for path in args.inputs:
+        output = None
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            output = os.path.join(args.output, os.path.basename(path))
+            if os.path.abspath(output) == os.path.abspath(path):
+                parser.error(f"{path}: output would overwrite the input")
+        jobs.append({"path": path, "output": output, "settings": settings, "rate": args.rate,
+                     "out_rate": args.out_rate, "batch_ms": args.batch_ms, "lib": args.lib,
+                     "quality": args.quality})
+
+    workers = min(len(jobs), max(1, args.workers))
+    started = time.perf_counter()
+    results = []
+    for result in process_files(jobs, workers):
+        results.append(result)
+        if "error" in result:
+            print(f"[!] {result['path']}: {result['error']}")
+            continue
+        rate = result["frames"] / result["cpu_s"] if result["cpu_s"] else 0
+        print(f"[*] {result['path']}: {result['seconds']:.1f}s, {result['frames']} frames in "
+              f"{result['cpu_s']:.2f}s CPU ({rate:,.0f} frames/s)")
+    summary = summarize(results, time.perf_counter() - started, workers)
+    print(f"== {summary['files']} file(s), {workers} worker(s): {summary['seconds']:.1f}s of audio in "
+          f"{summary['wall_s']:.2f}s ({summary['realtime_factor']}x real time)")
+    print(f"   {summary['frames_per_s_per_core']} frames/s per core, {summary['frames_per_s']} frames/s overall")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+import struct
+import time
+
+import numpy as np
+
+from stats import RollingHistogram
+
+# --- VERSION 1 (AudioService.kt today) ---
+# phone: int32 sample rate -> backend: int32 same rate (ack) -> phone: int32 "REDY"
+# then [int32 length][int16 PCM] frames.
+#
+# --- VERSION 2 ---
+# phone:   int32 V2_MAGIC, HELLO (what it can send)
+# backend: int32 V2_MAGIC, CONFIG (what it chose, plus its clock)
+# phone:   int32 "REDY", CLOCK (its clock when CONFIG arrived)
+# then [int32 length][FRAME_HEADER][PCM] packets of `batch` frames each, over
+# TCP, or with the UDP transport one [FRAME_HEADER][PCM] datagram per packet
+# sent to the backend's port from CONFIG (the TCP connection stays open as
+# the control channel; closing it ends the stream).
+# V2_MAGIC is far above any sample rate, so a v1 backend rejects a v2 phone
+# outright (which can then retry with v1) and a v1 phone is served as before.
+INT = struct.Struct('>i')
+READY_SIGNAL = 0x52454459  # "REDY"
+V2_MAGIC = 0x4D525632      # "MRV2"
+VERSION = 2
+
+FORMAT_S16 = 1  # Little-endian int16
+FORMAT_F32 = 2  # Little-endian float32, full scale 1.0
+FORMATS = {"s16": FORMAT_S16, "f32": FORMAT_F32}
+FORMAT_NAMES = {code: name for name, code in FORMATS.items()}
+# Bit i of HELLO's frame mask offers FRAME_MS[i]
+FRAME_MS = (5, 10, 20, 40)
+TRANSPORT_TCP = 1
+TRANSPORT_UDP = 2
+TRANSPORTS = {"tcp": TRANSPORT_TCP, "udp": TRANSPORT_UDP}
+TRANSPORT_NAMES = {code: name for name, code in TRANSPORTS.items()}
+
+# version, sample rate, format mask, frame ms mask, max batch, transport mask
+HELLO = struct.Struct('>HIBBBB')
+# version, sample rate, format, frame ms, batch, backend clock (us), transport, UDP port (0: TCP)
+CONFIG = struct.Struct('>HIBBBQBH')
+CLOCK = struct.Struct('>Q')            # phone clock (us) when CONFIG arrived
+FRAME_HEADER = struct.Struct('>IQ')    # sequence number of the first frame, capture time (phone clock, us)
+
+# Largest packet the receiver accepts (FrameReceiver's max_frame)
+MAX_PACKET = 65536
+
+# The clock offset follows the lowest one-way delay seen per window; real clocks
+# drift apart by less than MAX_SKEW_PPM, so a higher floor is queueing, not drift
+OFFSET_WINDOW_US = 2_000_000
+MAX_SKEW_PPM = 200
+
+# "transport": "udp" is only asked for with a UDP socket to offer ("udp_port")
+DEFAULT_PREFERENCES = {"frame_ms": 10, "batch": 1, "formats": ["s16", "f32"], "transport": "tcp"}
+
+
+def monotonic_us():
+    return time.monotonic_ns() // 1000
+
+
+class StreamFormat:
+    """
+    What the handshake settled on. Version 1 streams carry bare int16 PCM
+    and nothing is known about framing or the phone's clock.
+    """
+
+    def __init__(self, sample_rate, version=1, sample_format=FORMAT_S16, frame_ms=None, batch=1,
+                 clock_offset_us=None, rtt_us=None, transport=TRANSPORT_TCP):
+        self.sample_rate = sample_rate
+        self.version = version
+        self.sample_format = sample_format
+        self.frame_ms = frame_ms
+        self.batch = batch
+        self.transport = transport
+        # Phone clock minus ours, and the round trip it was measured over
+        self.clock_offset_us = clock_offset_us
+        self.rtt_us = rtt_us
+
+    @property
+    def header_size(self):
+        return FRAME_HEADER.size if self.version >= 2 else 0
+
+    @property
+    def frame_samples(self):
+        return self.sample_rate * self.frame_ms // 1000 if self.frame_ms else None
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "sample_rate": self.sample_rate,
+            "format": FORMAT_NAMES[self.sample_format],
+            "frame_ms": self.frame_ms,
+            "batch": self.batch,
+            "transport": TRANSPORT_NAMES[self.transport],
+            "rtt_ms": None if self.rtt_us is None else round(self.rtt_us / 1000, 2),
+        }
+
+
+def choose(offer, preferences):
+    """Picks (format, frame ms, batch, transport) from a phone's HELLO fields. Raises if nothing fits."""
+    _, sample_rate, format_mask, frame_mask, max_batch, transport_mask = offer
+    sample_format = next((FORMATS[name] for name in preferences["formats"]
+                          if name in FORMATS and format_mask & FORMATS[name]), None)
+    if sample_format is None:
+        raise Exception(f"No common sample format (phone offers mask {format_mask:#x})")
+    offered = [ms for i, ms in enumerate(FRAME_MS) if frame_mask & (1 << i)]
+    if not offered:
+        raise Exception("Phone offers no frame duration")
+    frame_ms = min(offered, key=lambda ms: (abs(ms - preferences["frame_ms"]), ms))
+    # Whole packets must fit the receive arena
+    frame_bytes = sample_rate * frame_ms // 1000 * (4 if sample_format == FORMAT_F32 else 2)
+    fits = (MAX_PACKET - FRAME_HEADER.size) // max(1, frame_bytes)
+    batch = max(1, min(max_batch, preferences["batch"], fits))
+    # Datagrams if both sides want them; TCP is always possible
+    wanted = TRANSPORTS.get(preferences.get("transport"), TRANSPORT_TCP)
+    transport = TRANSPORT_UDP if wanted == TRANSPORT_UDP and transport_mask & TRANSPORT_UDP else TRANSPORT_TCP
+    return sample_format, frame_ms, batch, transport
+
+
+def _check_rate(sample_rate):
+    if sample_rate <= 0 or sample_rate > 192000:
+        raise Exception(f"Invalid sample rate: {sample_rate}")
+
+
+def handshake(sock, receiver, preferences=DEFAULT_PREFERENCES, clock=monotonic_us):
+    """
+    Runs the handshake (either version, as chosen by the phone) and returns
+    a StreamFormat. A connection lost midway raises ConnectionError (worth
+    retrying); a phone speaking nonsense raises Exception.
+    """
+    header = receiver.read_exact(4)
+    if not header: raise ConnectionError("Handshake failed (Sample Rate)")
+    first = INT.unpack(header)[0]
+    if first == V2_MAGIC:
+        return _handshake_v2(sock, receiver, preferences, clock)
+
+    # Step 1: Receive sample rate
+    sample_rate = first
+    _check_rate(sample_rate)
+
+    # Step 2: Send acknowledgment
+    sock.sendall(INT.pack(sample_rate))
+
+    # Step 3: Wait for READY signal
+    ready_bytes = receiver.read_exact(4)
+    if not ready_bytes: raise ConnectionError("Handshake failed (Ready Signal)")
+    ready_signal = INT.unpack(ready_bytes)[0]
+
+    if ready_signal != READY_SIGNAL:
+        raise Exception(f"Invalid ready signal: {hex(ready_signal)}")
+    return StreamFormat(sample_rate)
+
+
+def _handshake_v2(sock, receiver, preferences, clock):
+    hello = receiver.read_exact(HELLO.size)
+    if not hello: raise ConnectionError("Handshake failed (Hello)")
+    offer = HELLO.unpack(hello)
+    sample_rate = offer[1]
+    _check_rate(sample_rate)
+    version = min(offer[0], VERSION)
+    sample_format, frame_ms, batch, transport = choose(offer, preferences)
+    udp_port = (preferences.get("udp_port") or 0) if transport == TRANSPORT_UDP else 0
+    if not udp_port:
+        transport = TRANSPORT_TCP
+
+    # The CONFIG doubles as a clock probe: the phone stamps its arrival
+    sent = clock()
+    sock.sendall(INT.pack(V2_MAGIC) + CONFIG.pack(version, sample_rate, sample_format, frame_ms, batch, sent,
+                                                  transport, udp_port))
+
+    ready_bytes = receiver.read_exact(4 + CLOCK.size)
+    if not ready_bytes: raise ConnectionError("Handshake failed (Ready Signal)")
+    received = clock()
+    ready_signal = INT.unpack_from(ready_bytes)[0]
+    if ready_signal != READY_SIGNAL:
+        raise Exception(f"Invalid ready signal: {hex(ready_signal)}")
+    phone_clock = CLOCK.unpack_from(ready_bytes, 4)[0]
+
+    # NTP-style: the phone read its clock halfway through the round trip
+    rtt_us = received - sent
+    offset_us = phone_clock - (sent + received) // 2
+    return StreamFormat(sample_rate, version, sample_format, frame_ms, batch, offset_us, rtt_us, transport)
+
+
+class LinkStats:
+    """
+    Sequence and latency accounting for v2 frame headers.
+
+    Sequence numbers count frames (a packet of `batch` frames advances them
+    by `batch`), so gaps are lost frames and anything behind the expected
+    number arrived late (reordered or duplicated) and is dropped.
+
+    Capture times are moved onto our clock with the handshake's offset
+    estimate (should a frame seem to arrive before it was captured, the
+    estimate was off by at least that much and is corrected). The clocks
+    drift apart over hours, so the offset then follows the delay floor: the
+    lowest latency of the first OFFSET_WINDOW_US is taken as the network's,
+    and each later window's lowest one-way delay is pinned to it. A faster
+    frame moves the floor down right away; a window's floor moves it up by no
+    more than MAX_SKEW_PPM could explain.
+    """
+
+    def __init__(self, window=2048):
+        self.format = StreamFormat(48000)
+        self.latency = RollingHistogram(window)  # Capture -> arrival, us
+        self.playout = RollingHistogram(window)  # Capture -> start of playout, us
+        self.clock_offset_us = None
+        self.last_latency_us = None
+        self._expected = None
+        self._floor_us = None       # Network latency the window minimum is pinned to
+        self._window_min = None     # Lowest arrival - capture (mixed clocks) this window
+        self._window_start = None
+        self.reset()
+
+    def reset(self):
+        self.latency.reset()
+        self.playout.reset()
+        self.frames_received = 0
+        self.frames_lost = 0
+        self.frames_late = 0
+        self.last_latency_us = None
+        self._expected = None
+
+    def start(self, fmt):
+        """A new connection: sequence numbers start over, the counters carry on."""
+        self.format = fmt
+        self.clock_offset_us = fmt.clock_offset_us
+        self.last_latency_us = None
+        self._expected = None
+        self._floor_us = None
+        self._window_min = None
+        self._window_start = None
+
+    @property
+    def header_size(self):
+        return self.format.header_size
+
+    def receive(self, payload, now_us):
+        """
+        Strips and accounts the frame header of a v2 packet. Returns the PCM
+        part, or None if the packet is late and should be dropped.
+        """
+        if len(payload) < FRAME_HEADER.size:
+            raise ValueError("Packet shorter than its header")
+        seq, capture_us = FRAME_HEADER.unpack_from(payload)
+        pcm = payload[FRAME_HEADER.size:]
+        fmt = self.format
+        width = 4 if fmt.sample_format == FORMAT_F32 else 2
+        frames = max(1, round(len(pcm) / width / fmt.frame_samples)) if fmt.frame_samples else 1
+
+        if self._expected is not None:
+            # Modulo 2^32, so the counter may wrap
+            ahead = (seq - self._expected) & 0xFFFFFFFF
+            if ahead >= 0x80000000:
+                self.frames_late += frames
+                return None
+            self.frames_lost += ahead
+        self._expected = (seq + frames) & 0xFFFFFFFF
+        self.frames_received += frames
+
+        if self.clock_offset_us is not None:
+            latency = self._track_offset(now_us - capture_us, now_us)
+            self.latency.record(latency)
+            self.last_latency_us = latency
+        return pcm
+
+    def _track_offset(self, delay, now_us):
+        """Updates the clock offset from one arrival - capture difference. Returns the latency."""
+        if self._window_start is None:
+            self._window_start = now_us
+            self._window_min = delay
+        elif delay < self._window_min:
+            self._window_min = delay
+
+        floor = 0 if self._floor_us is None else self._floor_us
+        if delay + self.clock_offset_us < floor:
+            self.clock_offset_us = floor - delay
+
+        elapsed = now_us - self._window_start
+        if elapsed >= OFFSET_WINDOW_US:
+            if self._floor_us is None:
+                self._floor_us = self._window_min + self.clock_offset_us
+            else:
+                # Nothing this window came in at the floor: the phone's clock fell behind
+                rise = self._window_min + self.clock_offset_us - self._floor_us
+                self.clock_offset_us -= min(rise, elapsed * MAX_SKEW_PPM // 1_000_000)
+            self._window_start = now_us
+            self._window_min = delay
+        return delay + self.clock_offset_us
+
+    def record_playout(self, queued_us):
+        """Adds the time the last packet waits for playout (buffer ahead of it plus the device)."""
+        if self.last_latency_us is not None:
+            self.playout.record(self.last_latency_us + queued_us)
+
+    def get_stats(self):
+        stats = self.format.describe()
+        if self.format.version < 2:
+            return stats
+        total = self.frames_received + self.frames_lost
+        stats.update({
+            "frames_received": self.frames_received,
+            "frames_lost": self.frames_lost,
+            "frames_late": self.frames_late,
+            "loss_pct": round(self.frames_lost * 100.0 / total, 2) if total else 0.0,
+            "clock_offset_ms": None if self.clock_offset_us is None else round(self.clock_offset_us / 1000, 2),
+            "latency_ms": self.latency.summary(1e-3),
+            "playout_latency_ms": self.playout.summary(1e-3),
+        })
+        return stats
+
+
+def f32_to_s16(samples, out, scratch):
+    """Converts float32 PCM (full scale 1.0) into the int16 array `out`, via the float32 `scratch`."""
+    n = len(samples)
+    x = scratch[:n]
+    np.multiply(samples, np.float32(32767.0), out=x)
+    np.clip(x, -32768.0, 32767.0, out=x)
+    np.rint(x, out=x)
+    out[:n] = x
+    return out[:n]
@@ -0,0 +1,237 @@
+import ctypes
+import gc
+import os
+import platform
+import threading
+import time
+from time import perf_counter_ns
+
+from stats import RollingHistogram
+
+# Young-generation threshold while realtime streams run (CPython's default is 700)
+REALTIME_THRESHOLD0 = 50000
+# Young objects worth collecting at a quiet point, and the least output-side slack to do it in
+QUIET_COLLECT_AT = 500
+QUIET_SLACK_MS = 1.0
+# Room kept on top of the expected pause: how long a collection takes varies
+QUIET_MARGIN = 1.25
+# A collection whose pause doesn't fit the slack is put off at most this long (per
+# generation); then it runs anyway, which also re-measures an estimate that was off
+QUIET_MAX_DEFER_S = (1.0, 30.0, 30.0)
+
+THREAD_PRIORITY_TIME_CRITICAL = 15
+SCHED_FIFO_PRIORITY = 10
+
+
+class GCMonitor:
+    """
+    Times every garbage collection (in any thread) through gc.callbacks.
+
+    A collection holds the GIL, so it stalls the stream threads and the
+    output callback alike; collections longer than one frame (`budget_ms`)
+    are the ones that can be heard.
+    """
+
+    def __init__(self, budget_ms=10.0, window=512):
+        self.budget_ms = budget_ms
+        self.pauses = RollingHistogram(window)  # ns
+        self.collections = [0, 0, 0]
+        self.long_pauses = 0
+        self.longest_ns = 0
+        self._start = 0
+        self.installed = False
+
+    def install(self):
+        if not self.installed:
+            gc.callbacks.append(self._callback)
+            self.installed = True
+
+    def uninstall(self):
+        if self.installed:
+            try: gc.callbacks.remove(self._callback)
+            except ValueError: pass
+            self.installed = False
+
+    def _callback(self, phase, info):
+        if phase == "start":
+            self._start = perf_counter_ns()
+            return
+        pause = perf_counter_ns() - self._start
+        self.pauses.record(pause)
+        generation = info.get("generation", 0)
+        if 0 <= generation < 3:
+            self.collections[generation] += 1
+        if pause > self.longest_ns:
+            self.longest_ns = pause
+        if pause > self.budget_ms * 1e6:
+            self.long_pauses += 1
+
+    def reset(self):
+        self.pauses.reset()
+        self.collections = [0, 0, 0]
+        self.long_pauses = 0
+        self.longest_ns = 0
+
+    def get_stats(self):
+        return {
+            "collections": list(self.collections),
+            "pause_us": self.pauses.summary(1e-3),
+            "longest_pause_ms": round(self.longest_ns / 1e6, 2),
+            "budget_ms": self.budget_ms,
+            "long_pauses": self.long_pauses,
+        }
+
+
+class GCTuning:
+    """
+    Keeps the collector out of the way while realtime streams run.
+
+    The first stream to enter freezes every object there is (imports, the
+    UI, other sessions' buffers) so later full collections skip it, then
+    raises the young-generation threshold so collections no longer start
+    at arbitrary allocations. Instead quiet_point() runs them, as the
+    collector would have (the older generations when their counts are due),
+    when the output has just taken a block: a collection holds the GIL, so
+    what covers it is the audio already handed to the device, not the
+    playout buffer the output still has to read from. If a stream never
+    gets a quiet moment the raised threshold still bounds memory. The last
+    stream to leave puts everything back.
+    """
+
+    def __init__(self, threshold0=REALTIME_THRESHOLD0):
+        self.threshold0 = threshold0
+        self.users = 0
+        self.frozen = 0
+        self.quiet_collections = 0
+        # Expected pause: per young object for generation 0, per collection for the older ones
+        self.young_ms_per_object = 0.0
+        self.pause_ms = [0.0, 0.0, 0.0]
+        self.deferred = 0
+        self._deferred_since = [None, None, None]
+        self._saved = None
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            if not self.users:
+                self._saved = gc.get_threshold()
+                # No collection first: that would be the very pause this avoids.
+                # Garbage frozen along the way is freed on unfreeze().
+                gc.freeze()
+                self.frozen = gc.get_freeze_count()
+                gc.set_threshold(self.threshold0, *self._saved[1:])
+            self.users += 1
+
+    def exit(self):
+        with self._lock:
+            if not self.users:
+                return
+            self.users -= 1
+            if not self.users:
+                gc.set_threshold(*self._saved)
+                gc.unfreeze()
+                self.frozen = 0
+
+    def quiet_point(self, slack_ms):
+        """
+        Called between frames with how long the output can go without the GIL
+        (OutputMixer.slack_ms()); may collect.
+        """
+        if not self.users or slack_ms < QUIET_SLACK_MS:
+            return False
+        counts = gc.get_count()
+        if counts[0] < QUIET_COLLECT_AT:
+            return False
+        saved = self._saved
+        generation = 2 if counts[2] >= saved[2] else 1 if counts[1] >= saved[1] else 0
+        now = time.monotonic()
+        if generation and not self._fits(generation, self.pause_ms[generation], slack_ms, now):
+            # Keep the young generation small meanwhile
+            generation = 0
+        if not generation and not self._fits(0, self.young_ms_per_object * counts[0], slack_ms, now):
+            return False
+
+        t0 = perf_counter_ns()
+        gc.collect(generation)
+        pause_ms = (perf_counter_ns() - t0) / 1e6
+        self.pause_ms[generation] = pause_ms
+        for collected in range(generation + 1):
+            self._deferred_since[collected] = None
+        if not generation:
+            # Smoothed: one collection stretched by preemption shouldn't hold the next ones off
+            per_object = pause_ms / counts[0]
+            self.young_ms_per_object = per_object if not self.young_ms_per_object else \
+                0.75 * self.young_ms_per_object + 0.25 * per_object
+        self.quiet_collections += 1
+        return True
+
+    def _fits(self, generation, expected_ms, slack_ms, now):
+        """True if the expected pause fits the slack, or the collection was put off as long as it may be."""
+        if slack_ms >= QUIET_MARGIN * expected_ms:
+            return True
+        since = self._deferred_since[generation]
+        if since is None:
+            self._deferred_since[generation] = since = now
+        if now - since >= QUIET_MAX_DEFER_S[generation]:
+            return True
+        self.deferred += 1
+        return False
+
+    def get_stats(self):
+        return {"streams": self.users, "frozen_objects": self.frozen,
+                "quiet_collections": self.quiet_collections, "deferred": self.deferred,
+                "quiet_pause_ms": [round(ms, 2) for ms in self.pause_ms]}
+
+
+def raise_priority():
+    """
+    Raises the calling thread's scheduling priority as far as allowed.
+    Returns what was applied (for logs and stats), or None.
+    """
+    system = platform.system()
+    if system == "Windows":
+        try:
+            # MMCSS: the scheduler class Windows gives its own audio threads
+            task = ctypes.c_ulong(0)
+            avrt = ctypes.windll.avrt
+            avrt.AvSetMmThreadCharacteristicsW.restype = ctypes.c_void_p
+            if avrt.AvSetMmThreadCharacteristicsW("Pro Audio", ctypes.byref(task)):
+                return "mmcss"
+        except Exception:
+            pass
+        try:
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentThread.restype = ctypes.c_void_p
+            kernel32.SetThreadPriority.argtypes = [ctypes.c_void_p, ctypes.c_int]
+            if kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_TIME_CRITICAL):
+                return "time_critical"
+        except Exception:
+            pass
+        return None
+    # Linux applies these to the calling thread (pid 0 / its own tid)
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(SCHED_FIFO_PRIORITY))
+        return "fifo"
+    except (AttributeError, OSError):
+        pass
+    try:
+        tid = threading.get_native_id() if system == "Linux" else 0
+        os.setpriority(os.PRIO_PROCESS, tid, os.getpriority(os.PRIO_PROCESS, tid) - 5)
+        return "nice"
+    except (AttributeError, OSError):
+        return None
+
+
+def pin_to_cpu(cpu):
+    """Pins the calling thread to one CPU. Returns True if it worked."""
+    try:
+        if platform.system() == "Windows":
+            kernel32 = ctypes.windll.kernel32
+            kernel32.GetCurrentThread.restype = ctypes.c_void_p
+            kernel32.SetThreadAffinityMask.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+            kernel32.SetThreadAffinityMask.restype = ctypes.c_size_t
+            return bool(kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), 1 << cpu))
+        os.sched_setaffinity(0, {cpu})
+        return True
+    except (AttributeError, OSError, ValueError):
+        return False
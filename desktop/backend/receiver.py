@@ -0,0 +1,123 @@
+import socket
+import struct
+
+
+class FrameReceiver:
+    """
+    Zero-copy reader for the phone's length-prefixed PCM stream.
+
+    Bytes are received with recv_into() straight into a reusable arena and
+    every complete [int32 length][payload] frame already buffered is parsed
+    out of a single syscall. Payloads are returned as memoryviews into the
+    arena; they stay valid until the next fill(), so consumers must finish
+    with (or copy) a frame before reading more.
+    """
+
+    HEADER = struct.Struct('>i')
+    # Compact the arena when less than this much room is left at the tail
+    MIN_ROOM = 16384
+    # Most data discard_pending() will throw away in one call
+    DISCARD_LIMIT = 1 << 20
+
+    def __init__(self, sock, max_frame=65536):
+        self.sock = sock
+        self.max_frame = max_frame
+        # Big enough that a partial max-size frame always fits after compaction
+        self._arena = bytearray(2 * (max_frame + self.HEADER.size) + self.MIN_ROOM)
+        self._view = memoryview(self._arena)
+        self._start = 0  # Parse position
+        self._end = 0    # Fill position
+
+        self.syscalls = 0
+        self.bytes_received = 0
+
+    @property
+    def buffered(self):
+        return self._end - self._start
+
+    def _compact(self):
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif len(self._arena) - self._end < self.MIN_ROOM:
+            # Move the leftover partial frame to the front (usually < 1 frame)
+            remaining = self._end - self._start
+            self._view[:remaining] = self._view[self._start:self._end]
+            self._start, self._end = 0, remaining
+
+    def fill(self):
+        """
+        Performs one recv_into() syscall. Returns the number of bytes read,
+        0 when the peer closed the connection. Socket timeouts propagate.
+        """
+        self._compact()
+        n = self.sock.recv_into(self._view[self._end:])
+        self.syscalls += 1
+        self._end += n
+        self.bytes_received += n
+        return n
+
+    def read_exact(self, n):
+        """
+        Returns a view of exactly n bytes (e.g. handshake fields), reading
+        more from the socket as needed. Returns None on EOF or timeout.
+        """
+        try:
+            while self.buffered < n:
+                if not self.fill():
+                    return None
+        except (socket.timeout, OSError):
+            return None
+        data = self._view[self._start:self._start + n]
+        self._start += n
+        return data
+
+    def next_frame(self):
+        """
+        Returns the next buffered frame payload, or None if no complete frame
+        is buffered. Raises ValueError on an invalid length prefix (the
+        4 header bytes are skipped so the caller can decide whether to go on).
+        """
+        if self.buffered < self.HEADER.size:
+            return None
+        length = self.HEADER.unpack_from(self._arena, self._start)[0]
+        if length <= 0 or length > self.max_frame:
+            self._start += self.HEADER.size
+            raise ValueError(f"Invalid frame length: {length}")
+        end = self._start + self.HEADER.size + length
+        if end > self._end:
+            return None
+        payload = self._view[self._start + self.HEADER.size:end]
+        self._start = end
+        return payload
+
+    def discard_pending(self):
+        """
+        Drops everything the socket has queued, frame-aligned: complete frames
+        are thrown away, a trailing partial frame is kept so framing survives.
+        Returns the number of frames discarded.
+        """
+        dropped = 0
+        # Bounded, so a sender that never pauses can't keep us here forever
+        limit = self.bytes_received + self.DISCARD_LIMIT
+        timeout = self.sock.gettimeout()
+        self.sock.settimeout(0.0)  # Non-blocking
+        try:
+            while self.bytes_received < limit:
+                dropped += self._discard_buffered()
+                if not self.fill():
+                    break
+        except (BlockingIOError, socket.timeout, OSError):
+            pass
+        finally:
+            self.sock.settimeout(timeout)
+        return dropped + self._discard_buffered()
+
+    def _discard_buffered(self):
+        dropped = 0
+        while True:
+            try:
+                if self.next_frame() is None:
+                    return dropped
+            except ValueError:
+                continue
+            dropped += 1
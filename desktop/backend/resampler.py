@@ -0,0 +1,116 @@
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class StreamingResampler:
+    """
+    Stateful windowed-sinc resampler for int16 mono audio.
+
+    A Kaiser-windowed sinc is tabulated at a fixed number of fractional
+    phases; output samples interpolate linearly between neighbouring phases,
+    so any (even slowly changing) conversion ratio is supported. Unconsumed
+    input and the fractional read position carry over between calls, so
+    chunk boundaries are seamless.
+    """
+
+    # quality -> (taps per side, phases, Kaiser beta)
+    QUALITY = {
+        "low": (8, 64, 6.0),
+        "medium": (16, 128, 8.0),
+        "high": (32, 256, 10.0),
+    }
+    # Passband edge as a fraction of the (lower) Nyquist frequency
+    ROLLOFF = 0.94
+
+    def __init__(self, in_rate, out_rate, quality="medium"):
+        if quality not in self.QUALITY:
+            raise ValueError(f"Unknown resampler quality: {quality}")
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.quality = quality
+
+        half, self.phases, beta = self.QUALITY[quality]
+        # When downsampling the kernel widens so the stopband stays put
+        cutoff = min(1.0, out_rate / in_rate) * self.ROLLOFF
+        self.half = int(math.ceil(half / min(1.0, out_rate / in_rate)))
+        self.taps = 2 * self.half
+        table = self._build_table(cutoff, beta)
+        # Per phase: [kernel, delta to next phase] so interpolation is one FMA per output
+        self._table = np.ascontiguousarray(np.stack([table[:-1], table[1:] - table[:-1]], axis=1))
+
+        # Input samples consumed per output sample
+        self.nominal_step = in_rate / out_rate
+        self.step = self.nominal_step
+
+        # Pending input; starts with `half` zeros so the first real sample
+        # sits at the read position
+        self._alloc(4096 + self.taps)
+        self._len = self.half
+        self._pos = float(self.half)
+
+    def _build_table(self, cutoff, beta):
+        # table[p, m] = kernel(p / phases + half - 1 - m), one extra row for interpolation
+        frac = np.arange(self.phases + 1)[:, None] / self.phases
+        t = frac + (self.half - 1) - np.arange(self.taps)[None, :]
+        window = np.i0(beta * np.sqrt(np.clip(1.0 - (t / self.half) ** 2, 0.0, None))) / np.i0(beta)
+        table = cutoff * np.sinc(cutoff * t) * window
+        # Unity DC gain for every phase
+        table /= table.sum(axis=1, keepdims=True)
+        return table.astype(np.float32)
+
+    def _alloc(self, size):
+        self._buf = np.zeros(size, dtype=np.float32)
+        # Row i is the input window starting at sample i (a view, no copy)
+        self._windows = sliding_window_view(self._buf, self.taps)
+
+    def set_ratio_adjust(self, ppm):
+        """Fine-tunes the conversion ratio by `ppm` parts per million (drift compensation)."""
+        self.step = self.nominal_step * (1.0 + ppm * 1e-6)
+
+    @property
+    def delay(self):
+        """Input samples buffered but not yet turned into output."""
+        return self._len - self._pos
+
+    def reset(self):
+        self._buf[:] = 0
+        self._len = self.half
+        self._pos = float(self.half)
+
+    def process(self, samples):
+        """Resamples a chunk of int16 audio. Returns a new int16 array."""
+        n = len(samples)
+        if self._len + n > len(self._buf):
+            old = self._buf
+            self._alloc(self._len + n + self.taps)
+            self._buf[:self._len] = old[:self._len]
+        self._buf[self._len:self._len + n] = samples
+        self._len += n
+
+        # Output t is computable while floor(t) + half stays inside the buffer
+        count = int(math.ceil((self._len - self.half - self._pos) / self.step))
+        if count <= 0:
+            return np.zeros(0, dtype=np.int16)
+
+        t = self._pos + np.arange(count) * self.step
+        base = np.floor(t)
+        phase = (t - base) * self.phases
+        p0 = phase.astype(np.intp)
+
+        # Dot every input window with its phase's kernel and delta, then interpolate
+        windows = self._windows[base.astype(np.intp) - (self.half - 1)]
+        y = np.einsum('ik,ijk->ij', windows, self._table[p0])
+        out = y[:, 0] + (phase - p0) * y[:, 1]
+
+        # Drop input that no future output can reach
+        self._pos += count * self.step
+        drop = max(0, int(math.floor(self._pos)) - self.half + 1)
+        if drop:
+            remaining = self._len - drop
+            self._buf[:remaining] = self._buf[drop:self._len]
+            self._len = remaining
+            self._pos -= drop
+
+        np.clip(out, -32768, 32767, out=out)
+        return np.rint(out).astype(np.int16)
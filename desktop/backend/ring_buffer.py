@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class SampleRing:
+    """
+    Preallocated ring of audio samples.
+    Writes and reads copy straight into/out of the backing array, so moving
+    audio through it never allocates. Not thread-safe on its own; callers
+    that share it between threads hold their own lock.
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = int(capacity)
+        self._buf = np.zeros(self.capacity, dtype=dtype)
+        # Absolute sample counters; position in the array is counter % capacity
+        self._read = 0
+        self._write = 0
+
+    @property
+    def available(self):
+        return self._write - self._read
+
+    @property
+    def free(self):
+        return self.capacity - self.available
+
+    def write(self, samples):
+        """
+        Appends samples. If there is not enough room the oldest samples are
+        overwritten. Returns the number of samples that were overwritten.
+        """
+        n = len(samples)
+        truncated = 0
+        if n > self.capacity:
+            truncated = n - self.capacity
+            samples = samples[truncated:]
+            n = self.capacity
+
+        overwritten = max(0, n - self.free)
+        self._read += overwritten
+
+        start = self._write % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = samples[:first]
+        if first < n:
+            self._buf[:n - first] = samples[first:]
+        self._write += n
+        return overwritten + truncated
+
+    def read_into(self, out):
+        """Copies up to len(out) samples into out. Returns the number copied."""
+        n = min(len(out), self.available)
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buf[start:start + first]
+        if first < n:
+            out[first:n] = self._buf[:n - first]
+        self._read += n
+        return n
+
+    def drop(self, n):
+        """Discards up to n of the oldest samples. Returns the number discarded."""
+        n = max(0, min(n, self.available))
+        self._read += n
+        return n
+
+    def clear(self):
+        self._read = self._write
@@ -0,0 +1,418 @@
+import time
+import numpy as np
+from time import perf_counter_ns
+from denoiser import RNNoise
+from dsp import DspChain
+from dsp_worker import DspWorker, WorkerError
+from resampler import StreamingResampler
+from drift import DriftEstimator
+from meter import LevelMeter, FULL_SCALE
+from stats import PipelineStats
+from protocol import LinkStats, FORMAT_F32, f32_to_s16, monotonic_us
+
+DEFAULT_SESSION = "default"
+
+
+class StreamSession:
+    """
+    One phone streaming into the PC.
+
+    Holds the connection settings (forwarded port, adb serial, output device)
+    and all per-stream state: socket, DSP chain (denoiser, gain, ...; optionally
+    run in a worker process), resamplers, drift estimator, playout buffer and stats. The backend runs one reader thread
+    per session; playback goes through the OutputMixer of its output device,
+    shared with every other session on that device.
+
+    The reader threads are kept on purpose rather than multiplexing every socket
+    on one thread: they block in recv() with the GIL released, so an extra phone
+    costs its DSP work and no idle CPU, and each keeps its own realtime priority,
+    reconnect backoff and blocking TCP framing. What did scale badly per phone,
+    an output stream and playout thread each, is shared by the mixer.
+    """
+
+    # Concealment fades the repeated packet out over this much lost audio
+    PLC_FADE_MS = 20.0
+
+    def __init__(self, session_id, device_name=None, port=6000, remote_port=None, serial=None):
+        self.session_id = session_id
+        self.device_name = device_name
+        self.port = port                       # Local end of the adb forward
+        self.remote_port = remote_port or port  # Port the app listens on, on the phone
+        self.serial = serial                   # adb serial, needed once several phones are plugged in
+
+        self.is_streaming = False
+        self.thread = None
+        self.sock = None
+        # Audio over "tcp" (the adb forward) or "udp" datagrams (Wi-Fi, v2 phones;
+        # TCP stays the control channel). `host` connects to the phone directly instead of via adb.
+        self.transport = "tcp"
+        self.host = None
+        self.udp = None
+        self.datagrams = None  # DatagramReceiver of the current UDP connection
+        self.notify = None  # Callable taking a UI message dict
+
+        # Reconnect until stopped, keeping the output stream, denoiser and worker warm
+        self.persistent = False
+        self.reconnects = 0
+        self.disconnected_at = None   # time.monotonic() when the phone last dropped
+        self.last_gap_ms = None       # Drop to first audio of the next connection
+        self.time_to_audio_ms = None  # Connect to first audio queued for playout
+
+        # Realtime mode: GC kept to quiet points, raised priority, optionally pinned to `cpu`
+        self.realtime = False
+        self.cpu = None
+        self.priority = None  # What raise_priority() managed to apply
+        self.pinned = False
+
+        # Taps on this session's output, by path; paths asked for before the output opened wait in record_paths
+        self.recordings = {}
+        self.record_paths = []
+
+        # Denoise / high-pass / AGC / gain / limiter, sized for one max-size frame (64KB)
+        self.dsp = DspChain(RNNoise.SAMPLE_RATE, capacity=65536 // 2)
+        # Optional: the chain runs in a separate process, this one only keeps its settings
+        self.worker = None
+
+        self.drift_compensation = True
+        self.drift = DriftEstimator()
+        self.stats = PipelineStats()
+        # Wire format of the connection; sequence / capture-time accounting for v2 phones
+        self.link = LinkStats()
+        self.meter = LevelMeter(RNNoise.SAMPLE_RATE)
+
+        # Rate conversion state (phone rate -> 48k for RNNoise -> device rate)
+        self.resample_quality = "medium"
+        self.input_rate = RNNoise.SAMPLE_RATE
+        self.output_rate = RNNoise.SAMPLE_RATE
+        self.resamplers = {}
+
+        self.jitter_buffer = None
+        self.mixer = None
+
+        # Gate state as last reported to the UI, and the zeros queued while it is closed
+        self.vad = None
+        self.gate_open = True
+        self._silence = np.zeros(4096, dtype=np.int16)
+        self._silence_carry = 0.0
+
+        # float32 senders are converted to int16 here, before anything else sees the frame
+        self._f32 = np.zeros(65536 // 4, dtype=np.float32)
+        self._f32_pcm = np.zeros(65536 // 4, dtype=np.int16)
+
+        # Packet loss concealment (datagram transport only): the last packet and scratch buffers
+        self.concealment = False
+        self._plc_frame = np.zeros(65536 // 2, dtype=np.int16)
+        self._plc_out = np.zeros(65536 // 2, dtype=np.int16)
+        self._plc_ramp = np.zeros(65536 // 2, dtype=np.float32)
+        self._plc_steps = np.arange(65536 // 2, dtype=np.float32)
+        self._plc_len = 0
+        self._plc_run = 0  # Samples concealed in a row
+
+    @property
+    def gain(self):
+        return self.dsp.stages["gain"].gain
+
+    @gain.setter
+    def gain(self, value):
+        # Ramped by the gain stage, so live changes don't click
+        self.dsp.configure("gain", gain=value)
+
+    @property
+    def use_rnnoise(self):
+        return self.dsp.stages["denoise"].enabled
+
+    def set_rnnoise(self, enabled):
+        """Turns denoising on or off; the denoiser state is created on first use (may raise)."""
+        self.dsp.configure("denoise", enabled=enabled)
+
+    def begin(self, input_rate, jbuf, mixer):
+        """Binds the session to its playout buffer and output, resetting per-stream state."""
+        self.input_rate = input_rate
+        self.output_rate = mixer.rate
+        self.resamplers = {}
+        self.drift.reset()
+        self.stats.reset()
+        self.link.reset()
+        self.meter.configure(sample_rate=input_rate)
+        self.meter.reset()
+        self.dsp.reset()
+        self.vad = None
+        self.gate_open = True
+        self._silence_carry = 0.0
+        self._plc_len = 0
+        if self.worker:
+            # Settings first, so the reset settles the worker's gain like the local one
+            self.worker.sync(self.dsp)
+            self.worker.reset()
+        self.jitter_buffer = jbuf
+        self.mixer = mixer
+
+    def resume(self, input_rate):
+        """
+        Picks the stream up again after a reconnect. The output, playout buffer,
+        DSP chain (and its denoiser state allocation), worker and drift estimate
+        are kept; only the signal history of the old connection is cleared.
+        """
+        if input_rate != self.input_rate:
+            self.input_rate = input_rate
+            self.resamplers = {}
+            self.meter.configure(sample_rate=input_rate)
+        else:
+            for resampler in self.resamplers.values():
+                resampler.reset()
+        self.meter.reset()
+        self.dsp.reset()
+        self.vad = None
+        self.gate_open = True
+        self._silence_carry = 0.0
+        self._plc_len = 0
+        # The clocks drifted while the phone was away too: keep the estimate, not the timing
+        self.drift.pause()
+        if self.worker:
+            try:
+                self.worker.reset()
+            except WorkerError:
+                self.stop_worker()
+        self.reconnects += 1
+
+    def connected(self, connected_at):
+        """Records how long the first audio of a connection took (time.monotonic() stamps)."""
+        now = time.monotonic()
+        self.time_to_audio_ms = (now - connected_at) * 1000
+        if self.disconnected_at is not None:
+            self.last_gap_ms = (now - self.disconnected_at) * 1000
+            self.disconnected_at = None
+
+    def start_worker(self):
+        """Moves DSP into a worker process. Raises WorkerError if it cannot be started."""
+        worker = DspWorker(capacity=self.dsp.capacity)
+        worker.start()
+        self.worker = worker
+
+    def stop_worker(self):
+        worker, self.worker = self.worker, None
+        if worker:
+            worker.close()
+
+    def _process_remote(self, samples, stats):
+        """DSP through the worker process; falls back to the in-process chain if it fails."""
+        try:
+            out = self.worker.process(samples, self.dsp)
+        except WorkerError as e:
+            self.stop_worker()
+            if self.notify:
+                self.notify({"type": "log", "message": f"[!] {e}, processing in-process"})
+            return self.dsp.process(samples, stats)
+        if stats:
+            stats.record("worker", self.worker.last_work_ns)
+            stats.record("ipc", self.worker.last_overhead_ns)
+        return out
+
+    def _resample(self, samples, from_rate, to_rate, ppm=None):
+        """
+        Converts rates with a per-stream resampler that keeps its filter state across frames.
+        With `ppm` set the resampler always runs, trimming the ratio for clock drift.
+        """
+        if from_rate == to_rate and ppm is None:
+            return samples
+        resampler = self.resamplers.get((from_rate, to_rate))
+        if resampler is None:
+            resampler = StreamingResampler(from_rate, to_rate, self.resample_quality)
+            self.resamplers[(from_rate, to_rate)] = resampler
+        if ppm is not None:
+            resampler.set_ratio_adjust(ppm)
+        return resampler.process(samples)
+
+    def process_frame(self, payload):
+        """Run one received frame through the DSP chain and meter, then queue it for playout."""
+        # Timestamps are only taken when instrumentation is on
+        stats = self.stats if self.stats.enabled else None
+        t_start = t0 = perf_counter_ns() if stats else 0
+
+        link = self.link
+        if link.header_size:
+            # v2: sequence number and capture time ahead of the PCM
+            try:
+                payload = link.receive(payload, monotonic_us())
+            except ValueError:
+                self.stats.frames_dropped += 1
+                return
+            if payload is None: return
+
+        # Zero-copy view over the receive arena
+        if link.format.sample_format == FORMAT_F32:
+            audio_array = f32_to_s16(np.frombuffer(payload, dtype='<f4', count=len(payload) // 4),
+                                     self._f32_pcm, self._f32)
+        else:
+            audio_array = np.frombuffer(payload, dtype=np.int16, count=len(payload) // 2)
+        if self.concealment:
+            # Kept for conceal(): the arena is reused by the next read
+            n = len(audio_array)
+            self._plc_frame[:n] = audio_array
+            self._plc_len = n
+            self._plc_run = 0
+        self._process_pcm(audio_array, stats, t_start, t0)
+
+    def conceal(self):
+        """
+        Stands in for one lost packet (datagram transport): the last good one
+        is repeated, fading out over PLC_FADE_MS of lost audio, then silence.
+        The playout buffer keeps getting fed, so a lost packet never makes it
+        underrun and re-prime.
+        """
+        n = self._plc_len
+        if not n: return
+        stats = self.stats if self.stats.enabled else None
+        t_start = perf_counter_ns() if stats else 0
+        fade = self.PLC_FADE_MS * self.input_rate / 1000.0
+        # Linear gain ramp across this packet, continuing the previous one
+        start = self._plc_run
+        ramp = self._plc_ramp[:n]
+        ramp[:] = self._plc_steps[:n]
+        ramp += start
+        ramp *= np.float32(-1.0 / fade)
+        ramp += np.float32(1.0)
+        np.maximum(ramp, np.float32(0.0), out=ramp)
+        ramp *= self._plc_frame[:n]
+        out = self._plc_out[:n]
+        np.rint(ramp, out=ramp)
+        out[:] = ramp
+        self._plc_run = start + n
+        self.stats.frames_concealed += max(1, self.link.format.batch)
+        self.link.last_latency_us = None
+        self._process_pcm(out, stats, t_start, t_start)
+
+    def _process_pcm(self, audio_array, stats, t_start, t0):
+        """DSP, metering, rate conversion and playout for decoded int16 input-rate PCM."""
+        jbuf = self.jitter_buffer
+        link = self.link
+        rate = self.input_rate
+
+        # RNNoise only works on 48kHz audio
+        dsp = self.dsp
+        required = dsp.required_rate
+        if required and required != rate:
+            audio_array = self._resample(audio_array, rate, required)
+            rate = required
+            if stats: t1 = perf_counter_ns(); stats.record("resample_in", t1 - t0); t0 = t1
+
+        # --- DSP CHAIN: every stage works in place on one float32 buffer ---
+        if rate != dsp.rate:
+            dsp.set_rate(rate)
+        if self.worker:
+            audio_array = self._process_remote(audio_array, stats)
+        else:
+            audio_array = dsp.process(audio_array, stats)
+        if stats: t0 = perf_counter_ns()
+        # The denoiser is still collecting its first full frame
+        if not len(audio_array): return
+
+        worker = self.worker
+        gated = worker.gated if worker else dsp.gated
+        self.vad = worker.vad if worker else dsp.vad
+        if self.vad is not None and self.notify:
+            # Coalesced by the telemetry queue, like the meter
+            self.notify({"type": "vad", "session": self.session_id,
+                         "probability": round(self.vad, 3), "gate_open": not gated})
+
+        # --- OPTIMIZATION: closed gate skips gain, metering and resampling ---
+        if gated:
+            if self.gate_open and self.notify:
+                self.notify({"type": "volume", "value": 0.0, "session": self.session_id,
+                             "rms": 0.0, "peak": 0.0, "clipped": 0})
+            self.gate_open = False
+            self.stats.frames_gated += 1
+            if not dsp.gate.skip_output:
+                self._push_silence(len(audio_array), rate)
+            self.stats.frames_processed += 1
+            if stats: stats.record("frame", perf_counter_ns() - t_start)
+            return
+        self.gate_open = True
+
+        # Levels are measured after gain, so clipping shows up in the meter
+        if rate != self.meter.sample_rate:
+            self.meter.configure(sample_rate=rate)
+        reading = self.meter.update(audio_array)
+        if reading and self.notify:
+            # "value" keeps the bar's original scale (RMS of 2000 = full)
+            self.notify({"type": "volume", "value": min(reading["rms"] * FULL_SCALE / 2000, 1.0),
+                         "session": self.session_id, **reading})
+        if stats: t1 = perf_counter_ns(); stats.record("meter", t1 - t0); t0 = t1
+
+        # Convert to the output device's native rate, trimmed for clock drift
+        ppm = None
+        if self.drift_compensation:
+            if jbuf.playing:
+                self.drift.update(jbuf.depth_ms, jbuf.target_ms)
+            ppm = self.drift.correction_ppm
+        audio_array = self._resample(audio_array, rate, self.output_rate, ppm)
+
+        if link.last_latency_us is not None:
+            # It plays once the buffer ahead of it and one device block are through
+            link.record_playout(jbuf.depth_ms * 1000 + self.mixer.block_frames * 1e6 / self.mixer.rate)
+
+        # Copies into the playout ring, so the arena and denoise_out can be reused
+        jbuf.push(audio_array)
+        self.stats.frames_processed += 1
+        if stats:
+            t1 = perf_counter_ns()
+            stats.record("resample_out", t1 - t0)
+            stats.record("frame", t1 - t_start)
+
+    def _push_silence(self, n, rate):
+        """Queues the output-rate equivalent of `n` samples of silence, drift-corrected."""
+        jbuf = self.jitter_buffer
+        ppm = 0.0
+        if self.drift_compensation:
+            if jbuf.playing:
+                self.drift.update(jbuf.depth_ms, jbuf.target_ms)
+            ppm = self.drift.correction_ppm
+        # Positive ppm consumes input faster, i.e. fewer output samples
+        exact = n * self.output_rate / rate / (1.0 + ppm * 1e-6) + self._silence_carry
+        count = int(exact)
+        self._silence_carry = exact - count
+        if count > len(self._silence):
+            self._silence = np.zeros(count, dtype=np.int16)
+        jbuf.push(self._silence[:count])
+
+    def buffer_stats(self):
+        """Playout buffer, drift and device health, or None before the stream is set up."""
+        jbuf = self.jitter_buffer
+        if jbuf is None:
+            return None
+        underflows = self.mixer.underflows if self.mixer else 0
+        return {"device_underflows": underflows, **jbuf.get_stats(), **self.drift.get_stats()}
+
+    def get_stats(self):
+        """Pipeline timings, counters and playout buffer state for the UI."""
+        payload = self.stats.snapshot()
+        payload["device_name"] = self.device_name
+        payload["gain"] = self.gain
+        payload["rnnoise"] = self.use_rnnoise
+        payload["dsp"] = self.dsp.describe()
+        worker = self.worker
+        agc_gain_db = worker.agc_gain_db if worker else self.dsp.stages["agc"].gain_db
+        payload["agc_gain_db"] = round(agc_gain_db, 2)
+        payload["vad"] = None if self.vad is None else round(self.vad, 3)
+        payload["gate_open"] = self.gate_open
+        if worker:
+            payload["worker"] = worker.get_stats()
+        payload["clipped_samples"] = self.meter.clipped_total
+        payload["link"] = self.link.get_stats()
+        if self.datagrams:
+            payload["link"]["datagrams"] = self.datagrams.get_stats()
+        payload["reconnect"] = {
+            "persistent": self.persistent,
+            "reconnects": self.reconnects,
+            "time_to_audio_ms": None if self.time_to_audio_ms is None else round(self.time_to_audio_ms, 1),
+            "last_gap_ms": None if self.last_gap_ms is None else round(self.last_gap_ms, 1),
+        }
+        recordings = list(self.recordings.values())
+        if recordings:
+            payload["recordings"] = [tap.get_stats() for tap in recordings]
+        if self.realtime:
+            payload["realtime"] = {"priority": self.priority, "cpu": self.cpu if self.pinned else None}
+        buffer = self.buffer_stats()
+        if buffer:
+            payload["buffer"] = buffer
+        return payload
@@ -0,0 +1,323 @@
+import os
+import stat
+import struct
+import threading
+import time
+from collections import deque
+
+# Output ids that name a sink instead of a PortAudio device
+NULL_SINK = "null"
+FILE_SINK_PREFIX = "file:"
+
+# A FIFO without a reader (or a reader that went away) is retried this often
+REOPEN_INTERVAL = 1.0
+
+# Recording taps buffer this much audio while the disk is slow before dropping blocks
+TAP_QUEUE_SECONDS = 10.0
+TAP_FLUSH_INTERVAL = 0.25
+TAP_BUFFER_BYTES = 1 << 20
+
+
+def parse_sink(device_id):
+    """Returns ("null", None) or ("file", path) for sink ids, None for PortAudio devices."""
+    if not isinstance(device_id, str):
+        return None
+    if device_id == NULL_SINK:
+        return NULL_SINK, None
+    if device_id.startswith(FILE_SINK_PREFIX) and len(device_id) > len(FILE_SINK_PREFIX):
+        return "file", device_id[len(FILE_SINK_PREFIX):]
+    return None
+
+
+def open_sink(device_id, rate, block_frames, callback=None):
+    """Opens the sink named by `device_id` (see parse_sink) like a PortAudio output stream."""
+    kind, path = parse_sink(device_id)
+    if kind == "file":
+        return FileSink(path, rate, block_frames, callback)
+    return NullSink(rate, block_frames, callback)
+
+
+def open_for_writing(path):
+    """
+    Opens a file or FIFO for writing without waiting for a FIFO's reader
+    (raises OSError, ENXIO, if there is none yet). Writes to it do block.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_NONBLOCK", 0) | getattr(os, "O_BINARY", 0)
+    fd = os.open(path, flags, 0o644)
+    try:
+        fifo = stat.S_ISFIFO(os.fstat(fd).st_mode)
+        if fifo:
+            os.set_blocking(fd, True)
+        else:
+            os.ftruncate(fd, 0)
+    except Exception:
+        os.close(fd)
+        raise
+    return fd, fifo
+
+
+class ClockedSink:
+    """
+    Output that consumes audio at real-time pace, standing in for a PortAudio
+    stream: in callback mode a thread pulls blocks like PortAudio would; in
+    blocking mode write() sleeps until a device would have room again.
+    Subclasses decide what happens to each block in consume().
+    """
+
+    def __init__(self, rate, block_frames, callback=None):
+        self.rate = rate
+        self.block_frames = block_frames
+        self.period = block_frames / rate
+        self.callback = callback
+        self.blocks = 0
+        self.late = 0  # Blocks delivered after their deadline (the clock restarted)
+        self._next = time.monotonic()
+        self._running = True
+        self._thread = None
+        if callback:
+            self._thread = threading.Thread(target=self._pull, daemon=True)
+            self._thread.start()
+
+    def consume(self, data):
+        pass
+
+    def _wait_for_device(self):
+        self._next += self.period
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            self.late += 1
+            self._next = time.monotonic()
+
+    def _pull(self):
+        while self._running:
+            data, _ = self.callback(None, self.block_frames, None, 0)
+            self.consume(data)
+            self.blocks += 1
+            self._wait_for_device()
+
+    def write(self, data):
+        self.consume(data)
+        self.blocks += 1
+        self._wait_for_device()
+
+    def stop_stream(self):
+        self._running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def close(self):
+        pass
+
+    def get_stats(self):
+        return {"sink": NULL_SINK, "blocks": self.blocks, "late_blocks": self.late}
+
+
+class NullSink(ClockedSink):
+    """Discards the audio: a device-paced output for load testing without a sound card."""
+
+
+class FileSink(ClockedSink):
+    """
+    Writes raw little-endian int16 mono PCM to a file or FIFO (e.g. the pipe
+    source of a virtual audio cable), at the pace of a device. A FIFO's reader
+    may come and go: until one is there the audio is discarded, and the
+    sink reopens the FIFO every REOPEN_INTERVAL.
+    """
+
+    def __init__(self, path, rate, block_frames, callback=None):
+        self.path = path
+        self.fd = None
+        self.fifo = False
+        self.bytes_written = 0
+        self.error = None
+        self._retry_at = 0.0
+        # Opened on the first block (on the pulling / playout thread), never while the caller holds locks
+        super().__init__(rate, block_frames, callback)
+
+    def _open(self):
+        now = time.monotonic()
+        if now < self._retry_at:
+            return False
+        try:
+            self.fd, self.fifo = open_for_writing(self.path)
+            self.error = None
+            return True
+        except OSError as e:
+            self.error = str(e)
+            self._retry_at = now + REOPEN_INTERVAL
+            return False
+
+    def consume(self, data):
+        if self.fd is None and not self._open():
+            return
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.fd, view):]
+            self.bytes_written += len(data)
+        except OSError as e:
+            # The FIFO's reader left (EPIPE) or the disk failed: drop until it can be reopened
+            self.error = str(e)
+            self._close_fd()
+            self._retry_at = time.monotonic() + REOPEN_INTERVAL
+
+    def _close_fd(self):
+        if self.fd is not None:
+            try: os.close(self.fd)
+            except OSError: pass
+            self.fd = None
+
+    def close(self):
+        self._close_fd()
+
+    def get_stats(self):
+        return {**super().get_stats(), "sink": FILE_SINK_PREFIX + self.path, "fifo": self.fifo,
+                "bytes_written": self.bytes_written, "error": self.error}
+
+
+class TapWriter:
+    """
+    Copies an output's audio to a file or FIFO from a background thread.
+
+    write() runs on the audio thread and only appends the block (the bytes
+    object the device was given, shared rather than copied) to a bounded
+    queue. The writer thread wakes every `flush_interval` and hands everything
+    queued to a large buffered file, so disk I/O happens in big writes and
+    never on the audio thread. If the disk stalls long enough to fill the
+    queue, new blocks are dropped and counted instead of waiting.
+    """
+
+    def __init__(self, path, rate, block_frames, queue_seconds=TAP_QUEUE_SECONDS,
+                 flush_interval=TAP_FLUSH_INTERVAL, buffer_bytes=TAP_BUFFER_BYTES):
+        self.path = path
+        self.rate = rate
+        self.max_blocks = max(2, int(queue_seconds * rate / block_frames))
+        self.flush_interval = flush_interval
+
+        self.blocks = 0
+        self.dropped_blocks = 0
+        self.queue_peak = 0
+        self.bytes_written = 0
+        self.error = None
+
+        # Opened here so a bad path is reported to whoever asked for the tap (raises OSError)
+        fd, self.fifo = open_for_writing(path)
+        # A FIFO's reader wants the audio now; files get the full buffer
+        self._file = os.fdopen(fd, 'wb', buffering=0 if self.fifo else buffer_bytes)
+        self.start_file(self._file)
+        self._file.flush()
+
+        self._queue = deque()
+        self._closing = False
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def start_file(self, f):
+        """Writes whatever comes before the audio (nothing for raw PCM)."""
+
+    def finish_file(self, f):
+        """Completes the file once all audio is written."""
+
+    def write(self, data):
+        """Queues one block. Never blocks: drops the block when the queue is full or the file failed."""
+        queue = self._queue
+        if len(queue) >= self.max_blocks or self.error or self._closing:
+            self.dropped_blocks += 1
+            return
+        queue.append(data)
+        self.blocks += 1
+        if len(queue) > self.queue_peak:
+            self.queue_peak = len(queue)
+
+    def _drain(self):
+        queue = self._queue
+        f = self._file
+        written = 0
+        try:
+            if self.fifo:
+                # Unbuffered: one write for everything queued
+                batch = [queue.popleft() for _ in range(len(queue))]
+                if batch:
+                    data = b"".join(batch)
+                    f.write(data)
+                    written = len(data)
+            else:
+                while queue:
+                    data = queue.popleft()
+                    f.write(data)
+                    written += len(data)
+        except OSError as e:
+            self.error = str(e)
+            queue.clear()
+        self.bytes_written += written
+
+    def _run(self):
+        while not self._closing:
+            self._wake.wait(self.flush_interval)
+            if not self.error:
+                self._drain()
+        if not self.error:
+            self._drain()
+        try:
+            self._file.flush()
+            self.finish_file(self._file)
+        except OSError as e:
+            self.error = self.error or str(e)
+        finally:
+            try: self._file.close()
+            except OSError: pass
+
+    def close(self, timeout=5.0):
+        """Stops taking blocks, writes out what is queued and closes the file."""
+        self._closing = True
+        self._wake.set()
+        self._thread.join(timeout=timeout)
+
+    @property
+    def seconds(self):
+        return self.bytes_written / 2 / self.rate
+
+    def get_stats(self):
+        return {
+            "path": self.path,
+            "seconds": round(self.seconds, 2),
+            "blocks": self.blocks,
+            "dropped_blocks": self.dropped_blocks,
+            "queued": len(self._queue),
+            "queue_peak": self.queue_peak,
+            "error": self.error,
+        }
+
+
+class WavRecorder(TapWriter):
+    """
+    TapWriter producing a 16-bit mono WAV file. The header goes out with its
+    sizes left at zero (readers such as offline.py accept that, so a recording
+    cut short by a crash still opens) and is filled in on close.
+    """
+
+    HEADER_BYTES = 44
+
+    def start_file(self, f):
+        f.write(self._header(0, 0))
+
+    def finish_file(self, f):
+        if self.fifo:
+            return
+        f.seek(0)
+        f.write(self._header(self.HEADER_BYTES - 8 + self.bytes_written, self.bytes_written))
+
+    def _header(self, riff_bytes, data_bytes):
+        return (b'RIFF' + struct.pack('<I', riff_bytes) + b'WAVE'
+                + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, self.rate, self.rate * 2, 2, 16)
+                + b'data' + struct.pack('<I', data_bytes))
+
+
+def open_tap(path, rate, block_frames):
+    """A WavRecorder for .wav paths, raw PCM (e.g. into a FIFO) otherwise."""
+    if path.lower().endswith(".wav"):
+        return WavRecorder(path, rate, block_frames)
+    return TapWriter(path, rate, block_frames)
@@ -0,0 +1,99 @@
+import ctypes
+import platform
+import time
+import numpy as np
+
+
+class RollingHistogram:
+    """Keeps the last `window` values in a preallocated ring for percentile queries."""
+
+    def __init__(self, window=2048):
+        self._values = np.zeros(window, dtype=np.int64)
+        self._index = 0
+        self.count = 0
+
+    def record(self, value):
+        self._values[self._index] = value
+        self._index = (self._index + 1) % len(self._values)
+        self.count += 1
+
+    def summary(self, scale=1.0):
+        filled = self._values[:min(self.count, len(self._values))]
+        if not len(filled):
+            return None
+        p50, p95, p99 = np.percentile(filled, (50, 95, 99))
+        return {
+            "p50": round(p50 * scale, 1),
+            "p95": round(p95 * scale, 1),
+            "p99": round(p99 * scale, 1),
+            "max": round(filled.max() * scale, 1),
+            "count": self.count,
+        }
+
+    def reset(self):
+        self._index = 0
+        self.count = 0
+
+
+class PipelineStats:
+    """
+    Per-stage timing for the stream loop.
+    Callers check `enabled` before taking timestamps, so a disabled
+    instance costs one attribute lookup per stage.
+    """
+
+    # "worker" / "ipc": DSP time in the worker process and the round trip on top of it
+    STAGES = ("recv", "resample_in", "denoise", "gate", "highpass", "agc", "gain", "limiter",
+              "worker", "ipc", "meter", "resample_out", "frame")
+
+    def __init__(self, window=2048):
+        self.enabled = False
+        self.stages = {name: RollingHistogram(window) for name in self.STAGES}
+        self.socket_queue = RollingHistogram(window)
+        self.reset()
+
+    def reset(self):
+        for hist in self.stages.values():
+            hist.reset()
+        self.socket_queue.reset()
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.frames_gated = 0
+        # Lost datagrams played as a faded repeat of the previous packet
+        self.frames_concealed = 0
+        self.started = time.monotonic()
+
+    def record(self, stage, ns):
+        self.stages[stage].record(ns)
+
+    def snapshot(self):
+        """Stage timings in microseconds plus counters."""
+        return {
+            "enabled": self.enabled,
+            "uptime_s": round(time.monotonic() - self.started, 1),
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "frames_gated": self.frames_gated,
+            "frames_concealed": self.frames_concealed,
+            "stages_us": {name: hist.summary(1e-3) for name, hist in self.stages.items() if hist.count},
+            "socket_queue_bytes": self.socket_queue.summary(),
+        }
+
+
+def socket_queue_bytes(sock):
+    """Bytes waiting in the kernel receive queue of `sock`, or None if unsupported."""
+    try:
+        if platform.system() == "Windows":
+            FIONREAD = 0x4004667F
+            queued = ctypes.c_ulong(0)
+            if ctypes.windll.ws2_32.ioctlsocket(sock.fileno(), FIONREAD, ctypes.byref(queued)) != 0:
+                return None
+            return queued.value
+        import fcntl
+        import termios
+        from array import array
+        queued = array('i', [0])
+        fcntl.ioctl(sock.fileno(), termios.FIONREAD, queued)
+        return queued[0]
+    except Exception:
+        return None
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from collections import deque
+
+
+class TelemetryQueue:
+    """
+    Outbound message queue to the Flutter UI, serviced by its own writer thread.
+
+    put() never blocks on the socket, so the audio threads can report freely:
+      * meter-style messages (volume, vad, buffer, stats) are coalesced per
+        (type, session): only the latest value is kept and they go out on a
+        fixed-rate tick, giving the UI a steady feed however fast frames arrive
+      * logs share a bounded queue; when it is full new logs are dropped and
+        counted instead of piling up behind a slow UI
+      * everything else (status, errors, device lists) is sent in order right away
+    Each wake-up serializes whatever is pending into one newline-delimited write.
+    """
+
+    COALESCED = frozenset(("volume", "vad", "buffer", "stats"))
+    # Meter feed rate (Hz)
+    RATE_HZ = 30
+    MAX_PENDING = 256
+
+    def __init__(self, write, rate_hz=RATE_HZ, max_pending=MAX_PENDING):
+        self._write = write  # Callable taking bytes; runs on the writer thread only
+        self.period = 1.0 / rate_hz
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._ordered = deque()
+        self._latest = {}
+        self._thread = None
+        self._running = False
+
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped_logs = 0
+
+    def put(self, message):
+        """Queues one message dict. Safe from any thread, never blocks on I/O."""
+        kind = message.get("type")
+        with self._lock:
+            if kind in self.COALESCED:
+                key = (kind, message.get("session"))
+                if key in self._latest:
+                    self.coalesced += 1
+                self._latest[key] = message
+                return
+            if kind == "log" and len(self._ordered) >= self.max_pending:
+                self.dropped_logs += 1
+                return
+            self._ordered.append(message)
+        self._wake.set()
+
+    def flush(self, include_latest=True):
+        """Serializes and writes everything pending in one call. Returns the message count."""
+        with self._lock:
+            messages = list(self._ordered)
+            self._ordered.clear()
+            if include_latest and self._latest:
+                messages.extend(self._latest.values())
+                self._latest.clear()
+        if not messages:
+            return 0
+        # Append newline to ensure Flutter's LineSplitter catches each message
+        self._write("".join(json.dumps(m) + "\n" for m in messages).encode('utf-8'))
+        self.sent += len(messages)
+        return len(messages)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        try: self.flush()
+        except Exception: pass
+
+    def _run(self):
+        next_tick = time.monotonic() + self.period
+        while self._running:
+            self._wake.wait(max(0.0, next_tick - time.monotonic()))
+            self._wake.clear()
+            now = time.monotonic()
+            tick = now >= next_tick
+            if tick:
+                next_tick += self.period
+                if next_tick < now:
+                    next_tick = now + self.period
+            try:
+                self.flush(include_latest=tick)
+            except Exception:
+                pass
+
+    def get_stats(self):
+        return {
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped_logs": self.dropped_logs,
+        }
@@ -0,0 +1,99 @@
+import unittest
+import socket
+import time
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datagram import ReorderBuffer, DatagramReceiver, open_socket, HELD, LATE, AHEAD, DUPLICATE, LOST
+from protocol import FRAME_HEADER
+
+
+def packet(seq):
+    return FRAME_HEADER.pack(seq, 0) + seq.to_bytes(4, 'big')
+
+
+def seqs(items):
+    return [None if item is LOST else FRAME_HEADER.unpack_from(item)[0] for item in items]
+
+
+class TestReorderBuffer(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = ReorderBuffer(step=1, window_ms=20.0, slots=8, max_packet=64)
+
+    def push(self, seq, now=0.0):
+        return self.buffer.push(seq, packet(seq), now)
+
+    def test_in_order_packets_pass_straight_through(self):
+        for seq in range(3):
+            self.assertEqual(self.push(seq), HELD)
+            self.assertEqual(seqs(self.buffer.pop(0.0)), [seq])
+
+    def test_reordered_packet_fills_its_gap(self):
+        self.push(0)
+        self.push(2, now=0.001)
+        self.assertEqual(seqs(self.buffer.pop(0.005)), [0])
+        # Still waiting for 1
+        self.assertEqual(self.buffer.deadline(), 0.021)
+        self.push(1, now=0.010)
+        self.assertEqual(seqs(self.buffer.pop(0.010)), [1, 2])
+        self.assertEqual((self.buffer.reordered, self.buffer.lost), (1, 0))
+
+    def test_gap_is_given_up_after_the_window(self):
+        self.push(0)
+        list(self.buffer.pop(0.0))
+        self.push(2, now=0.0)
+        self.push(3, now=0.01)
+        self.assertEqual(seqs(self.buffer.pop(0.019)), [])
+        self.assertEqual(seqs(self.buffer.pop(0.020)), [None, 2, 3])
+        # Too late now; the caller passes it on to be counted
+        self.assertEqual(self.push(1, now=0.03), LATE)
+        self.assertEqual(self.buffer.lost, 1)
+
+    def test_duplicates_and_far_jumps(self):
+        self.push(0)
+        self.push(2)
+        self.assertEqual(self.push(2), DUPLICATE)
+        self.assertEqual(self.push(100), AHEAD)
+        # A flush gives up on everything missing and re-bases on the next packet
+        self.assertEqual(seqs(self.buffer.pop(0.0, flush=True)), [0, None, 2])
+        self.assertEqual(self.push(100), HELD)
+        self.assertEqual(seqs(self.buffer.pop(0.0)), [100])
+
+    def test_batched_sequence_numbers(self):
+        buffer = ReorderBuffer(step=2, window_ms=0.0, slots=8, max_packet=64)
+        for seq in (0, 4, 2):
+            buffer.push(seq, packet(seq), 0.0)
+        self.assertEqual(seqs(buffer.pop(0.0)), [0, 2, 4])
+
+
+class TestDatagramReceiver(unittest.TestCase):
+
+    def test_receives_in_order_from_the_phone_only(self):
+        udp = open_socket("127.0.0.1")
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            receiver = DatagramReceiver(udp, "127.0.0.1", window_ms=50.0)
+            target = udp.getsockname()
+            for seq in (0, 2, 1, 3):
+                sender.sendto(packet(seq), target)
+            sender.sendto(b'short', target)
+            played, concealed = [], []
+            deadline = time.monotonic() + 2.0
+            while len(played) < 4 and time.monotonic() < deadline:
+                receiver.receive(lambda data: played.append(FRAME_HEADER.unpack_from(data)[0]),
+                                 lambda: concealed.append(1))
+                time.sleep(0.005)
+            self.assertEqual(played, [0, 1, 2, 3])
+            self.assertEqual(concealed, [])
+            self.assertEqual(receiver.rejected, 1)
+        finally:
+            sender.close()
+            udp.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import ctypes
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from denoiser import RNNoise
+
+
+class FakeRNNoiseLib:
+    """Stands in for rnnoise.dll: 'denoising' halves every sample; VAD is `self.vad`."""
+
+    def __init__(self):
+        self.calls = 0
+        self.destroyed = 0
+        self.vad = 0.9
+
+        def create(model):
+            return 1
+
+        def process_frame(state, out_addr, in_addr):
+            self.calls += 1
+            src = np.ctypeslib.as_array((ctypes.c_float * RNNoise.FRAME_SIZE).from_address(in_addr))
+            dst = np.ctypeslib.as_array((ctypes.c_float * RNNoise.FRAME_SIZE).from_address(out_addr))
+            dst[:] = src * 0.5
+            return self.vad
+
+        def destroy(state):
+            self.destroyed += 1
+
+        self.rnnoise_create = create
+        self.rnnoise_process_frame = process_frame
+        self.rnnoise_destroy = destroy
+
+
+class TestRNNoise(unittest.TestCase):
+
+    def setUp(self):
+        self.lib = FakeRNNoiseLib()
+        self.rn = RNNoise(self.lib)
+
+    def test_process_many_writes_into_caller_buffer(self):
+        samples = np.full(3 * 480, 1000, dtype=np.int16)
+        out = np.zeros(3 * 480, dtype=np.int16)
+        self.rn.process_many(samples, out)
+        self.assertTrue((out == 500).all())
+        self.assertEqual(self.lib.calls, 3)
+
+    def test_process_many_rejects_partial_frames(self):
+        samples = np.full(480 + 100, 1000, dtype=np.int16)
+        with self.assertRaises(ValueError):
+            self.rn.process_many(samples, np.zeros(1000, dtype=np.int16))
+        with self.assertRaises(ValueError):
+            self.rn.process_many(samples[:960], np.zeros(480, dtype=np.int16))
+        # Nothing reached RNNoise
+        self.assertEqual(self.lib.calls, 0)
+
+    def test_process_into_carries_partial_frames(self):
+        out = np.zeros(1000, dtype=np.int16)
+        self.assertEqual(self.rn.process_into(np.full(300, 200, dtype=np.int16), out), 0)
+        self.assertEqual(self.rn.process_into(np.full(300, 200, dtype=np.int16), out), 480)
+        self.assertTrue((out[:480] == 100).all())
+        # 120 samples are still waiting for the next chunk
+        self.assertEqual(self.rn.process_into(np.full(360, 200, dtype=np.int16), out), 480)
+
+    def test_process_float_in_place(self):
+        samples = np.full(2 * 480, 1000, dtype=np.float32)
+        self.rn.process_float(samples, samples)
+        self.assertTrue((samples == 500).all())
+        self.assertEqual(self.lib.calls, 2)
+
+    def test_process_float_reports_vad(self):
+        probabilities = iter([0.2, 0.7, 0.4])
+
+        def process_frame(state, out_addr, in_addr):
+            return next(probabilities)
+        self.rn._process_frame = process_frame
+        samples = np.zeros(3 * 480, dtype=np.float32)
+        vad = np.zeros(3, dtype=np.float32)
+        self.assertAlmostEqual(self.rn.process_float(samples, samples, vad), 0.7)
+        np.testing.assert_allclose(vad, [0.2, 0.7, 0.4])
+        self.assertAlmostEqual(self.rn.vad, 0.4)
+
+    def test_process_bytes_wrapper(self):
+        data = np.full(480, -400, dtype=np.int16).tobytes()
+        result = np.frombuffer(self.rn.process(data), dtype=np.int16)
+        self.assertTrue((result == -200).all())
+
+    def test_output_is_clipped_not_wrapped(self):
+        self.rn._process_frame = lambda state, out_addr, in_addr: self.rn._out.fill(40000.0)
+        out = np.zeros(480, dtype=np.int16)
+        self.rn.process_many(np.zeros(480, dtype=np.int16), out)
+        self.assertTrue((out == 32767).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+import threading
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from devices import DeviceRegistry
+
+
+class FakePortAudio:
+    """
+    Stands in for pyaudio: a shared list of (host API, device info) that tests
+    edit to simulate hotplugging. Like PortAudio, each instance snapshots the
+    list when created (a re-scan needs a new instance).
+    """
+
+    def __init__(self, apis, devices, unsupported=()):
+        self.apis = apis
+        self.devices = devices
+        self.unsupported = set(unsupported)  # (name, rate) pairs that fail validation
+        self.instances = 0
+        self.enumerations = 0
+
+    def __call__(self):
+        self.instances += 1
+        return _FakeInstance(self, list(self.devices))
+
+
+class _FakeInstance:
+
+    def __init__(self, fake, devices):
+        self.fake = fake
+        self.devices = devices
+        self.terminated = False
+
+    def get_host_api_count(self):
+        return len(self.fake.apis)
+
+    def get_host_api_info_by_index(self, i):
+        return {"name": self.fake.apis[i]}
+
+    def get_device_count(self):
+        self.fake.enumerations += 1
+        return len(self.devices)
+
+    def get_device_info_by_index(self, i):
+        return self.devices[i]
+
+    def get_default_output_device_info(self):
+        return self.devices[0]
+
+    def is_format_supported(self, rate, output_device=None, output_channels=None, output_format=None):
+        if (self.devices[output_device]["name"], rate) in self.fake.unsupported:
+            raise ValueError("Invalid sample rate")
+        return True
+
+    def terminate(self):
+        self.terminated = True
+
+
+def device(name, host_api, rate=48000, outputs=2):
+    return {"name": name, "hostApi": host_api, "maxOutputChannels": outputs, "defaultSampleRate": float(rate),
+            "defaultLowOutputLatency": 0.01, "defaultHighOutputLatency": 0.04}
+
+
+class TestDeviceRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.pa = FakePortAudio(
+            ["MME", "Windows WASAPI"],
+            [device("Speakers", 0, 44100), device("Mic", 0, outputs=0),
+             device("Speakers", 1, 48000), device("Headphones", 0)])
+        self.changes = []
+        self.registry = DeviceRegistry(self.pa, on_change=self.changes.append)
+        self.registry.refresh(reinit=False)
+
+    def test_prefers_wasapi_and_keeps_metadata(self):
+        entries = {entry["id"]: entry for entry in self.registry.list()}
+        self.assertEqual(set(entries), {"Windows WASAPI:Speakers", "MME:Headphones"})
+        speakers = entries["Windows WASAPI:Speakers"]
+        self.assertEqual(speakers["index"], 2)
+        self.assertEqual(speakers["default_sample_rate"], 48000)
+        self.assertEqual(speakers["rate"], 48000)
+        self.assertEqual(speakers["low_latency_ms"], 10.0)
+        # The default device is looked up by name, so its WASAPI entry is the default
+        self.assertEqual(self.registry.default_id, "Windows WASAPI:Speakers")
+        self.assertIs(self.registry.get("Speakers"), speakers)
+        self.assertIs(self.registry.get("Windows WASAPI:Speakers"), speakers)
+        self.assertIsNone(self.registry.get("Missing"))
+
+    def test_validated_rate_falls_back(self):
+        self.pa.unsupported.update({("Headphones", 48000)})
+        self.pa.devices[3] = device("Headphones", 0, 48000)
+        self.registry.refresh()
+        self.assertEqual(self.registry.get("Headphones")["rate"], 44100)
+        self.pa.unsupported.update({("Headphones", 44100)})
+        self.registry.refresh()
+        self.assertIsNone(self.registry.get("Headphones")["rate"])
+
+    def test_hotplug_diff(self):
+        self.changes.clear()
+        first_pa = self.registry.pa
+        self.pa.devices.pop(3)
+        self.pa.devices.insert(0, device("USB Headset", 1, 16000))
+        diff = self.registry.refresh()
+
+        self.assertTrue(first_pa.terminated)
+        self.assertEqual([e["id"] for e in diff["added"]], ["Windows WASAPI:USB Headset"])
+        self.assertEqual([e["id"] for e in diff["removed"]], ["MME:Headphones"])
+        # Speakers moved to a new index and the default moved: only the latter is a change
+        self.assertEqual([e["id"] for e in diff["changed"]], ["Windows WASAPI:Speakers"])
+        self.assertEqual(self.changes, [diff])
+        # Nothing new: no diff, no callback
+        self.assertIsNone(self.registry.refresh())
+        self.assertEqual(len(self.changes), 1)
+
+    def test_no_rescan_while_busy(self):
+        busy = True
+        self.registry.busy = lambda: busy
+        instances = self.pa.instances
+        self.pa.devices.append(device("HDMI", 1))
+        self.assertIsNone(self.registry.refresh())
+        self.assertEqual(self.pa.instances, instances)
+        self.assertIsNone(self.registry.get("HDMI"))
+        busy = False
+        self.registry.refresh()
+        self.assertIsNotNone(self.registry.get("HDMI"))
+
+    def test_lookups_never_enumerate(self):
+        enumerations = self.pa.enumerations
+        for _ in range(100):
+            self.registry.list()
+            self.registry.get("Speakers")
+        self.assertEqual(self.pa.enumerations, enumerations)
+
+    def test_background_refresh_reports_changes(self):
+        changed = threading.Event()
+        self.registry.on_change = lambda diff: changed.set()
+        self.registry.interval = 60.0
+        self.registry.start()
+        try:
+            self.pa.devices.append(device("HDMI", 1))
+            self.registry.request_refresh()
+            self.assertTrue(changed.wait(2.0))
+            self.assertIsNotNone(self.registry.get("HDMI"))
+        finally:
+            self.registry.close()
+        self.assertTrue(self.registry.pa.terminated)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drift import DriftEstimator
+
+
+class TestDriftEstimator(unittest.TestCase):
+
+    def test_full_buffer_speeds_up_consumption(self):
+        est = DriftEstimator()
+        for i in range(100):
+            ppm = est.update(50.0, 40.0, now=i * 0.1)
+        self.assertGreater(ppm, 0)
+
+    def test_converges_to_clock_drift(self):
+        """Closed loop: a phone clock 250ppm fast must be measured as ~250ppm."""
+        est = DriftEstimator()
+        depth, target, dt = 40.0, 40.0, 0.01
+        for i in range(int(900 / dt)):
+            correction = est.update(depth, target, now=i * dt)
+            # 1ppm of mismatch moves the buffer by 1us per second
+            depth += (250.0 - correction) * 1e-3 * dt
+        self.assertAlmostEqual(est.drift_ppm, 250.0, delta=5.0)
+        self.assertAlmostEqual(depth, target, delta=0.5)
+
+    def test_pause_is_not_integrated(self):
+        est = DriftEstimator()
+        for i in range(1000):
+            est.update(40.0, 40.0, now=i * 0.01)
+        # Two minutes without observations, then the re-primed buffer overshoots by 6ms
+        est.update(46.0, 40.0, now=130.0)
+        for i in range(1, 100):
+            est.update(40.0, 40.0, now=130.0 + i * 0.01)
+        self.assertLess(abs(est.drift_ppm), 1.0)
+        self.assertLess(abs(est.correction_ppm), 10.0)
+
+    def test_target_step_is_not_drift(self):
+        """The adaptive jitter buffer raising its target must not be integrated as drift."""
+        est = DriftEstimator()
+        depth, target, dt = 40.0, 40.0, 0.01
+        worst = 0.0
+        for i in range(int(180 / dt)):
+            if i == int(10 / dt):
+                target = 60.0
+            correction = est.update(depth, target, now=i * dt)
+            depth += (0.0 - correction) * 1e-3 * dt
+            worst = max(worst, abs(est.drift_ppm))
+        self.assertLess(worst, 10.0)
+        self.assertAlmostEqual(depth, target, delta=0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
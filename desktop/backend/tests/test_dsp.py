@@ -0,0 +1,236 @@
+import unittest
+from unittest import mock
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from denoiser import RNNoise
+from dsp import DspChain, HighPass
+from tests.test_denoiser import FakeRNNoiseLib
+
+
+def tone(freq, amplitude, samples=480, rate=48000, start=0):
+    t = (np.arange(samples) + start) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+class TestDspChain(unittest.TestCase):
+
+    def test_default_chain_is_transparent(self):
+        chain = DspChain()
+        frame = tone(440, 10000)
+        np.testing.assert_array_equal(chain.process(frame), frame)
+
+    def test_output_buffer_is_reused(self):
+        chain = DspChain()
+        first = chain.process(tone(440, 1000))
+        second = chain.process(tone(440, 2000))
+        self.assertTrue(np.shares_memory(first, second))
+
+    def test_gain_ramps_without_steps(self):
+        chain = DspChain()
+        chain.configure("gain", gain=2.0, ramp_ms=10)
+        out = chain.process(np.full(960, 1000, dtype=np.int16))
+        # Linear over the first 480 samples, then held
+        self.assertTrue((np.diff(out[:480].astype(int)) >= 0).all())
+        self.assertLess(np.abs(np.diff(out[:480].astype(int))).max(), 5)
+        self.assertTrue((out[480:] == 2000).all())
+
+    def test_limiter_is_soft_and_bounded(self):
+        chain = DspChain()
+        chain.configure("gain", gain=1.5)
+        chain.reset()  # Skip the ramp
+        frame = tone(440, 25000)
+        out = chain.process(frame).astype(int)
+        # Below the knee the signal is untouched
+        quiet = np.abs(frame.astype(int) * 1.5) < 0.9 * 32767
+        np.testing.assert_allclose(out[quiet], frame[quiet].astype(int) * 1.5, atol=1)
+        # Peaks are bent below full scale, not flattened into a hard clip
+        self.assertLess(out.max(), 32767)
+        self.assertGreater(out.max(), 0.9 * 32767)
+
+    def test_limiter_never_exceeds_full_scale(self):
+        chain = DspChain()
+        chain.configure("gain", gain=8.0)
+        chain.reset()
+        out = chain.process(tone(440, 20000)).astype(int)
+        self.assertLessEqual(out.max(), 32767)
+        self.assertGreaterEqual(out.min(), -32767)
+
+    def test_hard_clip_without_limiter(self):
+        chain = DspChain()
+        chain.set_order(["gain"])
+        chain.configure("gain", gain=4.0)
+        chain.reset()
+        out = chain.process(tone(440, 20000))
+        self.assertEqual(out.max(), 32767)
+
+    def test_highpass_matches_recursion(self):
+        chain = DspChain(sample_rate=16000)
+        chain.configure("highpass", enabled=True, cutoff_hz=400)
+        hp = chain.stages["highpass"]
+        frames = [tone(50, 3000, 160, 16000, i * 160) + 2000 for i in range(20)]
+        got = np.concatenate([chain.process(f).copy() for f in frames]).astype(float)
+
+        a = np.exp(-2 * np.pi * 400 / 16000)
+        x = np.concatenate(frames).astype(float)
+        expected = np.zeros_like(x)
+        y_prev = x_prev = 0.0
+        for i, sample in enumerate(x):
+            y_prev = a * (y_prev + sample - x_prev)
+            x_prev = sample
+            expected[i] = y_prev
+        np.testing.assert_allclose(got, np.rint(expected), atol=1)
+        self.assertLess(hp.block, 160)  # Several closed-form blocks per frame
+
+    def test_highpass_removes_dc(self):
+        chain = DspChain()
+        chain.configure("highpass", enabled=True)
+        for _ in range(50):
+            out = chain.process(np.full(480, 5000, dtype=np.int16))
+        self.assertLess(np.abs(out).max(), 5)
+
+    def test_agc_raises_quiet_speech_and_holds_in_silence(self):
+        chain = DspChain()
+        chain.configure("agc", enabled=True, release_ms=100)
+        agc = chain.stages["agc"]
+        for i in range(100):
+            chain.process(tone(300, 300, start=i * 480))
+        gain = agc.gain_db
+        self.assertGreater(gain, 10)
+        for _ in range(50):
+            chain.process(np.zeros(480, dtype=np.int16))
+        self.assertEqual(agc.gain_db, gain)
+
+    def test_denoise_carries_partial_frames(self):
+        chain = DspChain()
+        chain.stages["denoise"].rnnoise = RNNoise(FakeRNNoiseLib())
+        chain.configure("denoise", enabled=True)
+        self.assertEqual(chain.required_rate, 48000)
+        self.assertEqual(len(chain.process(np.full(300, 1000, dtype=np.int16))), 0)
+        out = chain.process(np.full(300, 1000, dtype=np.int16))
+        self.assertEqual(len(out), 480)
+        self.assertTrue((out == 500).all())
+
+    def test_reorder_and_validation(self):
+        chain = DspChain()
+        chain.set_order(["limiter", "gain"])
+        self.assertEqual([s.name for s in chain.active], ["limiter", "gain"])
+        with self.assertRaises(ValueError):
+            chain.set_order(["gain", "reverb"])
+        with self.assertRaises(ValueError):
+            chain.set_order(["gain", "gain"])
+        with self.assertRaises(ValueError):
+            chain.configure("gain", volume=2)
+        # Failed updates leave the chain as it was
+        self.assertEqual(chain.order, ["limiter", "gain"])
+
+    def test_settings_round_trip(self):
+        chain = DspChain()
+        chain.apply({"order": ["highpass", "gain"], "stages": {"highpass": {"enabled": True, "cutoff_hz": 100}}})
+        copy = DspChain()
+        copy.apply(chain.describe())
+        self.assertEqual(copy.describe(), chain.describe())
+
+    def test_oversized_frame_grows_buffers(self):
+        chain = DspChain(capacity=480)
+        frame = tone(440, 1000, samples=2000)
+        np.testing.assert_array_equal(chain.process(frame), frame)
+
+
+class TestDenoiserState(unittest.TestCase):
+
+    def setUp(self):
+        self.lib = FakeRNNoiseLib()
+        self.chain = DspChain()
+        self.chain.stages["denoise"].rnnoise = RNNoise(self.lib)
+        self.chain.configure("denoise", enabled=True)
+
+    def test_disabling_frees_native_state(self):
+        self.chain.configure("denoise", enabled=False)
+        self.assertEqual(self.lib.destroyed, 1)
+        self.assertIsNone(self.chain.stages["denoise"].rnnoise)
+        frame = np.full(480, 1000, dtype=np.int16)
+        np.testing.assert_array_equal(self.chain.process(frame), frame)
+
+    def test_close_frees_native_state_once(self):
+        self.chain.close()
+        self.chain.close()
+        self.assertEqual(self.lib.destroyed, 1)
+        self.assertIsNone(self.chain.required_rate)
+
+    def test_settings_only_chain_allocates_nothing(self):
+        template = DspChain(native=False)
+        with mock.patch.object(RNNoise, "load_library", return_value=self.lib) as load:
+            template.configure("denoise", enabled=True)
+        load.assert_called_once()
+        self.assertTrue(template.describe()["stages"]["denoise"]["enabled"])
+        self.assertIsNone(template.stages["denoise"].rnnoise)
+
+
+class TestGate(unittest.TestCase):
+
+    def setUp(self):
+        self.lib = FakeRNNoiseLib()
+        self.chain = DspChain()
+        self.chain.stages["denoise"].rnnoise = RNNoise(self.lib)
+        self.chain.configure("denoise", enabled=True)
+        self.chain.configure("gate", enabled=True, threshold=0.5, hold_ms=20, release_ms=10)
+        self.chain.configure("gain", gain=2.0, ramp_ms=0)
+        self.chain.reset()
+        self.frame = np.full(480, 1000, dtype=np.int16)
+
+    def test_holds_then_releases_then_closes(self):
+        chain = self.chain
+        self.assertTrue((chain.process(self.frame) == 1000).all())  # Denoised (x0.5), gain 2
+        self.lib.vad = 0.1
+        # Held open for 20ms
+        for _ in range(2):
+            self.assertTrue((chain.process(self.frame) == 1000).all())
+        # Faded out over the 10ms release, still through the whole chain
+        out = chain.process(self.frame)
+        self.assertFalse(chain.gated)
+        self.assertTrue((np.diff(out.astype(int)) <= 0).all())
+        self.assertEqual(out[-1], 0)
+        # Closed: silence, and gain / metering are skipped
+        out = chain.process(self.frame)
+        self.assertTrue(chain.gated)
+        self.assertEqual(len(out), 480)
+        self.assertFalse(out.any())
+        self.assertTrue(np.shares_memory(out, chain.silence))
+
+    def test_voice_reopens_with_fade_in(self):
+        chain = self.chain
+        self.lib.vad = 0.1
+        for _ in range(5):
+            chain.process(self.frame)
+        self.assertTrue(chain.gated)
+        self.lib.vad = 0.8
+        out = chain.process(self.frame)
+        self.assertFalse(chain.gated)
+        self.assertAlmostEqual(chain.vad, 0.8, places=5)
+        self.assertTrue((np.diff(out.astype(int)) >= 0).all())
+        self.assertEqual(out[-1], 1000)
+
+    def test_stays_open_without_denoiser(self):
+        self.chain.configure("denoise", enabled=False)
+        self.lib.vad = 0.0
+        for _ in range(10):
+            self.assertTrue((self.chain.process(self.frame) == 2000).all())
+        self.assertIsNone(self.chain.vad)
+        self.assertFalse(self.chain.gated)
+
+
+class TestHighPassBlocks(unittest.TestCase):
+
+    def test_block_bounds_growth(self):
+        hp = HighPass()
+        hp.configure(cutoff_hz=2000)
+        self.assertLessEqual(hp._pow_neg.max(), HighPass.MAX_GROWTH)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import numpy as np
+import sys
+import os
+from multiprocessing import shared_memory
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dsp import DspChain
+from dsp_worker import DspWorker, SharedFrameRing, WorkerError
+
+
+def noise_frames(count, size=480):
+    rng = np.random.default_rng(1)
+    return [(rng.standard_normal(size) * 4000).astype(np.int16) for _ in range(count)]
+
+
+class TestSharedFrameRing(unittest.TestCase):
+
+    def test_slots_are_shared_and_reused_round_robin(self):
+        ring = SharedFrameRing(2, 16)
+        peer = SharedFrameRing(2, 16, name=ring.name)
+        try:
+            self.assertEqual([ring.next_slot() for _ in range(3)], [0, 1, 0])
+            ring.frames[1, :4] = [1, 2, 3, 4]
+            self.assertEqual(peer.frames[1, :4].tolist(), [1, 2, 3, 4])
+        finally:
+            peer.close()
+            ring.close()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=ring.name)
+
+
+class TestDspWorker(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.worker = DspWorker(capacity=4096)
+        cls.worker.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.worker.close()
+
+    def setUp(self):
+        self.worker.reset()
+
+    def test_matches_in_process_chain(self):
+        chain, local = DspChain(capacity=4096), DspChain(capacity=4096)
+        for c in (chain, local):
+            c.configure("highpass", enabled=True)
+            c.configure("gain", gain=2.5)
+            c.reset()
+        self.worker.sync(chain)
+        self.worker.reset()
+        for frame in noise_frames(50):
+            remote = self.worker.process(frame, chain)
+            np.testing.assert_array_equal(remote, local.process(frame))
+        self.assertGreater(self.worker.last_work_ns, 0)
+        # No denoiser, so no VAD and the gate never closes
+        self.assertIsNone(self.worker.vad)
+        self.assertFalse(self.worker.gated)
+
+    def test_settings_changes_are_resynced(self):
+        chain = DspChain(capacity=4096)
+        chain.configure("gain", gain=1.0, ramp_ms=0.0)
+        frame = np.full(480, 1000, dtype=np.int16)
+        self.assertTrue((self.worker.process(frame, chain) == 1000).all())
+        chain.configure("gain", gain=0.5)
+        self.worker.process(frame, chain)
+        self.assertTrue((self.worker.process(frame, chain) == 500).all())
+
+    def test_oversized_frame_is_rejected(self):
+        with self.assertRaises(WorkerError):
+            self.worker.process(np.zeros(5000, dtype=np.int16), DspChain(capacity=4096))
+
+    def test_dead_worker_raises(self):
+        worker = DspWorker(capacity=1024)
+        worker.start()
+        try:
+            worker.process_handle.kill()
+            worker.process_handle.join()
+            with self.assertRaises(WorkerError):
+                worker.process(np.zeros(480, dtype=np.int16), DspChain(capacity=1024))
+        finally:
+            worker.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import numpy as np
+import sys
+import os
+import tempfile
+import time
+import wave
+
+# Add parent directory (and the benchmark harness) to path
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.join(BACKEND_DIR, 'benchmarks'))
+
+from backend import BackendServer
+from bench_e2e import run_session, run_sessions, run_reconnects, latency_ms, reconnect_ms
+from fake_phone import FakePhone
+
+
+class TestEndToEnd(unittest.TestCase):
+    """Runs the real stream loop against a fake phone and a null sink."""
+
+    def test_audio_reaches_the_sink(self):
+        phone = FakePhone(jitter_ms=2.0, marker_every_s=0.2)
+        backend, snapshot, _ = run_session(phone, 1.5)
+        self.assertEqual(backend.errors, [])
+        self.assertGreater(snapshot["frames_processed"], 100)
+        latencies = latency_ms(phone, backend.sink)
+        self.assertGreater(len(latencies), 3)
+        self.assertLess(latencies.max(), 200)
+
+    def test_odd_write_sizes_keep_framing(self):
+        phone = FakePhone(sample_rate=16000, write_size=333)
+        backend, snapshot, _ = run_session(phone, 1.0, mode="blocking")
+        self.assertEqual(backend.errors, [])
+        self.assertEqual(snapshot["frames_dropped"], 0)
+        self.assertGreater(snapshot["frames_processed"], 20)
+
+    def test_phones_share_one_output(self):
+        phones = [FakePhone(seed=i) for i in range(3)]
+        backend, stats, _ = run_sessions(phones, 1.0)
+        self.assertEqual(backend.errors, [])
+        self.assertEqual(len(stats["outputs"]), 1)
+        self.assertEqual(stats["outputs"][0]["sources"], 3)
+        for session in stats["sessions"].values():
+            self.assertGreater(session["frames_processed"], 50)
+        # Every stream released the output, so it was closed
+        self.assertEqual(backend.outputs, {})
+
+    def test_protocol_v2_reports_loss_and_latency(self):
+        phone = FakePhone(jitter_ms=2.0, marker_every_s=0.2, protocol=2, clock_offset_s=1000.0, lose_every=25)
+        backend, snapshot, _ = run_session(phone, 1.5)
+        self.assertEqual(backend.errors, [])
+        link = snapshot["link"]
+        self.assertEqual(link["version"], 2)
+        # Frames lost before the first one received are not known to be lost
+        self.assertGreater(link["frames_lost"], 0)
+        self.assertLessEqual(link["frames_lost"], phone.frames_lost)
+        # The backend's own capture-to-playout estimate agrees with what the sink heard
+        heard = float(np.median(latency_ms(phone, backend.sink)))
+        self.assertLess(abs(link["playout_latency_ms"]["p50"] - heard), 15)
+
+    def test_udp_loss_is_concealed(self):
+        phone = FakePhone(jitter_ms=2.0, marker_every_s=0, protocol=2, transport="udp", udp_loss=0.05,
+                          udp_reorder=0.05)
+        backend, snapshot, _ = run_session(phone, 1.5, options={"host": "127.0.0.1", "transport": "udp"})
+        self.assertEqual(backend.errors, [])
+        link = snapshot["link"]
+        self.assertEqual(link["transport"], "udp")
+        self.assertGreater(phone.datagrams_dropped, 0)
+        # Every lost datagram was played as concealment (the last may still be
+        # on its way when the snapshot is taken), reordered ones were put back
+        lost = link["datagrams"]["lost"]
+        self.assertAlmostEqual(snapshot["frames_concealed"], lost, delta=1)
+        self.assertLessEqual(lost, phone.datagrams_dropped)
+        self.assertGreater(link["datagrams"]["reordered"], 0)
+        # A lost packet no longer means an underrun and a re-prime
+        self.assertLess(snapshot["buffer"]["underruns"], lost // 2)
+
+    def test_persistent_session_survives_phone_drops(self):
+        phone = FakePhone(marker_every_s=0)
+        backend, snapshot = run_reconnects(phone, drops=3, down_s=0.2, up_s=0.4)
+        self.assertEqual(backend.errors, [])
+        self.assertEqual(phone.connections, 4)
+        self.assertEqual(snapshot["reconnect"]["reconnects"], 3)
+        # One output stream for the whole session
+        self.assertEqual(backend.streams_opened, 1)
+        times = reconnect_ms(phone, backend.sink)
+        self.assertEqual(len(times), 3)
+        self.assertLess(times.max(), 300)
+
+    def test_file_sink_and_recording_share_the_audio(self):
+        # The stock backend, no PortAudio: a file sink as the output device plus a WAV tap
+        phone = FakePhone(marker_every_s=0.2)
+        phone.start()
+        backend = BackendServer(ui_port=0, watchdog=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            raw = os.path.join(tmp, "out.raw")
+            wav = os.path.join(tmp, "take.wav")
+            try:
+                backend.process_command({"command": "start", "port": phone.port, "host": "127.0.0.1",
+                                         "device_id": "file:" + raw, "record": wav})
+                session = backend.sessions["default"]
+                time.sleep(1.0)
+                stats = backend.get_stats()
+                backend.process_command({"command": "record", "stop": True})
+                time.sleep(0.2)
+                backend.process_command({"command": "stop"})
+                session.thread.join(timeout=15.0)
+            finally:
+                phone.stop()
+                backend.cleanup()
+
+            self.assertEqual(stats["outputs"][0]["sink"]["sink"], "file:" + raw)
+            self.assertEqual(stats["sessions"]["default"]["recordings"][0]["dropped_blocks"], 0)
+            with wave.open(wav, 'rb') as w:
+                rate = w.getframerate()
+                recorded = w.readframes(w.getnframes())
+            with open(raw, 'rb') as f:
+                played = f.read()
+        self.assertEqual(rate, phone.sample_rate)
+        self.assertGreater(len(recorded), rate)  # Over half a second of int16
+        # Exactly the blocks the output played, from after the tap started until it stopped
+        self.assertLess(len(recorded), len(played))
+        self.assertIn(recorded, played)
+        self.assertGreater(np.abs(np.frombuffer(recorded, dtype='<i2')).max(), 4000)
+
+
+if __name__ == '__main__':
+    unittest.main()
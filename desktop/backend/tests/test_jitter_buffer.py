@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jitter_buffer import JitterBuffer
+from ring_buffer import SampleRing
+
+FRAME = np.ones(480, dtype=np.int16).tobytes()  # 10ms at 48kHz
+
+
+class TestJitterBuffer(unittest.TestCase):
+
+    def test_primes_before_playing(self):
+        """Nothing is played until the target depth has been reached."""
+        jbuf = JitterBuffer(48000, target_ms=30, adaptive=False)
+        out = np.zeros(480, dtype=np.int16)
+        jbuf.push(FRAME, now=0.00)
+        jbuf.push(FRAME, now=0.01)
+        self.assertFalse(jbuf.read_into(out))
+        self.assertFalse(out.any())
+        jbuf.push(FRAME, now=0.02)
+        self.assertTrue(jbuf.read_into(out))
+        self.assertTrue((out == 1).all())
+
+    def test_underrun_is_counted(self):
+        jbuf = JitterBuffer(48000, target_ms=20, adaptive=False)
+        out = np.zeros(480, dtype=np.int16)
+        jbuf.push(FRAME, now=0.00)
+        jbuf.push(FRAME, now=0.01)
+        jbuf.read_into(out)
+        jbuf.read_into(out)
+        self.assertFalse(jbuf.read_into(out))
+        self.assertEqual(jbuf.underruns, 1)
+
+    def test_overrun_drops_back_to_target(self):
+        """A burst far beyond the target is trimmed so latency stays bounded."""
+        jbuf = JitterBuffer(48000, target_ms=20, adaptive=False)
+        for i in range(10):
+            jbuf.push(FRAME, now=0.0)
+        self.assertGreater(jbuf.overruns, 0)
+        self.assertLessEqual(jbuf.depth_ms, 20 * 2 + 10)
+
+    def test_target_grows_with_jitter(self):
+        jbuf = JitterBuffer(48000, target_ms=20, max_ms=200)
+        out = np.zeros(480, dtype=np.int16)
+        now = 0.0
+        for i in range(200):
+            # Frames arrive in pairs: 0ms then 20ms gaps
+            now += 0.0 if i % 2 else 0.02
+            jbuf.push(FRAME, now=now)
+            jbuf.read_into(out)
+        self.assertGreater(jbuf.jitter_ms, 5)
+        self.assertGreater(jbuf.target_ms, 20)
+
+    def test_clear_forgets_last_arrival(self):
+        jbuf = JitterBuffer(48000, target_ms=20, adaptive=False)
+        jbuf.push(FRAME, now=0.0)
+        jbuf.clear()
+        self.assertFalse(jbuf.playing)
+        # A reconnect seconds later is not counted as jitter
+        jbuf.push(FRAME, now=5.0)
+        self.assertEqual(jbuf.jitter_ms, 0.0)
+
+
+class TestSampleRing(unittest.TestCase):
+
+    def test_wraparound_preserves_order(self):
+        ring = SampleRing(8)
+        out = np.zeros(6, dtype=np.int16)
+        ring.write(np.arange(6, dtype=np.int16))
+        ring.read_into(out[:4])
+        ring.write(np.arange(6, 12, dtype=np.int16))
+        self.assertEqual(ring.read_into(out), 6)
+        self.assertEqual(list(out), [4, 5, 6, 7, 8, 9])
+
+    def test_overflow_overwrites_oldest(self):
+        ring = SampleRing(4)
+        out = np.zeros(4, dtype=np.int16)
+        self.assertEqual(ring.write(np.arange(6, dtype=np.int16)), 2)
+        ring.read_into(out)
+        self.assertEqual(list(out), [2, 3, 4, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
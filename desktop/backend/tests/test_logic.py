@@ -4,6 +4,7 @@ import json
 import numpy as np
 import sys
 import os
+import time
 
 # Add parent directory to path so we can import backend
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -49,6 +50,128 @@ class TestBackendLogic(unittest.TestCase):
         self.server.process_command(cmd)
         self.assertEqual(self.server.current_gain, 2.5)
 
+    def test_get_stats_command(self):
+        """get_stats answers with a stats message even when instrumentation is off."""
+        with patch.object(self.server, 'send_to_flutter') as mock_send:
+            self.server.process_command({"command": "get_stats"})
+            message = mock_send.call_args[0][0]
+            self.assertEqual(message["type"], "stats")
+            self.assertIn("sessions", message["payload"])
+
+    def test_sessions_start_independently(self):
+        """Each session id gets its own stream thread; repeating an id is a no-op."""
+        with patch('threading.Thread') as mock_thread:
+            self.server.process_command({"command": "start", "session": "a", "port": 6001})
+            self.server.process_command({"command": "start", "session": "b", "port": 6002, "serial": "XYZ"})
+            self.server.process_command({"command": "start", "session": "a", "port": 6001})
+            self.assertEqual(mock_thread.call_count, 2)
+            self.assertEqual(self.server.sessions["b"].serial, "XYZ")
+
+            self.server.process_command({"command": "stop", "session": "a"})
+            self.assertNotIn("a", self.server.sessions)
+            self.assertTrue(self.server.is_streaming)
+
+    def test_session_gain(self):
+        """Gain with a session id only touches that session."""
+        with patch('threading.Thread'):
+            self.server.process_command({"command": "start", "session": "a"})
+            self.server.process_command({"command": "start", "session": "b"})
+        self.server.process_command({"command": "set_gain", "value": 3.0, "session": "a"})
+        self.assertEqual(self.server.sessions["a"].gain, 3.0)
+        self.assertEqual(self.server.sessions["b"].gain, 1.0)
+        self.assertEqual(self.server.current_gain, 1.0)
+
+    def test_get_devices_answers_from_cache(self):
+        """get_devices reads the registry's cache instead of walking PortAudio."""
+        entry = {"id": "Windows WASAPI:Speakers", "name": "Speakers", "index": 3, "rate": 48000}
+        self.server.devices.devices = {entry["id"]: entry}
+        self.server.devices.default_id = entry["id"]
+        self.server.devices.scans = 1
+        with patch.object(self.server, 'send_to_flutter') as mock_send:
+            self.server.process_command({"command": "get_devices"})
+            message = mock_send.call_args[0][0]
+        self.assertEqual(message["payload"], ["Speakers"])
+        self.assertEqual(message["devices"], [entry])
+        self.server.devices.pa.get_device_count.assert_not_called()
+        # Stream start resolves by id or name without touching PortAudio either
+        self.assertEqual(self.server.resolve_output_device("Speakers", 16000), (3, 48000))
+        self.assertEqual(self.server.resolve_output_device(entry["id"], 16000), (3, 48000))
+
+    def test_adb_forward_is_cached(self):
+        """Reconnects reuse the adb forward; force re-installs it."""
+        with patch('backend.subprocess.run') as mock_run:
+            self.assertTrue(self.server.setup_adb(6001, serial="XYZ"))
+            self.assertTrue(self.server.setup_adb(6001, serial="XYZ"))
+            self.assertEqual(mock_run.call_count, 2)  # remove + forward, once
+            self.server.setup_adb(6001, serial="XYZ", force=True)
+            self.assertEqual(mock_run.call_count, 4)
+
+    def test_persistent_start_option(self):
+        with patch('threading.Thread'):
+            self.server.process_command({"command": "start", "session": "a", "persistent": True})
+            self.server.process_command({"command": "start", "session": "b"})
+        self.assertTrue(self.server.sessions["a"].persistent)
+        self.assertFalse(self.server.sessions["b"].persistent)
+
+    def test_realtime_option(self):
+        self.server.process_command({"command": "set_realtime", "enabled": True, "cpu": 1})
+        with patch('threading.Thread'):
+            self.server.process_command({"command": "start", "session": "a"})
+            self.server.process_command({"command": "start", "session": "b", "realtime": False})
+        self.assertTrue(self.server.sessions["a"].realtime)
+        self.assertEqual(self.server.sessions["a"].cpu, 1)
+        self.assertFalse(self.server.sessions["b"].realtime)
+        self.assertIn("long_pauses", self.server.get_stats()["gc"])
+
+    def test_playout_priority_follows_the_sessions(self):
+        # The global default is for new sessions; the output goes by the sessions playing on it
+        self.server.realtime = True
+        self.server.output_mode = "blocking"
+        with patch('backend.raise_priority') as raise_priority:
+            mixer = self.server.acquire_output("null", 48000, realtime=False)
+            time.sleep(0.05)
+            self.assertFalse(raise_priority.called)
+            # A realtime session joins the running output
+            self.server.acquire_output("null", 48000, realtime=True)
+            deadline = time.monotonic() + 1.0
+            while not raise_priority.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.server.release_output(mixer, None)
+            self.server.release_output(mixer, None)
+        raise_priority.assert_called_once()
+        self.assertFalse(mixer.playout_thread.is_alive())
+
+    def test_no_device_rescan_while_a_session_runs(self):
+        self.assertFalse(self.server.devices.busy())
+        with patch('threading.Thread'):
+            # Still connecting: no output open yet, but a rescan would hold up its start
+            self.server.process_command({"command": "start", "session": "a"})
+        self.assertTrue(self.server.devices.busy())
+
+    def test_ended_session_frees_its_denoiser(self):
+        from denoiser import RNNoise
+        from tests.test_denoiser import FakeRNNoiseLib
+        with patch('threading.Thread'):
+            self.server.process_command({"command": "start", "session": "a"})
+        session = self.server.sessions["a"]
+        lib = FakeRNNoiseLib()
+        session.dsp.stages["denoise"].rnnoise = RNNoise(lib)
+        self.server._end_session(session)
+        self.assertEqual(lib.destroyed, 1)
+        self.assertNotIn("a", self.server.sessions)
+
+    def test_recordings_wait_for_the_output(self):
+        with patch('threading.Thread'):
+            self.server.process_command({"command": "start", "session": "a", "record": "a.wav"})
+        session = self.server.sessions["a"]
+        self.assertEqual(session.record_paths, ["a.wav"])
+        # Not connected yet: queued, started once the output opens
+        self.server.process_command({"command": "record", "session": "a", "path": "a.pcm"})
+        self.assertEqual(session.record_paths, ["a.wav", "a.pcm"])
+        self.server.process_command({"command": "record", "session": "a", "path": "a.wav", "stop": True})
+        self.assertEqual(session.record_paths, ["a.pcm"])
+        self.assertEqual(self.server.resolve_output_device("null", 16000), ("null", 16000))
+
     def test_visualizer_math(self):
         """Test the RMS calculation logic."""
         # Simulate a quiet sine wave
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from meter import LevelMeter
+
+
+class TestLevelMeter(unittest.TestCase):
+
+    def test_one_reading_per_window(self):
+        meter = LevelMeter(48000, window_ms=30)
+        frame = np.zeros(480, dtype=np.int16)
+        readings = [meter.update(frame) for _ in range(9)]
+        # 1440-sample windows complete on the 3rd, 6th and 9th frame
+        self.assertEqual([r is not None for r in readings], [False, False, True] * 3)
+
+    def test_rms_and_peak(self):
+        meter = LevelMeter(48000, window_ms=10)
+        t = np.arange(480) / 48000
+        sine = (16384 * np.sin(2 * np.pi * 1000 * t)).astype(np.int16)
+        reading = meter.update(sine)
+        self.assertAlmostEqual(reading["rms"], 0.5 / np.sqrt(2), places=3)
+        self.assertAlmostEqual(reading["peak"], 0.5, places=3)
+        self.assertEqual(reading["clipped"], 0)
+
+    def test_sum_of_squares_does_not_overflow(self):
+        meter = LevelMeter(48000, window_ms=1000)
+        reading = meter.update(np.full(48000, -32768, dtype=np.int16))
+        self.assertEqual(reading["rms"], 1.0)
+        self.assertEqual(reading["peak"], 1.0)
+
+    def test_clipped_samples_are_counted(self):
+        meter = LevelMeter(48000, window_ms=10)
+        frame = np.zeros(480, dtype=np.int16)
+        frame[:5] = 32767
+        frame[5:8] = -32768
+        self.assertEqual(meter.update(frame)["clipped"], 8)
+        meter.update(frame)
+        self.assertEqual(meter.clipped_total, 16)
+
+    def test_frames_larger_than_window(self):
+        meter = LevelMeter(48000, window_ms=10)
+        quiet = np.full(480, 100, dtype=np.int16)
+        loud = np.full(480, 1000, dtype=np.int16)
+        # The latest completed window is reported
+        reading = meter.update(np.concatenate([quiet, loud]))
+        self.assertAlmostEqual(reading["peak"], 1000 / 32768, places=4)
+
+    def test_waveform_envelope(self):
+        meter = LevelMeter(48000, window_ms=10, waveform_points=4)
+        frame = np.zeros(480, dtype=np.int16)
+        frame[10] = 16384
+        frame[400] = -32768
+        waveform = meter.update(frame)["waveform"]
+        self.assertEqual(waveform, [0.5, 0.0, 0.0, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
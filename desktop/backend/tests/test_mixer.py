@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jitter_buffer import JitterBuffer
+from mixer import OutputMixer
+
+
+def primed_buffer(value, ms=20):
+    """A jitter buffer already holding `ms` of a constant signal."""
+    jbuf = JitterBuffer(48000, target_ms=ms, adaptive=False)
+    jbuf.push(np.full(48 * ms, value, dtype=np.int16), now=0.0)
+    return jbuf
+
+
+class TestOutputMixer(unittest.TestCase):
+
+    def test_no_sources_is_silence(self):
+        mixer = OutputMixer(48000, 240)
+        out = np.ones(240, dtype=np.int16)
+        mixer.mix_into(out)
+        self.assertFalse(out.any())
+
+    def test_single_source_passes_through(self):
+        mixer = OutputMixer(48000, 240)
+        mixer.add_source(primed_buffer(123))
+        out = np.zeros(240, dtype=np.int16)
+        mixer.mix_into(out)
+        self.assertTrue((out == 123).all())
+
+    def test_sources_are_summed(self):
+        mixer = OutputMixer(48000, 240)
+        for value in (100, 200, -50):
+            mixer.add_source(primed_buffer(value))
+        out = np.zeros(240, dtype=np.int16)
+        mixer.mix_into(out)
+        self.assertTrue((out == 250).all())
+
+    def test_sum_saturates_instead_of_wrapping(self):
+        mixer = OutputMixer(48000, 240)
+        mixer.add_source(primed_buffer(30000))
+        mixer.add_source(primed_buffer(30000))
+        out = np.zeros(240, dtype=np.int16)
+        mixer.mix_into(out)
+        self.assertTrue((out == 32767).all())
+
+    def test_refilling_source_adds_nothing(self):
+        mixer = OutputMixer(48000, 240)
+        mixer.add_source(primed_buffer(100))
+        mixer.add_source(JitterBuffer(48000, target_ms=20, adaptive=False))  # Still priming
+        out = np.zeros(240, dtype=np.int16)
+        mixer.mix_into(out)
+        self.assertTrue((out == 100).all())
+
+    def test_grows_past_preallocated_size(self):
+        mixer = OutputMixer(48000, 240, max_sources=2)
+        for _ in range(5):
+            mixer.add_source(primed_buffer(10))
+        out = np.zeros(480, dtype=np.int16)
+        mixer.mix_into(out)
+        self.assertTrue((out == 50).all())
+
+    def test_remove_source(self):
+        mixer = OutputMixer(48000, 240)
+        keep, gone = primed_buffer(1), primed_buffer(2)
+        mixer.add_source(keep)
+        mixer.add_source(gone)
+        mixer.remove_source(gone)
+        self.assertEqual(mixer.sources, (keep,))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import os
+import struct
+import tempfile
+import wave
+import numpy as np
+import sys
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from offline import AudioFile, read_wav_header, process_file, process_files, summarize, main
+from tests.test_denoiser import FakeRNNoiseLib
+
+
+def write_wav(path, samples, rate=48000, channels=1):
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.asarray(samples, dtype='<i2').tobytes())
+
+
+def read_wav(path):
+    with wave.open(path, 'rb') as w:
+        return np.frombuffer(w.readframes(w.getnframes()), dtype='<i2'), w.getframerate()
+
+
+def tone(rate, seconds, amplitude=8000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (np.sin(2 * np.pi * 440 * t) * amplitude).astype(np.int16)
+
+
+class TestAudioFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_stereo_wav_is_mixed_down(self):
+        stereo = np.array([[1000, 3000], [-2000, 0], [5, 6]], dtype=np.int16)
+        write_wav(self.path("s.wav"), stereo.ravel(), 16000, channels=2)
+        audio = AudioFile(self.path("s.wav"))
+        out = np.zeros(8, dtype=np.int16)
+        self.assertEqual((audio.rate, audio.channels, len(audio)), (16000, 2, 3))
+        self.assertEqual(audio.read_into(1, out), 2)
+        self.assertEqual(out[:2].tolist(), [-1000, 5])
+        audio.close()
+
+    def test_wav_chunks_and_unfinished_headers(self):
+        # WAVE_FORMAT_EXTENSIBLE, a LIST chunk before the data and a data size never filled in
+        fmt = struct.pack('<HHIIHHHHI', 0xFFFE, 1, 8000, 16000, 2, 16, 22, 16, 0) + struct.pack('<H', 1) + bytes(14)
+        body = (b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'LIST' + struct.pack('<I', 3) + b'abc\x00'
+                + b'data' + struct.pack('<I', 0) + np.arange(10, dtype='<i2').tobytes())
+        with open(self.path("x.wav"), 'wb') as f:
+            f.write(b'RIFF' + struct.pack('<I', len(body)) + body)
+        offset, size, rate, channels = read_wav_header(self.path("x.wav"))
+        self.assertEqual((size, rate, channels), (20, 8000, 1))
+        audio = AudioFile(self.path("x.wav"))
+        self.assertEqual(audio.samples[:, 0].tolist(), list(range(10)))
+        audio.close()
+
+    def test_unsupported_files(self):
+        with wave.open(self.path("24.wav"), 'wb') as w:
+            w.setnchannels(1)
+            w.setsampwidth(3)
+            w.setframerate(48000)
+            w.writeframes(bytes(30))
+        with self.assertRaises(ValueError):
+            AudioFile(self.path("24.wav"))
+        with open(self.path("in.raw"), 'wb') as f:
+            f.write(bytes(10))
+        with self.assertRaises(ValueError):
+            AudioFile(self.path("in.raw"))  # Raw PCM has no rate of its own
+
+
+class TestProcessFile(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_gain_keeps_length_and_rate(self):
+        write_wav(self.path("in.wav"), tone(44100, 1.3), 44100)
+        result = process_file(self.path("in.wav"), self.path("out.wav"), {"stages": {"gain": {"gain": 0.5}}},
+                              batch_ms=250)
+        out, rate = read_wav(self.path("out.wav"))
+        source, _ = read_wav(self.path("in.wav"))
+        self.assertEqual((rate, len(out)), (44100, len(source)))
+        self.assertEqual((result["seconds"], result["frames"]), (1.3, 130))
+        # Past the 20ms gain ramp, exactly half
+        np.testing.assert_allclose(out[4410:], source[4410:] * 0.5, atol=1)
+
+    def test_denoising_16k_raw_goes_through_48k(self):
+        with open(self.path("in.raw"), 'wb') as f:
+            f.write(tone(16000, 1.0).tobytes())
+        result = process_file(self.path("in.raw"), self.path("out.raw"), {"stages": {"denoise": {"enabled": True}}},
+                              rate=16000, lib=FakeRNNoiseLib())
+        out = np.fromfile(self.path("out.raw"), dtype='<i2')
+        self.assertEqual((result["out_rate"], len(out)), (16000, 16000))
+        # The fake denoiser halves the signal: about 4000 peak once the filters have settled
+        self.assertAlmostEqual(np.abs(out[1600:-1600]).max(), 4000, delta=150)
+
+    def test_resampled_output_and_nothing_written(self):
+        write_wav(self.path("in.wav"), tone(48000, 0.5))
+        result = process_file(self.path("in.wav"), self.path("out.wav"), out_rate=16000)
+        out, rate = read_wav(self.path("out.wav"))
+        self.assertEqual((rate, len(out)), (16000, 8000))
+        result = process_file(self.path("in.wav"))
+        self.assertIsNone(result["output"])
+
+    def test_pool_reports_every_file(self):
+        paths = [self.path(f"{i}.wav") for i in range(3)]
+        for path in paths:
+            write_wav(path, tone(48000, 0.5))
+        jobs = [{"path": path, "output": path[:-4] + "-out.wav", "settings": {"stages": {"gain": {"gain": 2.0}}}}
+                for path in paths]
+        jobs.append({"path": self.path("missing.wav")})
+        results = list(process_files(jobs, workers=2))
+        self.assertEqual(sorted(r["path"] for r in results), sorted(paths + [self.path("missing.wav")]))
+        summary = summarize(results, 1.0, 2)
+        self.assertEqual((summary["files"], summary["failed"], summary["frames"]), (3, 1, 150))
+        self.assertGreater(summary["frames_per_s_per_core"], 0)
+        for path in paths:
+            self.assertEqual(len(read_wav(path[:-4] + "-out.wav")[0]), 24000)
+
+    def test_cli_refuses_to_overwrite_inputs(self):
+        write_wav(self.path("in.wav"), tone(48000, 0.1))
+        with self.assertRaises(SystemExit):
+            main([self.path("in.wav"), "-o", self.dir.name])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import unittest
+import socket
+import threading
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol import (handshake, choose, LinkStats, StreamFormat, f32_to_s16, DEFAULT_PREFERENCES,
+                      CLOCK, CONFIG, FORMAT_F32, FORMAT_S16, FRAME_HEADER, HELLO, INT, READY_SIGNAL, V2_MAGIC,
+                      TRANSPORT_TCP, TRANSPORT_UDP)
+from receiver import FrameReceiver
+
+
+def phone_side(sock, script):
+    """Runs `script(sock)` on a thread, like the app answering the handshake."""
+    result = {}
+
+    def run():
+        try:
+            result["value"] = script(sock)
+        except Exception as e:
+            result["error"] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, result
+
+
+def recv_exact(sock, n):
+    data = b''
+    while len(data) < n:
+        data += sock.recv(n - len(data))
+    return data
+
+
+class TestHandshake(unittest.TestCase):
+
+    def setUp(self):
+        self.backend, self.phone = socket.socketpair()
+        self.backend.settimeout(2)
+        self.phone.settimeout(2)
+
+    def tearDown(self):
+        self.backend.close()
+        self.phone.close()
+
+    def test_v1_phone_is_served_as_before(self):
+        def v1(sock):
+            sock.sendall(INT.pack(44100))
+            ack = recv_exact(sock, 4)
+            sock.sendall(INT.pack(READY_SIGNAL))
+            return INT.unpack(ack)[0]
+        thread, result = phone_side(self.phone, v1)
+        fmt = handshake(self.backend, FrameReceiver(self.backend))
+        thread.join()
+        self.assertEqual(result["value"], 44100)
+        self.assertEqual((fmt.version, fmt.sample_rate, fmt.header_size), (1, 44100, 0))
+
+    def test_v2_negotiates_and_measures_clock_offset(self):
+        def v2(sock):
+            # s16 + f32, every frame duration, up to 4 frames per packet, TCP only
+            sock.sendall(INT.pack(V2_MAGIC) + HELLO.pack(2, 48000, 3, 0b1111, 4, TRANSPORT_TCP))
+            magic = INT.unpack(recv_exact(sock, 4))[0]
+            config = CONFIG.unpack(recv_exact(sock, CONFIG.size))
+            # Phone clock runs 5s ahead of the backend's
+            sock.sendall(INT.pack(READY_SIGNAL) + CLOCK.pack(config[5] + 5_000_000))
+            return magic, config
+        thread, result = phone_side(self.phone, v2)
+        prefs = {"frame_ms": 20, "batch": 2, "formats": ["f32", "s16"]}
+        fmt = handshake(self.backend, FrameReceiver(self.backend), prefs, clock=iter([1000, 1400]).__next__)
+        thread.join()
+        magic, config = result["value"]
+        self.assertEqual(magic, V2_MAGIC)
+        self.assertEqual(config[:5], (2, 48000, FORMAT_F32, 20, 2))
+        self.assertEqual(config[6:], (TRANSPORT_TCP, 0))
+        self.assertEqual((fmt.version, fmt.frame_ms, fmt.batch, fmt.header_size), (2, 20, 2, FRAME_HEADER.size))
+        self.assertEqual(fmt.rtt_us, 400)
+        # Stamped 5s after our send time; the midpoint of the round trip is 200us later
+        self.assertEqual(fmt.clock_offset_us, 5_000_000 - 200)
+
+    def test_lost_connection_is_retryable(self):
+        self.phone.sendall(INT.pack(V2_MAGIC))
+        self.phone.close()
+        with self.assertRaises(ConnectionError):
+            handshake(self.backend, FrameReceiver(self.backend))
+
+    def test_choose(self):
+        offer = (2, 48000, FORMAT_S16, 0b0110, 8, TRANSPORT_TCP)  # s16 only, 10 and 20ms, TCP only
+        self.assertEqual(choose(offer, DEFAULT_PREFERENCES), (FORMAT_S16, 10, 1, TRANSPORT_TCP))
+        self.assertEqual(choose(offer, {"frame_ms": 40, "batch": 4, "formats": ["f32", "s16"], "transport": "udp"}),
+                         (FORMAT_S16, 20, 4, TRANSPORT_TCP))
+        # Packets must fit in 64KB: 40ms of f32 at 192kHz is 30720 bytes
+        self.assertEqual(choose((2, 192000, FORMAT_F32, 0b1000, 8, TRANSPORT_TCP | TRANSPORT_UDP),
+                                {"frame_ms": 40, "batch": 8, "formats": ["f32"], "transport": "udp"}),
+                         (FORMAT_F32, 40, 2, TRANSPORT_UDP))
+        with self.assertRaises(Exception):
+            choose((2, 48000, FORMAT_F32, 0b0010, 1, TRANSPORT_TCP), {"frame_ms": 10, "batch": 1, "formats": ["s16"]})
+
+
+def packet(seq, capture_us, samples=480):
+    return memoryview(FRAME_HEADER.pack(seq, capture_us) + bytes(samples * 2))
+
+
+class TestLinkStats(unittest.TestCase):
+
+    def setUp(self):
+        self.link = LinkStats()
+        self.link.start(StreamFormat(48000, 2, FORMAT_S16, 10, 1, clock_offset_us=1_000_000, rtt_us=300))
+
+    def test_counts_loss_and_drops_late_frames(self):
+        for seq in (0, 1, 2, 5, 6, 4, 7):
+            self.link.receive(packet(seq, 1_000_000), 0)
+        self.assertEqual(self.link.frames_lost, 2)  # 3 and 4 (4 came too late)
+        self.assertEqual(self.link.frames_late, 1)
+        self.assertIsNone(self.link.receive(packet(6, 1_000_000), 0))
+        self.assertEqual(self.link.get_stats()["loss_pct"], 25.0)
+
+    def test_batched_packets_and_sequence_wrap(self):
+        link = self.link
+        link.start(StreamFormat(48000, 2, FORMAT_S16, 10, 2, clock_offset_us=0))
+        for seq in (0xFFFFFFFC, 0xFFFFFFFE, 0, 2):
+            self.assertEqual(len(link.receive(packet(seq, 0, samples=960), 0)), 1920)
+        self.assertEqual((link.frames_received, link.frames_lost, link.frames_late), (8, 0, 0))
+
+    def test_latency_on_our_clock(self):
+        # Captured at our 10ms (phone clock 1.01s), arrived at 13ms
+        self.link.receive(packet(0, 1_010_000), 13_000)
+        self.assertEqual(self.link.last_latency_us, 3_000)
+        self.link.record_playout(40_000)
+        self.assertEqual(self.link.get_stats()["playout_latency_ms"]["p50"], 43.0)
+        # Arriving "before" capture means the offset was off: it is corrected
+        self.link.receive(packet(1, 1_020_000), 18_000)
+        self.assertEqual(self.link.last_latency_us, 0)
+        self.assertEqual(self.link.clock_offset_us, 1_002_000)
+
+    def test_latency_follows_clock_drift(self):
+        """An hour with the phone's clock 100ppm slow / fast: 5ms on the wire plus up to 3ms of jitter."""
+        rng = np.random.default_rng(1)
+        for skew_ppm in (-100, 100):
+            link = LinkStats()
+            link.start(StreamFormat(48000, 2, FORMAT_S16, 20, 1, clock_offset_us=1_000_000))
+            errors = []
+            for seq in range(3600 * 50):
+                captured = seq * 20_000
+                phone_clock = 1_000_000 + captured + captured * skew_ppm // 1_000_000
+                latency = 5_000 + int(rng.integers(0, 3_000))
+                link.receive(packet(seq, phone_clock), captured + latency)
+                if seq >= 3590 * 50:
+                    errors.append(link.last_latency_us - latency)
+            self.assertLess(max(abs(e) for e in errors), 1_000, skew_ppm)
+
+    def test_v1_stats_only_describe_the_format(self):
+        link = LinkStats()
+        link.start(StreamFormat(16000))
+        self.assertEqual(link.header_size, 0)
+        self.assertNotIn("frames_lost", link.get_stats())
+
+
+class TestSampleFormat(unittest.TestCase):
+
+    def test_f32_to_s16(self):
+        samples = np.array([0.0, 0.5, -1.0, 1.5, -2.0], dtype=np.float32)
+        out = f32_to_s16(samples, np.zeros(8, dtype=np.int16), np.zeros(8, dtype=np.float32))
+        self.assertEqual(out.tolist(), [0, 16384, -32767, 32767, -32768])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import gc
+import os
+import threading
+import sys
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mixer import OutputMixer
+from realtime import GCMonitor, GCTuning, pin_to_cpu, raise_priority, QUIET_COLLECT_AT
+
+
+def on_thread(fn):
+    """Runs `fn` on a throwaway thread, so priority and affinity changes don't leak into the test runner."""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=fn()))
+    thread.start()
+    thread.join()
+    return result.get("value")
+
+
+class TestGCMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = GCMonitor(budget_ms=10.0)
+        self.monitor.install()
+
+    def tearDown(self):
+        self.monitor.uninstall()
+
+    def test_times_collections(self):
+        gc.collect(0)
+        gc.collect()
+        stats = self.monitor.get_stats()
+        self.assertGreaterEqual(stats["collections"][0], 1)
+        self.assertGreaterEqual(stats["collections"][2], 1)
+        self.assertGreaterEqual(stats["pause_us"]["count"], 2)
+
+    def test_counts_pauses_longer_than_a_frame(self):
+        self.monitor.budget_ms = 1000.0
+        gc.collect()
+        self.assertEqual(self.monitor.long_pauses, 0)
+        self.monitor.budget_ms = 0.0
+        gc.collect()
+        self.assertEqual(self.monitor.long_pauses, 1)
+
+    def test_uninstall(self):
+        self.monitor.uninstall()
+        self.assertNotIn(self.monitor._callback, gc.callbacks)
+        gc.collect()
+        self.assertEqual(self.monitor.get_stats()["collections"], [0, 0, 0])
+
+
+class TestGCTuning(unittest.TestCase):
+
+    def setUp(self):
+        self.thresholds = gc.get_threshold()
+        self.tuning = GCTuning()
+
+    def tearDown(self):
+        while self.tuning.users:
+            self.tuning.exit()
+        gc.set_threshold(*self.thresholds)
+
+    def test_first_stream_tunes_last_restores(self):
+        self.tuning.enter()
+        self.tuning.enter()
+        self.assertEqual(gc.get_threshold()[0], self.tuning.threshold0)
+        self.assertGreater(gc.get_freeze_count(), 0)
+        self.tuning.exit()
+        self.assertEqual(gc.get_threshold()[0], self.tuning.threshold0)
+        self.tuning.exit()
+        self.assertEqual(gc.get_threshold(), self.thresholds)
+        self.assertEqual(gc.get_freeze_count(), 0)
+        # An extra exit is harmless
+        self.tuning.exit()
+        self.assertEqual(gc.get_threshold(), self.thresholds)
+
+    def test_quiet_point_collects_only_with_output_slack(self):
+        self.assertFalse(self.tuning.quiet_point(100.0))  # Not realtime
+        self.tuning.enter()
+        garbage = [[] for _ in range(QUIET_COLLECT_AT * 2)]
+        self.assertFalse(self.tuning.quiet_point(0.5))
+        self.assertTrue(self.tuning.quiet_point(50.0))
+        self.assertEqual(self.tuning.quiet_collections, 1)
+        del garbage
+        self.assertLess(gc.get_count()[0], QUIET_COLLECT_AT)
+
+    def test_quiet_point_waits_for_room_for_the_pause(self):
+        self.tuning.enter()
+        garbage = [[] for _ in range(QUIET_COLLECT_AT * 2)]
+        estimate = 4.0 / gc.get_count()[0]
+        self.tuning.young_ms_per_object = estimate  # About 4ms for what is there now
+        self.assertFalse(self.tuning.quiet_point(4.0))
+        self.assertEqual(self.tuning.deferred, 1)
+        self.assertTrue(self.tuning.quiet_point(8.0))
+        # Re-measured (a young collection of a few thousand objects is far below 4ms)
+        self.assertLess(self.tuning.young_ms_per_object, estimate)
+        del garbage
+
+    def test_deferred_collections_run_in_the_end(self):
+        self.tuning.enter()
+        garbage = [[] for _ in range(QUIET_COLLECT_AT * 2)]
+        self.tuning.young_ms_per_object = 1.0  # Never fits
+        self.assertFalse(self.tuning.quiet_point(5.0))
+        self.tuning._deferred_since[0] -= 60.0
+        self.assertTrue(self.tuning.quiet_point(5.0))
+        del garbage
+
+    def test_older_generation_that_doesnt_fit_leaves_a_young_collection(self):
+        self.tuning.enter()
+        for _ in range(gc.get_threshold()[1]):
+            gc.collect(0)
+        self.tuning.pause_ms[1] = self.tuning.pause_ms[2] = 100.0
+        collections = []
+        callback = lambda phase, info: phase == "stop" and collections.append(info["generation"])
+        gc.callbacks.append(callback)
+        try:
+            garbage = [[] for _ in range(QUIET_COLLECT_AT * 2)]
+            self.assertTrue(self.tuning.quiet_point(5.0))
+        finally:
+            gc.callbacks.remove(callback)
+        self.assertEqual(collections, [0])
+        del garbage
+
+
+class TestOutputSlack(unittest.TestCase):
+
+    def test_slack_counts_down_from_the_last_block(self):
+        mixer = OutputMixer(48000, 240)
+        self.assertEqual(mixer.slack_ms(), 0.0)  # Nothing delivered yet
+        mixer.last_block_ns = 1_000_000_000
+        # A 5ms block, nothing buffered beyond it
+        self.assertAlmostEqual(mixer.slack_ms(1_001_000_000), 4.0)
+        self.assertLess(mixer.slack_ms(1_006_000_000), 0)
+        # The device's own buffer covers more
+        mixer.output_latency = 0.02
+        self.assertAlmostEqual(mixer.slack_ms(1_001_000_000), 19.0)
+
+
+class TestThreadScheduling(unittest.TestCase):
+
+    def test_raise_priority_never_raises(self):
+        self.assertIn(on_thread(raise_priority), (None, "fifo", "nice", "mmcss", "time_critical"))
+
+    @unittest.skipUnless(hasattr(os, "sched_getaffinity"), "needs sched_getaffinity")
+    def test_pin_to_cpu_only_pins_the_calling_thread(self):
+        before = os.sched_getaffinity(0)
+        cpu = min(before)
+        self.assertEqual(on_thread(lambda: pin_to_cpu(cpu) and os.sched_getaffinity(0)), {cpu})
+        self.assertEqual(os.sched_getaffinity(0), before)
+        self.assertFalse(on_thread(lambda: pin_to_cpu(100000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import socket
+import struct
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from receiver import FrameReceiver
+
+
+def frame(payload):
+    return struct.pack('>i', len(payload)) + payload
+
+
+class TestFrameReceiver(unittest.TestCase):
+
+    def setUp(self):
+        self.tx, self.rx = socket.socketpair()
+        self.rx.settimeout(1.0)
+        self.receiver = FrameReceiver(self.rx)
+
+    def tearDown(self):
+        self.tx.close()
+        self.rx.close()
+
+    def test_parses_several_frames_per_syscall(self):
+        self.tx.sendall(frame(b'\x01\x00' * 4) + frame(b'\x02\x00' * 4) + frame(b'\x03'))
+        self.receiver.fill()
+        self.assertEqual(bytes(self.receiver.next_frame()), b'\x01\x00' * 4)
+        self.assertEqual(bytes(self.receiver.next_frame()), b'\x02\x00' * 4)
+        self.assertEqual(bytes(self.receiver.next_frame()), b'\x03')
+        self.assertIsNone(self.receiver.next_frame())
+        self.assertEqual(self.receiver.syscalls, 1)
+
+    def test_partial_frame_waits_for_more_data(self):
+        data = frame(b'abcdef')
+        self.tx.sendall(data[:5])
+        self.receiver.fill()
+        self.assertIsNone(self.receiver.next_frame())
+        self.tx.sendall(data[5:])
+        self.receiver.fill()
+        self.assertEqual(bytes(self.receiver.next_frame()), b'abcdef')
+
+    def test_invalid_length_raises(self):
+        self.tx.sendall(struct.pack('>i', -1))
+        self.receiver.fill()
+        with self.assertRaises(ValueError):
+            self.receiver.next_frame()
+
+    def test_handshake_bytes_do_not_lose_trailing_frames(self):
+        self.tx.sendall(struct.pack('>i', 48000) + frame(b'xy'))
+        self.assertEqual(struct.unpack('>i', self.receiver.read_exact(4))[0], 48000)
+        self.assertEqual(bytes(self.receiver.next_frame()), b'xy')
+
+    def test_discard_pending_keeps_framing(self):
+        data = frame(b'a' * 10) * 3 + frame(b'b' * 10)
+        self.tx.sendall(data[:-3])
+        self.assertEqual(self.receiver.discard_pending(), 3)
+        self.tx.sendall(data[-3:])
+        self.receiver.fill()
+        self.assertEqual(bytes(self.receiver.next_frame()), b'b' * 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
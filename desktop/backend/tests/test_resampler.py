@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resampler import StreamingResampler
+
+
+def sine(rate, freq=1000, seconds=0.5, amplitude=10000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+class TestStreamingResampler(unittest.TestCase):
+
+    def test_chunked_output_matches_one_shot(self):
+        """Filter state carries across frames, so chunking leaves no seams."""
+        audio = sine(44100)
+        whole = StreamingResampler(44100, 48000).process(audio)
+        r = StreamingResampler(44100, 48000)
+        chunks = np.concatenate([r.process(audio[i:i + 441]) for i in range(0, len(audio), 441)])
+        n = min(len(whole), len(chunks))
+        self.assertTrue(np.array_equal(whole[:n], chunks[:n]))
+
+    def test_tone_survives_conversion(self):
+        for in_rate, out_rate in [(16000, 48000), (48000, 44100), (48000, 8000)]:
+            out = StreamingResampler(in_rate, out_rate).process(sine(in_rate)).astype(float)
+            seg = out[500:-500]
+            spectrum = np.abs(np.fft.rfft(seg * np.hanning(len(seg))))
+            peak = np.fft.rfftfreq(len(seg), 1.0 / out_rate)[spectrum.argmax()]
+            self.assertAlmostEqual(peak, 1000, delta=out_rate / len(seg) + 1)
+            self.assertAlmostEqual(seg.std() * np.sqrt(2), 10000, delta=100)
+
+    def test_output_length_tracks_ratio(self):
+        r = StreamingResampler(16000, 48000, quality="low")
+        total = sum(len(r.process(np.zeros(160, dtype=np.int16))) for _ in range(100))
+        self.assertAlmostEqual(total, 48000 * 100 / 100, delta=r.taps * 3)
+
+    def test_ratio_adjust_changes_consumption(self):
+        fast = StreamingResampler(48000, 48000)
+        fast.set_ratio_adjust(1000)  # consume 0.1% faster -> fewer outputs
+        slow = StreamingResampler(48000, 48000)
+        audio = np.zeros(48000, dtype=np.int16)
+        self.assertLess(len(fast.process(audio)), len(slow.process(audio)))
+
+
+if __name__ == '__main__':
+    unittest.main()
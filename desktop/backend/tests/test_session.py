@@ -0,0 +1,182 @@
+import unittest
+import numpy as np
+import sys
+import os
+import time
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jitter_buffer import JitterBuffer
+from mixer import OutputMixer
+from session import StreamSession
+from denoiser import RNNoise
+from tests.test_denoiser import FakeRNNoiseLib
+
+
+def started_session(input_rate=48000, output_rate=48000, target_ms=20):
+    session = StreamSession("phone1")
+    session.drift_compensation = False
+    jbuf = JitterBuffer(output_rate, target_ms=target_ms, adaptive=False)
+    session.begin(input_rate, jbuf, OutputMixer(output_rate, 240))
+    return session, jbuf
+
+
+class TestStreamSession(unittest.TestCase):
+
+    def test_gain_is_per_session(self):
+        session, jbuf = started_session()
+        other, other_jbuf = started_session()
+        session.gain = 2.0
+        frame = np.full(480, 1000, dtype=np.int16).tobytes()
+        for _ in range(4):
+            session.process_frame(frame)
+            other.process_frame(frame)
+
+        # The change is ramped in over 20ms, then holds
+        out = np.zeros(480, dtype=np.int16)
+        for _ in range(3):
+            self.assertTrue(jbuf.read_into(out))
+        self.assertTrue((out == 2000).all())
+        self.assertTrue(other_jbuf.read_into(out))
+        self.assertTrue((out == 1000).all())
+
+    def test_resamples_to_output_rate(self):
+        session, jbuf = started_session(input_rate=16000, target_ms=200)
+        for _ in range(10):
+            session.process_frame(np.zeros(160, dtype=np.int16).tobytes())
+        # 100ms of 16kHz input ends up as ~100ms at 48kHz (minus filter delay)
+        self.assertAlmostEqual(jbuf.depth_ms, 100, delta=5)
+        self.assertEqual(session.stats.frames_processed, 10)
+
+    def test_volume_messages_are_tagged(self):
+        session, _ = started_session()
+        messages = []
+        session.notify = messages.append
+        for _ in range(20):
+            session.process_frame(np.full(480, 500, dtype=np.int16).tobytes())
+        volume = [m for m in messages if m["type"] == "volume"]
+        self.assertTrue(volume)
+        self.assertEqual(volume[0]["session"], "phone1")
+
+    def test_stats_include_buffer_once_started(self):
+        session = StreamSession("phone1")
+        self.assertNotIn("buffer", session.get_stats())
+        session, _ = started_session()
+        stats = session.get_stats()
+        self.assertIn("buffer", stats)
+        self.assertEqual(stats["buffer"]["device_underflows"], 0)
+
+    def test_closed_gate_queues_silence_and_reports_vad(self):
+        session, jbuf = started_session(target_ms=200)
+        lib = FakeRNNoiseLib()
+        session.dsp.stages["denoise"].rnnoise = RNNoise(lib)
+        session.dsp.apply({"stages": {"denoise": {"enabled": True},
+                                      "gate": {"enabled": True, "hold_ms": 0, "release_ms": 10}}})
+        messages = []
+        session.notify = messages.append
+        frame = np.full(480, 1000, dtype=np.int16).tobytes()
+        lib.vad = 0.0
+        for _ in range(10):
+            session.process_frame(frame)
+
+        self.assertFalse(session.gate_open)
+        self.assertEqual(session.stats.frames_gated, 9)
+        # Silence keeps the playout buffer fed: 100ms in, 100ms queued
+        self.assertAlmostEqual(jbuf.depth_ms, 100, delta=1)
+        vad = [m for m in messages if m["type"] == "vad"]
+        self.assertEqual(vad[-1], {"type": "vad", "session": "phone1", "probability": 0.0, "gate_open": False})
+        self.assertEqual([m["value"] for m in messages if m["type"] == "volume"][-1], 0.0)
+
+        session.dsp.configure("gate", skip_output=True)
+        session.process_frame(frame)
+        self.assertAlmostEqual(jbuf.depth_ms, 100, delta=1)
+
+    def test_worker_failure_falls_back_in_process(self):
+        session = StreamSession("phone1")
+        session.drift_compensation = False
+        session.start_worker()
+        messages = []
+        session.notify = messages.append
+        jbuf = JitterBuffer(48000, target_ms=20, adaptive=False)
+        session.begin(48000, jbuf, OutputMixer(48000, 240))
+        try:
+            session.gain = 2.0
+            frame = np.full(480, 1000, dtype=np.int16).tobytes()
+            session.process_frame(frame)
+            self.assertEqual(session.worker.frames, 1)
+
+            session.worker.process_handle.kill()
+            session.worker.process_handle.join()
+            for _ in range(3):
+                session.process_frame(frame)
+        finally:
+            session.stop_worker()
+        self.assertIsNone(session.worker)
+        self.assertTrue(any("in-process" in m.get("message", "") for m in messages))
+        self.assertEqual(session.stats.frames_processed, 4)
+
+    def test_resume_keeps_stream_state(self):
+        session, jbuf = started_session(input_rate=16000, target_ms=200)
+        for _ in range(10):
+            session.process_frame(np.zeros(160, dtype=np.int16).tobytes())
+        resampler = session.resamplers[(16000, 48000)]
+        jbuf.clear()
+        session.disconnected_at = 0.0
+
+        # Same rate: resamplers and stats are kept, the connection is counted
+        session.resume(16000)
+        self.assertIs(session.resamplers[(16000, 48000)], resampler)
+        self.assertEqual(session.reconnects, 1)
+        session.process_frame(np.zeros(160, dtype=np.int16).tobytes())
+        session.connected(0.0)
+        self.assertEqual(session.stats.frames_processed, 11)
+        self.assertIsNone(session.disconnected_at)
+        self.assertIsNotNone(session.get_stats()["reconnect"]["last_gap_ms"])
+
+        # New rate: rebuilt on first use
+        session.resume(48000)
+        self.assertEqual(session.resamplers, {})
+        self.assertEqual(session.get_stats()["reconnect"]["reconnects"], 2)
+
+    def test_reconnect_keeps_drift_correction(self):
+        session, jbuf = started_session(target_ms=20)
+        session.drift_compensation = True
+        # Settled on a phone 50ppm fast; the last observation was two minutes ago
+        drift = session.drift
+        drift.smoothed_ms = 20.0
+        drift.drift_ppm = drift.correction_ppm = 50.0
+        drift._last = time.monotonic() - 120.0
+
+        jbuf.clear()
+        session.resume(48000)
+        for _ in range(20):
+            session.process_frame(np.zeros(480, dtype=np.int16).tobytes())
+        self.assertAlmostEqual(drift.drift_ppm, 50.0, delta=1.0)
+        self.assertAlmostEqual(drift.correction_ppm, 50.0, delta=20.0)
+
+    def test_conceal_fades_the_last_packet_out(self):
+        session, jbuf = started_session(target_ms=20)
+        session.concealment = True
+        # Nothing to repeat yet
+        session.conceal()
+        self.assertEqual(jbuf.depth_ms, 0)
+
+        session.process_frame(np.full(480, 1000, dtype=np.int16).tobytes())
+        for _ in range(3):
+            session.conceal()
+        self.assertEqual(session.stats.frames_concealed, 3)
+        # Every lost packet was played as one packet of audio
+        self.assertAlmostEqual(jbuf.depth_ms, 40, delta=1)
+        out = np.zeros(1920, dtype=np.int16)
+        self.assertTrue(jbuf.read_into(out))
+        fade = out[480:1440]
+        self.assertLess(abs(int(fade[0]) - 1000), 5)
+        self.assertTrue(np.all(np.diff(fade.astype(np.int32)) <= 0))
+        self.assertLess(fade[-1], 5)
+        # Then silence, not a buzz
+        self.assertFalse(out[1440:].any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+import os
+import tempfile
+import threading
+import time
+import wave
+import numpy as np
+import sys
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sinks import parse_sink, open_sink, open_tap, FileSink, NullSink, TapWriter, WavRecorder
+from offline import read_wav_header
+
+
+def blocks(count, frames=240):
+    return [np.full(frames, i, dtype=np.int16).tobytes() for i in range(count)]
+
+
+class StalledDisk:
+    """File stand-in whose writes hang until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.data = []
+
+    def write(self, data):
+        self.release.wait()
+        self.data.append(bytes(data))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestSinks(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_sink_ids(self):
+        self.assertEqual(parse_sink("null"), ("null", None))
+        self.assertEqual(parse_sink("file:/tmp/out.raw"), ("file", "/tmp/out.raw"))
+        for device in ("MME:Speakers", "file:", 3, None):
+            self.assertIsNone(parse_sink(device))
+        sink = open_sink("null", 48000, 240)
+        self.assertIsInstance(sink, NullSink)
+        sink.close()
+
+    def test_callback_sink_pulls_at_device_pace(self):
+        pulls = []
+        sink = NullSink(48000, 480, lambda *args: (pulls.append(args[1]) or bytes(960), 0))
+        time.sleep(0.2)
+        sink.stop_stream()
+        sink.close()
+        # 10ms blocks for 200ms
+        self.assertTrue(15 <= len(pulls) <= 25, len(pulls))
+        self.assertEqual(set(pulls), {480})
+
+    def test_file_sink_writes_raw_pcm(self):
+        sink = FileSink(self.path("out.raw"), 48000, 240)
+        for data in blocks(5):
+            sink.write(data)
+        sink.close()
+        out = np.fromfile(self.path("out.raw"), dtype='<i2')
+        self.assertEqual(out.tolist(), np.repeat(np.arange(5), 240).tolist())
+        self.assertEqual(sink.get_stats()["bytes_written"], 2400)
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "needs FIFOs")
+    def test_file_sink_discards_until_a_fifo_has_a_reader(self):
+        os.mkfifo(self.path("cable"))
+        sink = FileSink(self.path("cable"), 48000, 240)
+        sink.write(blocks(1)[0])  # Nobody reading yet: dropped, never blocks
+        self.assertIsNotNone(sink.error)
+        fd = os.open(self.path("cable"), os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            sink._retry_at = 0.0
+            sink.write(blocks(2)[1])
+            self.assertEqual(np.frombuffer(os.read(fd, 4096), dtype='<i2').tolist(), [1] * 240)
+        finally:
+            sink.close()
+            os.close(fd)
+
+
+class TestTaps(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.dir.name, name)
+
+    def test_wav_recording(self):
+        tap = open_tap(self.path("take.wav"), 16000, 160)
+        self.assertIsInstance(tap, WavRecorder)
+        # Until closed the sizes are zero, which readers take as "to the end of the file"
+        self.assertEqual(read_wav_header(self.path("take.wav"))[1:], (0, 16000, 1))
+        for data in blocks(50, 160):
+            tap.write(data)
+        tap.close()
+        with wave.open(self.path("take.wav"), 'rb') as w:
+            self.assertEqual((w.getframerate(), w.getnchannels(), w.getnframes()), (16000, 1, 8000))
+            samples = np.frombuffer(w.readframes(8000), dtype='<i2')
+        self.assertEqual(samples.tolist(), np.repeat(np.arange(50), 160).tolist())
+        self.assertEqual(tap.get_stats()["seconds"], 0.5)
+
+    def test_raw_tap(self):
+        tap = open_tap(self.path("take.pcm"), 48000, 240)
+        self.assertNotIsInstance(tap, WavRecorder)
+        for data in blocks(3):
+            tap.write(data)
+        tap.close()
+        self.assertEqual(os.path.getsize(self.path("take.pcm")), 1440)
+
+    def test_stalled_disk_drops_instead_of_blocking(self):
+        tap = TapWriter(self.path("take.pcm"), 48000, 240, queue_seconds=0.05, flush_interval=0.01)
+        disk = StalledDisk()
+        tap._file = disk
+        data = blocks(30)
+        time.sleep(0.05)  # The writer thread is idle
+        started = time.monotonic()
+        for block in data:
+            tap.write(block)
+        self.assertLess(time.monotonic() - started, 0.05)
+        self.assertEqual(tap.max_blocks, 10)
+        # One block may already sit with the stalled write, the queue holds ten more
+        self.assertIn(tap.dropped_blocks, (19, 20))
+        disk.release.set()
+        tap.close()
+        self.assertEqual(b"".join(disk.data), b"".join(data[:30 - tap.dropped_blocks]))
+
+    def test_bad_path_raises(self):
+        with self.assertRaises(OSError):
+            open_tap(self.path("missing/take.wav"), 48000, 240)
+
+
+if __name__ == '__main__':
+    unittest.main()
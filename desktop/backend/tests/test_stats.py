@@ -0,0 +1,56 @@
+import unittest
+import socket
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats import RollingHistogram, PipelineStats, socket_queue_bytes
+
+
+class TestRollingHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        hist = RollingHistogram(window=1000)
+        for v in range(1, 1001):
+            hist.record(v)
+        summary = hist.summary()
+        self.assertAlmostEqual(summary["p50"], 500.5, delta=1)
+        self.assertAlmostEqual(summary["p99"], 990, delta=1)
+        self.assertEqual(summary["max"], 1000)
+
+    def test_window_forgets_old_values(self):
+        hist = RollingHistogram(window=10)
+        hist.record(10_000)
+        for _ in range(10):
+            hist.record(5)
+        self.assertEqual(hist.summary()["max"], 5)
+        self.assertEqual(hist.summary()["count"], 11)
+
+
+class TestPipelineStats(unittest.TestCase):
+
+    def test_snapshot_reports_recorded_stages_in_us(self):
+        stats = PipelineStats()
+        stats.record("denoise", 15_000)
+        stats.frames_processed = 3
+        snap = stats.snapshot()
+        self.assertEqual(snap["stages_us"]["denoise"]["p50"], 15.0)
+        self.assertNotIn("gain", snap["stages_us"])
+        self.assertEqual(snap["frames_processed"], 3)
+
+    def test_socket_queue_depth(self):
+        tx, rx = socket.socketpair()
+        try:
+            tx.sendall(b'x' * 100)
+            queued = socket_queue_bytes(rx)
+            if queued is not None:
+                self.assertEqual(queued, 100)
+        finally:
+            tx.close()
+            rx.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import json
+import time
+import sys
+import os
+
+# Add parent directory to path so we can import backend modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telemetry import TelemetryQueue
+
+
+class Capture:
+    """Collects what the writer would send to the UI socket."""
+
+    def __init__(self):
+        self.writes = []
+
+    def __call__(self, data):
+        self.writes.append(data)
+
+    def messages(self):
+        lines = b"".join(self.writes).decode('utf-8').splitlines()
+        return [json.loads(line) for line in lines]
+
+
+class TestTelemetryQueue(unittest.TestCase):
+
+    def test_volume_is_latest_value_wins(self):
+        out = Capture()
+        queue = TelemetryQueue(out)
+        for i in range(50):
+            queue.put({"type": "volume", "value": i / 100})
+        queue.flush()
+        self.assertEqual(out.messages(), [{"type": "volume", "value": 0.49}])
+        self.assertEqual(queue.coalesced, 49)
+
+    def test_coalescing_is_per_session(self):
+        out = Capture()
+        queue = TelemetryQueue(out)
+        queue.put({"type": "volume", "value": 0.1, "session": "a"})
+        queue.put({"type": "volume", "value": 0.2, "session": "b"})
+        queue.put({"type": "volume", "value": 0.3, "session": "a"})
+        queue.flush()
+        values = {m["session"]: m["value"] for m in out.messages()}
+        self.assertEqual(values, {"a": 0.3, "b": 0.2})
+
+    def test_logs_are_bounded_and_counted(self):
+        out = Capture()
+        queue = TelemetryQueue(out, max_pending=10)
+        for i in range(25):
+            queue.put({"type": "log", "message": str(i)})
+        # Status changes are never dropped
+        queue.put({"type": "status", "payload": "running"})
+        queue.flush()
+        messages = out.messages()
+        self.assertEqual(len(messages), 11)
+        self.assertEqual(messages[-1]["type"], "status")
+        self.assertEqual(queue.dropped_logs, 15)
+
+    def test_one_write_per_flush(self):
+        out = Capture()
+        queue = TelemetryQueue(out)
+        queue.put({"type": "log", "message": "a"})
+        queue.put({"type": "status", "payload": "running"})
+        queue.put({"type": "volume", "value": 0.5})
+        self.assertEqual(queue.flush(), 3)
+        self.assertEqual(len(out.writes), 1)
+        self.assertEqual([m["type"] for m in out.messages()], ["log", "status", "volume"])
+
+    def test_writer_thread_paces_meter(self):
+        out = Capture()
+        queue = TelemetryQueue(out, rate_hz=20)
+        queue.start()
+        try:
+            start = time.monotonic()
+            while time.monotonic() - start < 0.5:
+                queue.put({"type": "volume", "value": 0.5})
+                time.sleep(0.001)
+        finally:
+            queue.stop()
+        volume = [m for m in out.messages() if m["type"] == "volume"]
+        # ~10 ticks in 0.5s, nowhere near the ~500 puts
+        self.assertGreaterEqual(len(volume), 5)
+        self.assertLessEqual(len(volume), 15)
+
+    def test_ordered_messages_do_not_wait_for_tick(self):
+        out = Capture()
+        queue = TelemetryQueue(out, rate_hz=1)
+        queue.start()
+        try:
+            queue.put({"type": "error", "message": "boom"})
+            time.sleep(0.1)
+            self.assertEqual(out.messages(), [{"type": "error", "message": "boom"}])
+        finally:
+            queue.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -39,6 +39,9 @@ class BackendController extends ChangeNotifier {
   String status = "Initializing...";
 
   double currentVolume = 0.0;
+  bool isClipping = false;
+  bool isGateOpen = true;
+  Map<String, dynamic> bufferStats = {};
   double gainValue = 1.0;
   bool isAiEnabled = false;
   List<String> logs = [];
@@ -47,6 +50,9 @@ class BackendController extends ChangeNotifier {
 
   String _socketBuffer = "";
 
+  // A stream is up or on its way (a persistent session stays active while it reconnects)
+  bool get isActive => const ["connecting", "running", "reconnecting"].contains(status);
+
   BackendController() {
     _startEmbeddedBackend();
     loadSettings();
@@ -175,6 +181,13 @@ class BackendController extends ChangeNotifier {
         break;
       case 'volume':
         currentVolume = (msg['value'] as num).toDouble();
+        isClipping = ((msg['clipped'] ?? 0) as num) > 0;
+        break;
+      case 'vad':
+        isGateOpen = msg['gate_open'] ?? true;
+        break;
+      case 'buffer':
+        bufferStats = msg;
         break;
       case 'log':
         _log(msg['message']);
@@ -189,6 +202,13 @@ class BackendController extends ChangeNotifier {
           selectedDevice = devices.first;
         }
         break;
+      case 'devices_changed':
+        // Hotplug: the backend re-scanned in the background
+        devices = List<String>.from(msg['payload']);
+        if (selectedDevice != null && !devices.contains(selectedDevice)) {
+          selectedDevice = devices.isNotEmpty ? devices.first : null;
+        }
+        break;
     }
     notifyListeners();
   }
@@ -386,7 +406,7 @@ class _RouterViewState extends State<RouterView> {
               decoration: BoxDecoration(
                 color: Colors.black45,
                 borderRadius: BorderRadius.circular(20),
-                border: Border.all(color: Colors.white12),
+                border: Border.all(color: controller.isClipping ? Colors.redAccent : Colors.white12),
                 boxShadow: [
                   BoxShadow(color: Colors.black.withOpacity(0.3), blurRadius: 10, offset: const Offset(0, 4))
                 ]
@@ -396,9 +416,13 @@ class _RouterViewState extends State<RouterView> {
                 child: FractionallySizedBox(
                   alignment: Alignment.centerLeft,
                   widthFactor: controller.currentVolume.clamp(0.0, 1.0),
-                  child: Container(
-                    decoration: const BoxDecoration(
-                      gradient: LinearGradient(colors: [Colors.cyanAccent, Colors.purpleAccent]),
+                  child: Opacity(
+                    // Dimmed while the noise gate is closed
+                    opacity: controller.isGateOpen ? 1.0 : 0.3,
+                    child: Container(
+                      decoration: const BoxDecoration(
+                        gradient: LinearGradient(colors: [Colors.cyanAccent, Colors.purpleAccent]),
+                      ),
                     ),
                   ),
                 ),
@@ -428,6 +452,19 @@ class _RouterViewState extends State<RouterView> {
             ),
           ),
 
+          if (controller.status == "running" && controller.bufferStats.isNotEmpty)
+            Padding(
+              padding: const EdgeInsets.only(top: 8),
+              child: Center(
+                child: Text(
+                  "BUFFER ${controller.bufferStats['depth_ms']} / ${controller.bufferStats['target_ms']} ms"
+                  "  ·  UNDERRUNS ${controller.bufferStats['underruns']}"
+                  "  ·  OVERRUNS ${controller.bufferStats['overruns']}",
+                  style: const TextStyle(fontSize: 11, color: Colors.grey, letterSpacing: 1.1),
+                ),
+              ),
+            ),
+
           const SizedBox(height: 60),
 
           Center(
@@ -435,7 +472,7 @@ class _RouterViewState extends State<RouterView> {
               mainAxisAlignment: MainAxisAlignment.center,
               children: [
                 FilledButton.icon(
-                  onPressed: (controller.status == "running" || controller.selectedDevice == null)
+                  onPressed: (controller.isActive || controller.selectedDevice == null)
                       ? null
                       : controller.startStreaming,
                   icon: const Icon(Icons.play_arrow),
@@ -448,7 +485,7 @@ class _RouterViewState extends State<RouterView> {
                 ),
                 const SizedBox(width: 20),
                 OutlinedButton.icon(
-                  onPressed: controller.status == "running" ? controller.stopStreaming : null,
+                  onPressed: controller.isActive ? controller.stopStreaming : null,
                   icon: const Icon(Icons.stop),
                   label: const Text("STOP"),
                   style: OutlinedButton.styleFrom(